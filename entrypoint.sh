@@ -1,6 +1,17 @@
 #!/bin/sh
 set -e
 
+# Older setups bind-mount the database as a single file. Its WAL files would
+# then live in the container layer and be lost with the container, so keep
+# using that file, in rollback-journal mode, until it is moved to the data
+# directory.
+if [ -f /app/db.sqlite3 ] && [ ! -e "$DATABASE_PATH" ]; then
+    echo "WARNING: /app/db.sqlite3 is mounted as a single file. Move it to ./data/db.sqlite3 and mount ./data at /app/data to enable WAL."
+    export DATABASE_PATH=/app/db.sqlite3
+    export SQLITE_PRAGMAS="journal_mode=DELETE,synchronous=FULL${SQLITE_PRAGMAS:+,$SQLITE_PRAGMAS}"
+fi
+mkdir -p "$(dirname "$DATABASE_PATH")"
+
 echo "Running migrations..."
 python manage.py migrate --fake-initial
 
@@ -0,0 +1,198 @@
+"""Activity feed log.
+
+Every logging model has an entry in ``SOURCES`` describing how one of its
+records reads in the feed. Signals (farm/signals.py) keep one
+``ActivityEvent`` per record, so the feed is a single indexed query on one
+table, paged by keyset like the herd roster (farm/roster.py). Editing a
+record rewrites its entry, and deleting the record removes it.
+``manage.py backfill_activity`` fills the table from records that existed
+before it did.
+"""
+import base64
+from datetime import date
+import json
+
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import (ActivityEvent, BreedingLog, FeedingLog, HealthScore, HeatObservation,
+    KiddingRecord, MedicalRecord, MilkLog, Transaction, WeightLog)
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+BACKFILL_BATCH = 1000
+
+# type -> (icon, color) for display
+STYLES = {
+    'medical': ('🏥', '#e91e63'),
+    'milk': ('🥛', '#2196f3'),
+    'breeding': ('🧬', '#9c27b0'),
+    'weight': ('⚖️', '#009688'),
+    'feeding': ('🌾', '#ff9800'),
+    'kidding': ('🐣', '#4caf50'),
+    'health': ('🩺', '#ff5722'),
+    'heat': ('🔥', '#e91e63'),
+    'finance': ('💰', '#795548'),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _notes(text):
+    return text[:100] if text else ''
+
+
+def _feeding_label(o):
+    label = f'{o.feed_type} - {o.amount}'
+    if o.time_of_day:
+        label += f' ({o.time_of_day}'
+        if o.feeding_time:
+            label += f' @ {o.feeding_time.strftime("%I:%M %p").lstrip("0")}'
+        label += ')'
+    return label
+
+
+# model -> (type, describe). describe(record) returns the entry's fields.
+SOURCES = {
+    MedicalRecord: ('medical', lambda o: {
+        'date': o.date, 'goat_id': o.goat_id,
+        'label': o.get_record_type_display(), 'detail': _notes(o.notes)}),
+    MilkLog: ('milk', lambda o: {
+        'date': o.date, 'goat_id': o.goat_id,
+        'label': f'{o.amount} lbs ({o.time})', 'detail': _notes(o.notes)}),
+    BreedingLog: ('breeding', lambda o: {
+        'date': o.breeding_date, 'goat_id': o.goat_id,
+        'label': f'Bred with {o.mate_name}', 'detail': f'Due: {o.due_date}' if o.due_date else ''}),
+    WeightLog: ('weight', lambda o: {
+        'date': o.date, 'goat_id': o.goat_id,
+        'label': f'{o.weight} lbs', 'detail': _notes(o.notes)}),
+    FeedingLog: ('feeding', lambda o: {
+        'date': o.date, 'goat_id': o.goat_id, 'goat_label': '' if o.goat_id else 'All Goats',
+        'label': _feeding_label(o), 'detail': _notes(o.notes)}),
+    KiddingRecord: ('kidding', lambda o: {
+        'date': o.kidding_date, 'goat_id': o.dam_id,
+        'label': f'{o.birth_type} - {o.num_alive} alive', 'detail': _notes(o.notes)}),
+    HealthScore: ('health', lambda o: {
+        'date': o.date, 'goat_id': o.goat_id,
+        'label': f'FAMACHA:{o.famacha_score or "-"} BCS:{o.body_condition_score or "-"}',
+        'detail': _notes(o.notes)}),
+    HeatObservation: ('heat', lambda o: {
+        'date': o.date_observed, 'goat_id': o.goat_id,
+        'label': f'Heat observed - {o.signs or "no signs noted"}', 'detail': _notes(o.notes)}),
+    Transaction: ('finance', lambda o: {
+        'date': o.date, 'goat_id': o.goat_id,
+        'label': f'{o.type}: ${o.amount} ({o.category})', 'detail': _notes(o.description)}),
+}
+
+TYPES = [event_type for event_type, _ in SOURCES.values()]
+
+
+def _event(record):
+    event_type, describe = SOURCES[type(record)]
+    return event_type, describe(record)
+
+
+def record(instance):
+    """Write (or rewrite) the feed entry of a saved record."""
+    # Re-read it: records created from form input still hold the raw strings
+    # (dates, "2" rather than Decimal("2.00")) until loaded back
+    instance = type(instance).objects.get(pk=instance.pk)
+    event_type, fields = _event(instance)
+    ActivityEvent.objects.update_or_create(type=event_type, source_id=instance.pk, defaults=fields)
+
+
+def remove(instance):
+    event_type, _ = SOURCES[type(instance)]
+    ActivityEvent.objects.filter(type=event_type, source_id=instance.pk).delete()
+
+
+def entries(records):
+    """Unsaved feed entries for saved records of the ``SOURCES`` models, for
+    code that writes records with bulk_create (which sends no signals)."""
+    events = []
+    for instance in records:
+        event_type, fields = _event(instance)
+        events.append(ActivityEvent(type=event_type, source_id=instance.pk, **fields))
+    return events
+
+
+def backfill(rebuild=False):
+    """Create entries for records that don't have one yet. Returns the
+    number created."""
+    if rebuild:
+        ActivityEvent.objects.all().delete()
+    created = 0
+    for model, (event_type, _) in SOURCES.items():
+        existing = set(ActivityEvent.objects.filter(type=event_type).values_list('source_id', flat=True))
+        batch = []
+        for instance in model.objects.order_by('pk').iterator(chunk_size=BACKFILL_BATCH):
+            if instance.pk in existing:
+                continue
+            _, fields = _event(instance)
+            batch.append(ActivityEvent(type=event_type, source_id=instance.pk, **fields))
+            if len(batch) >= BACKFILL_BATCH:
+                created += len(ActivityEvent.objects.bulk_create(batch, ignore_conflicts=True))
+                batch = []
+        if batch:
+            created += len(ActivityEvent.objects.bulk_create(batch, ignore_conflicts=True))
+    return created
+
+
+def filtered(queryset, params):
+    """Apply the ``type`` (comma-separated, or ``all``) and ``goat`` filters.
+    Raises ValueError for a malformed goat id."""
+    types = params.get('type', 'all')
+    if types and types != 'all':
+        queryset = queryset.filter(type__in=types.split(','))
+    if params.get('goat'):
+        try:
+            queryset = queryset.filter(goat_id=int(params['goat']))
+        except ValueError:
+            raise ValueError('goat must be a goat id')
+    return queryset
+
+
+def encode_cursor(event):
+    raw = json.dumps([event.date.isoformat(), event.pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        day, pk = json.loads(raw)
+        return date.fromisoformat(day), int(pk)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Malformed cursor')
+
+
+def page(queryset, cursor=None, limit=PAGE_SIZE):
+    """One page, newest first. Returns ``(events, next_cursor)``; the cursor
+    is None on the last page."""
+    if cursor:
+        day, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date__lt=day) | Q(date=day, pk__lt=pk))
+    events = list(queryset.select_related('goat').order_by('-date', '-pk')[:limit + 1])
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = encode_cursor(events[-1])
+    return events, next_cursor
+
+
+def serialize(event):
+    icon, color = STYLES[event.type]
+    return {
+        'type': event.type,
+        'icon': icon,
+        'color': color,
+        'date': event.date.isoformat(),
+        'label': event.label,
+        'detail': event.detail,
+        'goat': {
+            'id': event.goat_id, 'name': event.goat.name, 'url': reverse('goat_detail', args=[event.goat_id]),
+        } if event.goat_id else None,
+        'goat_label': event.goat_label,
+    }
@@ -3,7 +3,7 @@ from .models import (Goat, GoatLog, GrazingArea, DailyTask, TaskCompletion, Vet,
     FeedingLog, BreedingLog, FeedItem, MilkLog, FarmSettings, Transaction, WeightLog, FarmEvent,
     Medicine, GoatPhoto, Customer, WaitingList, Sale, MeatHarvest, PastureAssignment, MapMarker,
     PastureCondition, MedicalSchedule, KiddingRecord, HealthScore, HeatObservation, GoatDocument,
-    Supplier, Pen, PenAssignment)
+    Supplier, Pen, PenAssignment, Alert)
 
 @admin.register(Goat)
 class GoatAdmin(admin.ModelAdmin):
@@ -198,4 +198,11 @@ class PenAdmin(admin.ModelAdmin):
 @admin.register(PenAssignment)
 class PenAssignmentAdmin(admin.ModelAdmin):
     list_display = ('goat', 'pen', 'date_in', 'date_out', 'is_active')
-    list_filter = ('pen', 'date_in')
\ No newline at end of file
+    list_filter = ('pen', 'date_in')
+
+
+@admin.register(Alert)
+class AlertAdmin(admin.ModelAdmin):
+    list_display = ('category', 'title', 'severity', 'message', 'due_date', 'evaluated_on')
+    list_filter = ('category', 'severity')
+    search_fields = ('title', 'message')
@@ -0,0 +1,249 @@
+"""Materialized alert store.
+
+Alerts are evaluated when the underlying records are written (see
+farm/signals.py) and stored in the ``Alert`` table, so the dashboards read
+them with a single indexed query instead of recomputing every category on
+each page load. Categories that depend on today's date are re-evaluated once
+per day by ``rollover()`` (``manage.py rollover_alerts``), which the
+dashboards also trigger lazily when the stored evaluation date is stale.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from . import fragments, schedules
+from .models import (Alert, BreedingLog, FarmSettings, FeedItem, Goat, MedicalRecord, Medicine,
+    Pen)
+
+KIDDING_OVERDUE_DAYS = 14
+KIDDING_LOOKAHEAD_DAYS = 21
+MEDICAL_LOOKAHEAD_DAYS = 14
+HEAT_LOOKAHEAD_DAYS = 3
+FAMACHA_THRESHOLD = 4
+
+DOE_GENDERS = ['Doe', 'Doeling']
+
+
+def _due_message(days_until):
+    if days_until < 0:
+        return f'Overdue by {abs(days_until)} days'
+    if days_until == 0:
+        return 'Due today'
+    return f'Due in {days_until} days'
+
+
+def _treatment_severity(days_until):
+    return 'danger' if days_until < 0 else 'warning' if days_until <= 3 else 'info'
+
+
+def _short_date(d):
+    return f"{d:%b} {d.day}"
+
+
+# --- Evaluators: each returns unsaved Alert rows for its category ---
+
+def _kidding(today, ids=None):
+    logs = BreedingLog.objects.filter(
+        due_date__isnull=False,
+        due_date__gte=today - timedelta(days=KIDDING_OVERDUE_DAYS),
+        due_date__lte=today + timedelta(days=KIDDING_LOOKAHEAD_DAYS),
+    ).select_related('goat')
+    if ids is not None:
+        logs = logs.filter(pk__in=ids)
+    for log in logs:
+        days_until = (log.due_date - today).days
+        yield Alert(
+            source_id=log.id, goat=log.goat, title=log.goat.name, due_date=log.due_date,
+            severity='danger' if days_until < 0 else 'warning' if days_until <= 7 else 'info',
+            message=_due_message(days_until),
+        )
+
+
+def _medical(today, ids=None):
+    records = MedicalRecord.objects.filter(
+        next_due_date__isnull=False,
+        next_due_date__lte=today + timedelta(days=MEDICAL_LOOKAHEAD_DAYS),
+    ).select_related('goat')
+    if ids is not None:
+        records = records.filter(pk__in=ids)
+    for rec in records:
+        days_until = (rec.next_due_date - today).days
+        yield Alert(
+            source_id=rec.id, goat=rec.goat, title=rec.goat.name, due_date=rec.next_due_date,
+            severity=_treatment_severity(days_until),
+            message=f'{rec.get_record_type_display()} — {_due_message(days_until)}',
+        )
+
+
+def _schedule(today, ids=None):
+    upcoming = schedules.next_occurrences(today + timedelta(days=schedules.DUE_SOON_DAYS))
+    for occurrence in upcoming:
+        if ids is not None and occurrence.schedule_id not in ids:
+            continue
+        days_until = (occurrence.date - today).days
+        yield Alert(
+            source_id=occurrence.schedule_id, goat_id=occurrence.goat_id,
+            title=occurrence.goat_name or 'Entire Herd',
+            due_date=occurrence.date, severity=_treatment_severity(days_until),
+            message=f'{occurrence.label} — {_due_message(days_until)} • Every {occurrence.interval_days} days',
+        )
+
+
+def _famacha(today, ids=None):
+    goats = Goat.objects.filter(
+        is_external=False, latest_famacha__gte=FAMACHA_THRESHOLD
+    ).exclude(status='Deceased')
+    if ids is not None:
+        goats = goats.filter(pk__in=ids)
+    for goat in goats:
+        label = 'Critical anemia' if goat.latest_famacha == 5 else 'Needs deworming'
+        yield Alert(
+            source_id=goat.id, goat=goat, title=goat.name, due_date=goat.latest_score_date,
+            severity='danger' if goat.latest_famacha == 5 else 'warning',
+            message=f'FAMACHA score {goat.latest_famacha} - {label} • Scored: {_short_date(goat.latest_score_date)}',
+        )
+
+
+def _heat(today, ids=None):
+    does = Goat.objects.filter(
+        gender__in=DOE_GENDERS, is_external=False,
+        latest_heat_date__gte=today - timedelta(days=21),
+        latest_heat_date__lte=today + timedelta(days=HEAT_LOOKAHEAD_DAYS - 21),
+    ).exclude(status='Deceased')
+    if ids is not None:
+        does = does.filter(pk__in=ids)
+    for goat in does:
+        predicted = goat.next_heat_date
+        yield Alert(
+            source_id=goat.id, goat=goat, title=goat.name, due_date=predicted,
+            severity='info', message=f'Predicted heat on {predicted:%b %d}',
+        )
+
+
+def _low_stock(today, ids=None):
+    items = FeedItem.objects.filter(quantity__lte=F('low_stock_threshold'))
+    if ids is not None:
+        items = items.filter(pk__in=ids)
+    for item in items:
+        yield Alert(
+            source_id=item.id, title=item.name,
+            severity='danger' if item.quantity == 0 else 'warning',
+            message=f'{item.quantity} {item.unit} remaining (threshold: {item.low_stock_threshold})',
+        )
+
+
+def _expired_med(today, ids=None):
+    meds = Medicine.objects.filter(expiration_date__lte=today)
+    if ids is not None:
+        meds = meds.filter(pk__in=ids)
+    for med in meds:
+        yield Alert(
+            source_id=med.id, title=med.name, due_date=med.expiration_date, severity='danger',
+            message=f'Expired on {med.expiration_date:%b %d, %Y}',
+        )
+
+
+def _overcrowded(today, ids=None):
+    pens = Pen.objects.annotate(
+        occupants=Count('assignments', filter=Q(assignments__date_out__isnull=True))
+    ).filter(occupants__gt=F('capacity'))
+    if ids is not None:
+        pens = pens.filter(pk__in=ids)
+    for pen in pens:
+        yield Alert(
+            source_id=pen.id, title=pen.name, severity='warning',
+            message=f'{pen.occupants}/{pen.capacity} capacity',
+        )
+
+
+EVALUATORS = {
+    'kidding': _kidding,
+    'medical': _medical,
+    'schedule': _schedule,
+    'famacha': _famacha,
+    'heat': _heat,
+    'low_stock': _low_stock,
+    'expired_med': _expired_med,
+    'overcrowded': _overcrowded,
+}
+
+# Categories whose outcome changes with the calendar date alone
+TIME_BASED = ['kidding', 'medical', 'schedule', 'heat', 'expired_med']
+
+
+def refresh(category, ids=None, today=None):
+    """Re-evaluate one category, limited to the given source ids if provided."""
+    today = today or timezone.localdate()
+    rows = list(EVALUATORS[category](today, ids))
+    for row in rows:
+        row.category = category
+        row.evaluated_on = today
+    with transaction.atomic():
+        stale = Alert.objects.filter(category=category)
+        if ids is not None:
+            stale = stale.filter(source_id__in=ids)
+        stale.delete()
+        Alert.objects.bulk_create(rows)
+    fragments.bump('alerts')
+
+
+def refresh_titles(goat):
+    """Re-evaluate the alerts of ``goat`` still titled with an old name.
+
+    Alerts copy the goat's name when they are built, so a rename would
+    otherwise show the old one until those records are next written.
+    """
+    stale = Alert.objects.filter(goat_id=goat.pk).exclude(title=goat.name).values_list('category', 'source_id')
+    by_category = {}
+    for category, source_id in stale:
+        by_category.setdefault(category, []).append(source_id)
+    for category, ids in by_category.items():
+        refresh(category, ids=ids)
+
+
+def _mark_evaluated(today):
+    FarmSettings.objects.filter(pk=1).update(alerts_evaluated_on=today)
+
+
+def rebuild(today=None):
+    """Rebuild the whole alert store from scratch."""
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        Alert.objects.all().delete()
+        for category in EVALUATORS:
+            refresh(category, today=today)
+        _mark_evaluated(today)
+
+
+def rollover(today=None):
+    """Re-evaluate the date-dependent categories for a new day."""
+    today = today or timezone.localdate()
+    with transaction.atomic():
+        for category in TIME_BASED:
+            refresh(category, today=today)
+        _mark_evaluated(today)
+
+
+def ensure_current(farm_settings):
+    """Run the daily rollover if it hasn't happened yet today.
+
+    A store that has never been evaluated is rebuilt from scratch.
+    """
+    today = timezone.localdate()
+    if farm_settings.alerts_evaluated_on is None:
+        rebuild(today)
+    elif farm_settings.alerts_evaluated_on < today:
+        rollover(today)
+    else:
+        return
+    farm_settings.alerts_evaluated_on = today
+
+
+def grouped():
+    """All stored alerts grouped by category, from a single query."""
+    groups = {category: [] for category in EVALUATORS}
+    for alert in Alert.objects.all():
+        groups[alert.category].append(alert)
+    return groups
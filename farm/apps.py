@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class FarmConfig(AppConfig):
     name = 'farm'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,241 @@
+"""Media backup archives.
+
+A media backup is a ZIP written as it is sent, one file at a time, so it
+never sits in memory and the first bytes leave straight away however large
+``MEDIA_ROOT`` is. Photos, PDFs and other files that are already compressed
+are stored as they are; only files that shrink (text, CSV, SVG...) are
+deflated.
+
+Every archive ends with ``manifest.json``, listing the path, size, mtime and
+SHA-256 of every file in ``MEDIA_ROOT`` when it was made. An incremental
+archive is made against an earlier manifest and holds only the files added
+or changed since, but its manifest still lists every file, so deletions
+carry through. ``restore`` (``manage.py restore_media``) applies a full
+archive followed by its incrementals.
+"""
+import hashlib
+import json
+import os
+import posixpath
+import uuid
+import zipfile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils._os import safe_join
+
+MANIFEST = 'manifest.json'
+CHUNK_SIZE = 64 * 1024
+
+# Formats that are already compressed: deflating them again costs CPU for
+# a percent or two
+STORED = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.heic', '.heif',
+    '.pdf', '.zip', '.gz', '.bz2', '.xz', '.7z', '.docx', '.xlsx', '.pptx',
+    '.mp3', '.m4a', '.mp4', '.mov', '.webm',
+}
+
+
+class InvalidArchive(ValueError):
+    pass
+
+
+class _Sink:
+    """Unseekable write target for ZipFile that hands back what was written."""
+
+    def __init__(self):
+        self.pending = []
+
+    def write(self, data):
+        self.pending.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.pending)
+        self.pending = []
+        return data
+
+
+def _scan(root):
+    """``(name, path, stat)`` for every file under ``root``, names relative
+    and '/'-separated, in a stable order."""
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            yield name, path, os.stat(path)
+
+
+def _hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _unchanged(old, path, stat):
+    # Same size and mtime: taken as unchanged without reading it. Same size,
+    # new mtime (touched, or copied back): unchanged if the contents hash the same
+    if old is None or old['size'] != stat.st_size:
+        return False
+    return old['mtime_ns'] == stat.st_mtime_ns or old['sha256'] == _hash(path)
+
+
+def _add(zf, sink, name, path, entry):
+    """Write one file into the archive, yielding output as it is produced.
+    Fills in ``entry['sha256']`` from the bytes written."""
+    info = zipfile.ZipInfo.from_file(path, name, strict_timestamps=False)
+    stored = posixpath.splitext(name)[1].lower() in STORED
+    info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f, zf.open(info, 'w') as out:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+            out.write(chunk)
+            data = sink.take()
+            if data:
+                yield data
+    entry['sha256'] = digest.hexdigest()
+
+
+def stream(root, base=None):
+    """Yield a ZIP of ``root``: every file, or with ``base`` (an earlier
+    manifest) only those added or changed since."""
+    previous = base['files'] if base else {}
+    manifest = {
+        'id': uuid.uuid4().hex,
+        'base': base['id'] if base else None,
+        'created': timezone.now().isoformat(),
+        'files': {},
+    }
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', strict_timestamps=False) as zf:
+        for name, path, stat in _scan(root):
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            old = previous.get(name)
+            if _unchanged(old, path, stat):
+                entry['sha256'] = old['sha256']
+            else:
+                yield from _add(zf, sink, name, path, entry)
+            manifest['files'][name] = entry
+        zf.writestr(MANIFEST, json.dumps(manifest, indent=1), compress_type=zipfile.ZIP_DEFLATED)
+    data = sink.take()
+    if data:
+        yield data
+
+
+def download(root, base=None):
+    """Attachment response streaming an archive of ``root``."""
+    filename = f'goatos_media_incremental_{timezone.localdate():%Y%m%d}.zip' if base else 'goatos_media_backup.zip'
+    response = StreamingHttpResponse(stream(root, base), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _check(manifest):
+    if not isinstance(manifest, dict) or not {'id', 'base', 'files'} <= manifest.keys() \
+            or not isinstance(manifest['files'], dict):
+        raise InvalidArchive('Not a GoatOS media backup manifest')
+    for entry in manifest['files'].values():
+        if not isinstance(entry, dict) or not {'size', 'mtime_ns', 'sha256'} <= entry.keys():
+            raise InvalidArchive('Not a GoatOS media backup manifest')
+    return manifest
+
+
+def read_manifest(source):
+    """The manifest of an archive, or of a ``manifest.json`` on its own.
+    ``source`` is a path or a file object. Raises InvalidArchive."""
+    try:
+        if zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as zf:
+                manifest = json.loads(zf.read(MANIFEST))
+        elif hasattr(source, 'read'):
+            source.seek(0)
+            manifest = json.load(source)
+        else:
+            with open(source, 'rb') as f:
+                manifest = json.load(f)
+    except (KeyError, ValueError, zipfile.BadZipFile):
+        raise InvalidArchive('Not a GoatOS media backup (no readable manifest.json)')
+    return _check(manifest)
+
+
+def chain(paths):
+    """Manifests of ``paths``, checked to be a full archive followed by
+    incrementals each made against the one before."""
+    manifests = [read_manifest(path) for path in paths]
+    if not manifests:
+        raise InvalidArchive('No archives given')
+    if manifests[0]['base'] is not None:
+        raise InvalidArchive(f'{paths[0]} is incremental; start with a full backup')
+    for path, manifest, prior in zip(paths[1:], manifests[1:], manifests):
+        if manifest['base'] != prior['id']:
+            raise InvalidArchive(f"{path} wasn't made against the archive before it")
+    return manifests
+
+
+def _extract(zf, name, target, entry):
+    partial = target + '.partial'
+    digest = hashlib.sha256()
+    with zf.open(name) as src, open(partial, 'wb') as out:
+        while chunk := src.read(CHUNK_SIZE):
+            digest.update(chunk)
+            out.write(chunk)
+    if digest.hexdigest() != entry['sha256']:
+        os.remove(partial)
+        raise InvalidArchive(f'{name} is damaged (checksum mismatch)')
+    os.replace(partial, target)
+    os.utime(target, ns=(entry['mtime_ns'], entry['mtime_ns']))
+
+
+def restore(paths, root):
+    """Bring ``root`` to the state of the last archive in ``paths`` (a full
+    archive, then its incrementals in order). Returns ``(written, removed)``
+    counts."""
+    manifests = chain(paths)
+    final = manifests[-1]['files']
+    for name in final:
+        try:
+            safe_join(root, name)
+        except SuspiciousFileOperation:
+            raise InvalidArchive(f'Unsafe path in manifest: {name}')
+    # Newest archive first, so each file is written once, from the archive
+    # holding its final version; files already matching are left alone
+    settled = set()
+    for name, entry in final.items():
+        path = safe_join(root, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']:
+                settled.add(name)
+    written = 0
+    for path, manifest in zip(reversed(paths), reversed(manifests)):
+        with zipfile.ZipFile(path) as zf:
+            for name in zf.namelist():
+                entry = final.get(name)
+                held = manifest['files'].get(name)
+                # A file only touched since keeps its bytes, and gets the final mtime
+                if name in settled or entry is None or held is None or held['sha256'] != entry['sha256']:
+                    continue
+                target = safe_join(root, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                _extract(zf, name, target, entry)
+                settled.add(name)
+                written += 1
+    missing = final.keys() - settled
+    if missing:
+        raise InvalidArchive(f'{len(missing)} files are in no archive given, e.g. {min(missing)}')
+    # Files the chain knew about that were deleted by the end of it
+    removed = 0
+    for name in set().union(*(m['files'] for m in manifests[:-1])) - final.keys():
+        path = safe_join(root, name)
+        if os.path.isfile(path):
+            os.remove(path)
+            removed += 1
+    return written, removed
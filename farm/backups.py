@@ -0,0 +1,224 @@
+"""Database backups.
+
+Backups are taken with SQLite's online backup API
+(``sqlite3.Connection.backup``) rather than by reading ``db.sqlite3`` off
+disk, so a copy made while a gunicorn worker is writing is still a
+consistent database, never a torn file. The copy is made a few megabytes
+at a time (``PAGES_PER_STEP``), releasing the lock between steps so
+writers aren't held up for the whole backup.
+
+A download is copied to a temporary file and streamed from there in
+``CHUNK_SIZE`` pieces, optionally gzipped, so memory use doesn't grow with
+the database. ``manage.py backup_database`` writes the same copy into
+``BACKUP_DIR`` and keeps the newest ``BACKUP_KEEP``; supervisord runs it
+every ``BACKUP_INTERVAL`` seconds in the Docker image.
+
+A restore goes the other way while the farm keeps running. The upload is
+checked first (SQLite header, ``PRAGMA integrity_check``, and migrations no
+newer than this code), the current database is saved to ``BACKUP_DIR``, and
+the upload is copied into the live database in a single backup step, which
+holds the write lock throughout so no worker sees it half-loaded. Missing
+migrations are then applied. A restore generation in the shared cache
+tells every worker (``RestoreMiddleware``) to drop its connections and the
+caches it holds in-process, and every fragment section is bumped.
+"""
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.loader import MigrationLoader
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from . import fragments, inbreeding, pedigree
+
+PAGES_PER_STEP = 1024  # 4 MB with SQLite's default 4 KiB pages
+CHUNK_SIZE = 64 * 1024
+FILENAME = 'goatos_backup.sqlite3'
+HEADER = b'SQLite format 3\x00'
+GZIP_MAGIC = b'\x1f\x8b'
+GENERATION_KEY = 'backups:restore-generation'
+
+# goatos-20250301-021500.sqlite3[.gz]; the names sort oldest first
+_SAVED = re.compile(r'^goatos-\d{8}-\d{6}\.sqlite3(\.gz)?$')
+
+
+def snapshot(path, source=None):
+    """Copy the database (or the ``source`` sqlite3 connection) into a new
+    file at ``path``. Returns its size in bytes."""
+    if source is None:
+        _outside_transaction('back up')
+        connection.ensure_connection()
+        source = connection.connection
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target, pages=PAGES_PER_STEP)
+    finally:
+        target.close()
+    return os.path.getsize(path)
+
+
+def _temporary_snapshot(source=None):
+    # Unlinked once open: the data lasts until the download closes the file,
+    # and nothing is left behind if the client disconnects
+    fd, path = tempfile.mkstemp(prefix='goatos-backup-', suffix='.sqlite3')
+    os.close(fd)
+    try:
+        snapshot(path, source)
+        return open(path, 'rb')
+    finally:
+        os.unlink(path)
+
+
+def _gzipped(f):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # gzip container
+    with f:
+        while chunk := f.read(CHUNK_SIZE):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    yield compressor.flush()
+
+
+def download(compress=False, source=None):
+    """Attachment response with a fresh copy of the database."""
+    f = _temporary_snapshot(source)
+    if compress:
+        response = StreamingHttpResponse(_gzipped(f), content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="{FILENAME}.gz"'
+        return response
+    response = FileResponse(f, as_attachment=True, filename=FILENAME, content_type='application/x-sqlite3')
+    response.block_size = CHUNK_SIZE
+    return response
+
+
+def save(directory=None, keep=None, compress=False):
+    """Write a timestamped copy into ``directory`` (``BACKUP_DIR``), then
+    remove all but the newest ``keep`` (``BACKUP_KEEP``). Returns the path."""
+    directory = directory or settings.BACKUP_DIR
+    keep = settings.BACKUP_KEEP if keep is None else keep
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'goatos-{timezone.localtime():%Y%m%d-%H%M%S}.sqlite3')
+    # Written under a name prune() ignores, and renamed when complete
+    partial = path + '.partial'
+    snapshot(partial)
+    if compress:
+        with open(partial, 'rb') as f, open(partial + '.gz', 'wb') as out:
+            for chunk in _gzipped(f):
+                out.write(chunk)
+        os.remove(partial)
+        partial, path = partial + '.gz', path + '.gz'
+    os.replace(partial, path)
+    prune(directory, keep)
+    return path
+
+
+def saved(directory=None):
+    """File names of the backups in ``directory``, oldest first."""
+    directory = directory or settings.BACKUP_DIR
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if _SAVED.match(name))
+
+
+def prune(directory, keep):
+    """Delete all but the newest ``keep`` backups (0 keeps them all).
+    Returns the names removed."""
+    names = saved(directory)
+    removed = names[:-keep] if keep else []
+    for name in removed:
+        os.remove(os.path.join(directory, name))
+    return removed
+
+
+class InvalidBackup(ValueError):
+    pass
+
+
+def _outside_transaction(action):
+    # The backup API needs the source's or destination's lock, which its own
+    # connection's open transaction would hold forever
+    if connection.in_atomic_block:
+        raise RuntimeError(f"Can't {action} the database from inside a transaction")
+
+
+def unpack(upload, path):
+    """Write an uploaded backup (``.sqlite3`` or gzipped) to ``path``."""
+    head = upload.read(2)
+    upload.seek(0)
+    source = gzip.GzipFile(fileobj=upload) if head == GZIP_MAGIC else upload
+    try:
+        with open(path, 'wb') as out:
+            shutil.copyfileobj(source, out, CHUNK_SIZE)
+    except (OSError, EOFError):
+        raise InvalidBackup('The compressed backup is damaged.')
+
+
+def validate(path):
+    """Check that ``path`` is a sound GoatOS database this code can run on.
+    Returns the number of migrations it is missing. Raises InvalidBackup."""
+    with open(path, 'rb') as f:
+        if f.read(len(HEADER)) != HEADER:
+            raise InvalidBackup('Invalid file. Must be a valid SQLite database.')
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        problems = [row[0] for row in db.execute('PRAGMA integrity_check')]
+        if problems != ['ok']:
+            raise InvalidBackup(f'The backup is damaged: {problems[0]}')
+        applied = set(db.execute('SELECT app, name FROM django_migrations'))
+    except sqlite3.DatabaseError as e:
+        # Includes a missing django_migrations table: not a GoatOS database
+        raise InvalidBackup(f'Not a usable GoatOS backup ({e}).')
+    finally:
+        db.close()
+    known = set(MigrationLoader(None, ignore_no_migrations=True).disk_migrations)
+    if not applied & known:
+        raise InvalidBackup('Not a GoatOS backup (no known migrations applied).')
+    if applied - known:
+        raise InvalidBackup('The backup was made by a newer version of GoatOS.')
+    return len(known - applied)
+
+
+def restore(path):
+    """Replace the live database with the (validated) backup at ``path``.
+    Returns the path the previous database was saved to."""
+    _outside_transaction('restore')
+    pending = validate(path)
+    previous = save(compress=True)
+    connection.ensure_connection()
+    source = sqlite3.connect(path)
+    try:
+        # pages=-1: one step, so the write lock is held until the copy is complete
+        source.backup(connection.connection, pages=-1)
+    except sqlite3.OperationalError as e:
+        # e.g. a WAL database can't take a backup with a different page size
+        raise InvalidBackup(f"The backup couldn't be loaded ({e}).")
+    finally:
+        source.close()
+    if pending:
+        call_command('migrate', interactive=False, verbosity=0)
+    fragments.bump(*fragments.SECTIONS)
+    cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+    reset()
+    return previous
+
+
+def generation():
+    """Stamp of the last restore, as seen by every worker sharing the cache."""
+    return cache.get(GENERATION_KEY, 0)
+
+
+def reset():
+    """Drop this process's database connections and in-process caches."""
+    connections.close_all()
+    pedigree._graph = None
+    inbreeding._engine = None
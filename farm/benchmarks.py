@@ -0,0 +1,293 @@
+"""Per-view benchmarks across herd sizes.
+
+``manage.py benchmark_views`` generates a synthetic farm (farm/synthetic.py)
+at each scale in a scratch database and requests every named URL of
+goatos/urls.py through the test client, recording per view:
+
+* ``cold_ms``: median wall time with an empty cache (every fragment rebuilt);
+* ``warm_ms``: one more request with the cache as the cold ones left it;
+* ``queries`` / ``db_ms``: of the last cold request;
+* ``peak_kib``: Python allocation peak of a cold request (tracemalloc,
+  measured separately so its overhead stays out of the timings);
+* ``bytes`` and ``status`` of the response.
+
+URL arguments are filled from the generated data (the goat with the most
+milk records, the first of anything else). Each request runs in a
+transaction that is rolled back, so views that write on GET leave the data
+as the next view expects it. ``growth`` fits how a view's time grows with
+the herd, and ``compare`` lines a run up against a saved baseline.
+"""
+from contextlib import contextmanager
+import math
+import os
+import statistics
+import tempfile
+import tracemalloc
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from . import backups, calendar_feed, perf
+from .models import (BreedingLog, Customer, DailyTask, FarmEvent, FeedingLog, FeedItem, Goat, GoatDocument, GoatLog,
+    GoatPhoto, GrazingArea, HealthScore, HeatObservation, KiddingRecord, MapMarker, MedicalRecord, MedicalSchedule,
+    MilkLog, PastureAssignment, Pen, Sale, Supplier, Transaction, Vet, WeightLog)
+
+# URL names left out, and why
+SKIP = {
+    'api_weather': 'calls the external weather service',
+    'backup_database': 'copies the database file (see benchmark_backup)',
+    'backup_media': 'archives MEDIA_ROOT, which the dataset has nothing in',
+    'restore_database': 'replaces the database',
+    'media': 'serves an uploaded file',
+}
+
+# URL keyword -> model whose first row fills it; MODELS overrides it per URL
+# name where the keyword is shared by several record types
+PARAMETERS = {
+    'goat_id': Goat, 'item_id': FeedItem, 'task_id': DailyTask, 'event_id': FarmEvent, 'vet_id': Vet,
+    'photo_id': GoatPhoto, 'txn_id': Transaction, 'sale_id': Sale, 'customer_id': Customer,
+    'assignment_id': PastureAssignment, 'area_id': GrazingArea, 'marker_id': MapMarker,
+    'schedule_id': MedicalSchedule, 'score_id': HealthScore, 'observation_id': HeatObservation,
+    'doc_id': GoatDocument, 'supplier_id': Supplier, 'pen_id': Pen,
+}
+MODELS = {
+    'delete_medical_record': MedicalRecord,
+    'delete_kidding_record': KiddingRecord,
+    'delete_milk_log': MilkLog,
+    'delete_weight_log': WeightLog,
+    'delete_feeding_log': FeedingLog,
+    'delete_breeding_log': BreedingLog,
+    'delete_goat_log': GoatLog,
+}
+DEFAULTS = {'slug': 'getting-started'}
+
+
+def _query(today):
+    # Query strings the page's own scripts send, e.g. the calendar's month grid
+    start, end = calendar_feed.month_grid(today)
+    return {'api_calendar_events': {'start': start.isoformat(), 'end': end.isoformat()}}
+
+# A view "grows super-linearly" when its time grows faster than the herd,
+# above a floor where timings are mostly noise
+SUPERLINEAR = 1.1
+NOISE_FLOOR_MS = 10
+# Baseline comparison: flagged when this much slower and by at least the floor
+REGRESSION = 0.25
+
+
+class _Rollback(Exception):
+    pass
+
+
+def views():
+    """``(name, keyword names)`` of every named URL, admin and ``SKIP``
+    excluded, in urls.py order."""
+    found = []
+
+    def walk(patterns):
+        for entry in patterns:
+            if isinstance(entry, URLResolver):
+                if not entry.namespace:
+                    walk(entry.url_patterns)
+            elif isinstance(entry, URLPattern) and entry.name and entry.name not in SKIP:
+                found.append((entry.name, list(entry.pattern.converters)))
+    walk(get_resolver().url_patterns)
+    return found
+
+
+def _first_pk(model):
+    return model.objects.order_by('pk').values_list('pk', flat=True).first() or 0
+
+
+def arguments(today=None):
+    """Keyword values for the URLs: ``(url name or keyword) -> value``."""
+    today = today or timezone.localdate()
+    busiest = (MilkLog.objects.values('goat').annotate(n=Count('pk')).order_by('-n', 'goat')
+               .values_list('goat', flat=True).first())
+    values = {keyword: _first_pk(model) for keyword, model in PARAMETERS.items()}
+    values['goat_id'] = busiest or values['goat_id']
+    values['date_str'] = today.isoformat()
+    values.update(DEFAULTS)
+    values.update({name: _first_pk(model) for name, model in MODELS.items()})
+    values['query'] = _query(today)
+    return values
+
+
+def url_for(name, keywords, values):
+    kwargs = {}
+    for keyword in keywords:
+        kwargs[keyword] = values[name] if name in MODELS and keyword.endswith('_id') else values[keyword]
+    url = reverse(name, kwargs=kwargs)
+    if name in values['query']:
+        url += '?' + urlencode(values['query'][name])
+    return url
+
+
+def _request(client, url):
+    """GET ``url`` inside a rolled-back transaction. Returns ``(status,
+    bytes)``; streamed bodies are read to the end."""
+    outcome = []
+    try:
+        with transaction.atomic():
+            response = client.get(url)
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            response.close()
+            outcome.append((response.status_code, size))
+            raise _Rollback
+    except _Rollback:
+        pass
+    return outcome[0]
+
+
+def bench(client, url, repeat=3):
+    """Measurements of one URL (see the module docstring)."""
+    cold = []
+    for _ in range(repeat):
+        cache.clear()
+        with perf.measure() as sample:
+            status, size = _request(client, url)
+        cold.append(sample)
+    with perf.measure() as warm:
+        _request(client, url)
+    cache.clear()
+    tracemalloc.start()
+    try:
+        _request(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'url': url,
+        'status': status,
+        'bytes': size,
+        'cold_ms': round(statistics.median(s.wall_time for s in cold) * 1000, 2),
+        'warm_ms': round(warm.wall_time * 1000, 2),
+        'queries': cold[-1].queries,
+        'db_ms': round(cold[-1].db_time * 1000, 2),
+        'peak_kib': peak // 1024,
+    }
+
+
+def run(names=None, repeat=3, progress=None):
+    """Benchmark the named URLs (all of them by default) against the
+    current database. Returns ``{name: measurements}``."""
+    values = arguments()
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['testserver'], FARM_PIN=None):
+        client = Client(raise_request_exception=False)
+        for name, keywords in views():
+            if names and name not in names:
+                continue
+            results[name] = bench(client, url_for(name, keywords, values), repeat)
+            if progress:
+                progress(name, results[name])
+    return results
+
+
+@contextmanager
+def scratch_database():
+    """Point the default connection at an empty, migrated database in a
+    temporary file, with a private in-memory cache, for the duration."""
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    saved = test_settings.get('NAME')
+    caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}}
+    with tempfile.TemporaryDirectory(prefix='goatos-bench-') as directory, override_settings(CACHES=caches):
+        test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cache.clear()
+            yield
+        finally:
+            backups.reset()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = saved
+
+
+# --- Analysis ---
+
+def growth(measurements, metric='cold_ms'):
+    """Exponent ``k`` of ``metric ~ goats ** k`` between the smallest and
+    largest scale (1: linear, 2: quadratic), or None when there is too
+    little to fit. ``measurements`` maps scale -> one view's measurements."""
+    scales = sorted(measurements, key=int)
+    if len(scales) < 2:
+        return None
+    small, large = scales[0], scales[-1]
+    a, b = measurements[small][metric], measurements[large][metric]
+    if a <= 0 or b <= 0:
+        return None
+    return math.log(b / a) / math.log(int(large) / int(small))
+
+
+def flags(measurements):
+    """Scaling problems of one view across scales."""
+    found = []
+    scales = sorted(measurements, key=int)
+    largest = measurements[scales[-1]]
+    exponent = growth(measurements)
+    if exponent is not None and exponent > SUPERLINEAR and largest['cold_ms'] >= NOISE_FLOOR_MS:
+        found.append(f'super-linear (x^{exponent:.2f})')
+    if len(scales) > 1 and largest['queries'] > measurements[scales[0]]['queries']:
+        found.append(f"queries grow ({measurements[scales[0]]['queries']} -> {largest['queries']})")
+    statuses = {m['status'] for m in measurements.values()}
+    if statuses - {200}:
+        found.append('status ' + '/'.join(str(s) for s in sorted(statuses)))
+    return found
+
+
+def compare(results, baseline):
+    """``(view, scale, old, new, reasons)`` for measurements that regressed
+    against ``baseline``: cold time up by more than ``REGRESSION``, more
+    queries, or a different status (timings of different outcomes aren't
+    compared)."""
+    regressions = []
+    for name, scales in results['views'].items():
+        old_scales = baseline.get('views', {}).get(name, {})
+        for scale, new in scales.items():
+            old = old_scales.get(scale)
+            if old is None:
+                continue
+            if old['status'] != new['status']:
+                reasons = [f"status {old['status']} -> {new['status']}"]
+            else:
+                reasons = []
+                if new['cold_ms'] > old['cold_ms'] * (1 + REGRESSION) \
+                        and new['cold_ms'] - old['cold_ms'] >= NOISE_FLOOR_MS:
+                    reasons.append(f"{old['cold_ms']:.1f} -> {new['cold_ms']:.1f} ms")
+                if new['queries'] > old['queries']:
+                    reasons.append(f"{old['queries']} -> {new['queries']} queries")
+            if reasons:
+                regressions.append((name, scale, old, new, reasons))
+    return regressions
+
+
+def report(results, baseline=None):
+    """Plain-text report of a run (the JSON ``benchmark_views`` writes),
+    optionally against a baseline run."""
+    scales = [str(s) for s in results['scales']]
+    lines = [f"Views at {', '.join(scales)} goats ({results['years']:g} years of records, seed {results['seed']})", '']
+    header = f"{'view':<28}" + ''.join(f"{'ms@' + s:>10}" for s in scales) + \
+        ''.join(f"{'q@' + s:>8}" for s in scales) + f"{'KiB@' + scales[-1]:>11}  flags"
+    lines.append(header)
+    ordered = sorted(results['views'].items(), key=lambda item: -item[1][scales[-1]]['cold_ms'])
+    for name, measurements in ordered:
+        row = f'{name:<28}'
+        row += ''.join(f"{measurements[s]['cold_ms']:>10.1f}" for s in scales)
+        row += ''.join(f"{measurements[s]['queries']:>8}" for s in scales)
+        row += f"{measurements[scales[-1]]['peak_kib']:>11}  {', '.join(flags(measurements))}"
+        lines.append(row.rstrip())
+    if baseline is not None:
+        regressions = compare(results, baseline)
+        lines += ['', f"Against the baseline of {baseline.get('created', '?')}: "
+                      f"{len(regressions)} regression{'s' if len(regressions) != 1 else ''}"]
+        for name, scale, _, _, reasons in regressions:
+            lines.append(f"  {name} @ {scale} goats: {', '.join(reasons)}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,118 @@
+"""Calendar events for one visible date range.
+
+FullCalendar asks ``/api/calendar/events/?start=&end=`` for each range it
+shows. Every source is read with an indexed range filter on its date column,
+and the assembled list is cached in the ``calendar`` fragment section (see
+farm/fragments.py), keyed by the range, so it is rebuilt only after one of
+the source tables is written.
+"""
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+
+from . import fragments, schedules
+from .models import BreedingLog, FarmEvent, HeatObservation, KiddingRecord, MedicalRecord
+
+HEAT_CYCLE_DAYS = 21  # HeatObservation.next_heat_date
+# Predictions are only shown for cycles that haven't long passed
+PREDICTED_HEAT_GRACE_DAYS = 7
+MAX_RANGE_DAYS = 400
+
+CATEGORY_COLORS = {
+    'Vet': '#f44336',
+    'Show': '#FF9800',
+    'Breeding': '#9C27B0',
+    'Maintenance': '#607D8B',
+    'Purchase': '#4CAF50',
+}
+
+
+def _goat_url(goat_id):
+    return reverse('goat_detail', args=[goat_id])
+
+
+def _system_event(title, day, color, goat_id=None):
+    return {
+        'title': title,
+        'start': day.isoformat(),
+        'color': color,
+        'url': _goat_url(goat_id) if goat_id else '',
+        'editable': False,
+    }
+
+
+def _build(start, end, today):
+    # ``end`` is exclusive, as FullCalendar sends it
+    last = end - timedelta(days=1)
+    events = []
+
+    for log in BreedingLog.objects.filter(due_date__range=(start, last)).select_related('goat'):
+        events.append(_system_event(f"👶 Due: {log.goat.name}", log.due_date, '#9C27B0', log.goat_id))
+
+    records = MedicalRecord.objects.filter(next_due_date__range=(start, last)).select_related('goat')
+    for record in records:
+        events.append(_system_event(
+            f"🏥 {record.get_record_type_display()}: {record.goat.name}",
+            record.next_due_date, '#e91e63', record.goat_id,
+        ))
+
+    # Every dose in the range, not just the next one (farm/schedules.py)
+    for occurrence in schedules.occurrences(start, last):
+        events.append(_system_event(
+            f"🔁 {occurrence.label}: {occurrence.target}",
+            occurrence.date, '#FF5722', occurrence.goat_id,
+        ))
+
+    cycle = timedelta(days=HEAT_CYCLE_DAYS)
+    for obs in HeatObservation.objects.filter(date_observed__range=(start, last)).select_related('goat'):
+        events.append(_system_event(f"🔥 Heat: {obs.goat.name}", obs.date_observed, '#E91E63', obs.goat_id))
+    # Predicted heats falling in the range come from observations one cycle earlier
+    predicted_from = max(start, today - timedelta(days=PREDICTED_HEAT_GRACE_DAYS)) - cycle
+    observed = HeatObservation.objects.filter(
+        date_observed__range=(predicted_from, last - cycle)
+    ).select_related('goat')
+    for obs in observed:
+        events.append(_system_event(
+            f"🔮 Predicted Heat: {obs.goat.name}", obs.next_heat_date, '#FF80AB', obs.goat_id,
+        ))
+
+    for kr in KiddingRecord.objects.filter(kidding_date__range=(start, last)).select_related('dam'):
+        events.append(_system_event(
+            f"🐣 Kidding: {kr.dam.name} ({kr.birth_type})", kr.kidding_date, '#4CAF50', kr.dam_id,
+        ))
+
+    # Custom events overlapping the range; multi-day ones may start before it
+    custom = (
+        FarmEvent.objects.filter(date__lte=last, date__gte=start)
+        | FarmEvent.objects.filter(date__lt=start, end_date__gte=start)
+    )
+    for event in custom:
+        event_data = {
+            'id': event.id,
+            'title': f"{event.title}",
+            'start': event.date.isoformat(),
+            'color': CATEGORY_COLORS.get(event.category, '#2196F3'),
+            'extendedProps': {'type': 'custom', 'category': event.category},
+        }
+        if event.end_date:
+            # FullCalendar end dates are exclusive
+            event_data['end'] = (event.end_date + timedelta(days=1)).isoformat()
+        events.append(event_data)
+
+    return events
+
+
+def events(start, end):
+    """FullCalendar event dicts for ``start`` <= day < ``end``."""
+    today = timezone.localdate()
+    return fragments.cached(
+        'calendar', 'events', lambda: _build(start, end, today), start, end, today,
+    )
+
+
+def month_grid(day):
+    """``(start, end)`` the month view asks for when showing ``day``'s month:
+    six weeks from the week before the 1st."""
+    start = day.replace(day=1) - timedelta(days=7)
+    return start, start + timedelta(days=42)
@@ -0,0 +1,100 @@
+"""Per-goat cost breakdown for the cost analysis page.
+
+The whole breakdown is two grouped queries, one over ``Transaction`` with a
+conditional sum per column and one over ``Sale``, however large the herd.
+"""
+from django.db.models import DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Goat, Sale, Transaction
+
+# Expense categories broken out into their own columns
+EXPENSE_COLUMNS = {
+    'feed_cost': 'Feed',
+    'vet_cost': 'Vet',
+    'equip_cost': 'Equipment',
+}
+
+# Sales are goat sales, so a category filter without this leaves them out
+SALE_CATEGORY = 'Goat Sale'
+
+FIELDS = ['goat_id', 'goat', 'feed_cost', 'vet_cost', 'equip_cost', 'expenses', 'income', 'net']
+
+
+def _sum(amount_field, condition=None):
+    return Coalesce(
+        Sum(amount_field, filter=condition),
+        Value(0), output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def breakdown(start=None, end=None, categories=None):
+    """Expenses and income per herd goat, most profitable first.
+
+    ``start``/``end`` bound the transaction and sale dates (inclusive);
+    ``categories`` limits transactions to those categories. Goats without
+    any matching money in or out are left out.
+    """
+    transactions = Transaction.objects.filter(goat__is_external=False)
+    sales = Sale.objects.filter(goat__is_external=False)
+    if start:
+        transactions = transactions.filter(date__gte=start)
+        sales = sales.filter(sale_date__gte=start)
+    if end:
+        transactions = transactions.filter(date__lte=end)
+        sales = sales.filter(sale_date__lte=end)
+    if categories:
+        transactions = transactions.filter(category__in=categories)
+        if SALE_CATEGORY not in categories:
+            sales = sales.none()
+
+    expense = Q(type='Expense')
+    totals = {
+        row['goat']: row
+        for row in transactions.order_by().values('goat').annotate(
+            expenses=_sum('amount', expense),
+            income=_sum('amount', Q(type='Income')),
+            **{column: _sum('amount', expense & Q(category=category))
+               for column, category in EXPENSE_COLUMNS.items()},
+        )
+    }
+    sale_income = dict(
+        sales.order_by().values('goat').annotate(total=Sum('sale_price')).values_list('goat', 'total')
+    )
+
+    goat_ids = set(totals) | set(sale_income)
+    goats = Goat.objects.only('id', 'name').in_bulk(goat_ids)
+    analysis = []
+    for goat_id in goat_ids:
+        row = totals.get(goat_id, {})
+        expenses = float(row.get('expenses', 0))
+        income = float(row.get('income', 0)) + float(sale_income.get(goat_id) or 0)
+        if expenses <= 0 and income <= 0:
+            continue
+        entry = {
+            'goat': goats[goat_id],
+            'expenses': expenses,
+            'income': income,
+            'net': income - expenses,
+        }
+        for column in EXPENSE_COLUMNS:
+            entry[column] = float(row.get(column, 0))
+        analysis.append(entry)
+
+    analysis.sort(key=lambda a: (-a['net'], a['goat'].name))
+    return analysis
+
+
+def rows(analysis):
+    """Flat, JSON/CSV-ready rows of a breakdown, in ``FIELDS`` order."""
+    for a in analysis:
+        yield {
+            'goat_id': a['goat'].id,
+            'goat': a['goat'].name,
+            'feed_cost': round(a['feed_cost'], 2),
+            'vet_cost': round(a['vet_cost'], 2),
+            'equip_cost': round(a['equip_cost'], 2),
+            'expenses': round(a['expenses'], 2),
+            'income': round(a['income'], 2),
+            'net': round(a['net'], 2),
+        }
@@ -0,0 +1,88 @@
+"""SQLite performance profile.
+
+Every new database connection gets the pragmas of ``SQLITE_PROFILE``
+(``connection_created``, see farm/signals.py), with ``SQLITE_PRAGMAS``
+overriding single values. The ``performance`` profile is there for two
+gunicorn workers and several people logging at milking time:
+
+* WAL journaling, so readers and the writer no longer block each other
+  and a commit appends to the log instead of rewriting pages;
+* ``synchronous=NORMAL``, safe with WAL (a power cut can lose the last
+  commits, never corrupt the file) and far fewer fsyncs;
+* a ``busy_timeout``, so a writer waits for the lock rather than failing
+  with "database is locked";
+* memory-mapped reads, a larger page cache and in-memory temp tables.
+
+Connections are kept between requests (``DB_CONN_MAX_AGE``), and every
+``SQLITE_OPTIMIZE_INTERVAL`` seconds a worker runs ``PRAGMA optimize`` at
+the end of a request so the query planner's statistics stay current.
+``default`` leaves SQLite's own settings alone. ``manage.py
+benchmark_sqlite`` compares the two with parallel writer processes.
+"""
+import atexit
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+PROFILES = {
+    'default': {},
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # ms
+        'mmap_size': 256 * 1024 * 1024,  # bytes; address space, not memory
+        'cache_size': -32000,  # negative: KiB, so about 32 MB per connection
+        'temp_store': 'MEMORY',
+    },
+}
+
+_PRAGMA = re.compile(r'^[a-z_]+$')
+_VALUE = re.compile(r'^-?\w+$')
+
+_optimized_at = time.monotonic()
+
+
+def pragmas(profile=None):
+    """The pragmas to apply: the profile's, with ``SQLITE_PRAGMAS`` on top."""
+    profile = profile or getattr(settings, 'SQLITE_PROFILE', 'performance')
+    if profile not in PROFILES:
+        raise ImproperlyConfigured(f"SQLITE_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+    values = {**PROFILES[profile], **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    for name, value in values.items():
+        if not _PRAGMA.match(str(name)) or not _VALUE.match(str(value)):
+            raise ImproperlyConfigured(f'Invalid SQLite pragma: {name}={value}')
+    return values
+
+
+def apply(cursor, values):
+    for name, value in values.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure(connection):
+    """Apply the profile to a newly opened connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply(cursor, pragmas())
+
+
+def optimize():
+    """Run ``PRAGMA optimize`` on this process's open SQLite connections if
+    the interval has passed since the last run."""
+    global _optimized_at
+    interval = getattr(settings, 'SQLITE_OPTIMIZE_INTERVAL', 3600)
+    if not interval or time.monotonic() - _optimized_at < interval:
+        return
+    _optimized_at = time.monotonic()
+    for connection in connections.all(initialized_only=True):
+        if connection.vendor == 'sqlite' and connection.connection is not None:
+            connection.connection.execute('PRAGMA optimize')
+
+
+# Closing the last connection folds the WAL back into db.sqlite3, so a
+# worker that exits cleanly leaves no pending log behind
+atexit.register(connections.close_all)
@@ -0,0 +1,161 @@
+"""Versioned fragment cache for the dashboard.
+
+The dashboard is split into sections (herd grid, alerts, chores, map data,
+rotation; also the calendar feed, schedule projections and the pedigree
+graph). Each section has a version stamp stored in the default cache, and
+every cached fragment key includes the stamp of its section. Writes to the
+models a section is built from bump the stamp (see farm/signals.py), so the
+next request simply misses and rebuilds instead of anything being deleted.
+
+The stamps live in the same cache as the fragments, so a cache shared across
+gunicorn workers (the file-based backend, see ``CACHE_DIR`` in settings)
+invalidates every worker at once. With the local-memory backend each process
+keeps its own stamps, which is only correct for a single process.
+
+Fragments are also the unit of partial page updates. A page marks swappable
+regions with ``data-fragment="<name>"``. The client lists the regions it
+shows in the ``X-Fragments`` header, and a view decorated with
+``@supports_fragments`` answers with just those blocks as JSON
+(``partial_response``). ``AjaxFormMiddleware`` uses the same path to bundle
+the refreshed blocks with its redirect reply.
+"""
+from collections import Counter
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+SECTIONS = ('herd', 'alerts', 'chores', 'map', 'rotation', 'calendar', 'schedules', 'pedigree')
+
+# Fragments are rendered with this in place of the per-session CSRF token,
+# which is substituted back in on every request.
+CSRF_PLACEHOLDER = 'FRAGMENT-CSRF-TOKEN'
+
+_hits = Counter()
+_misses = Counter()
+
+
+def _timeout():
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def _version_key(section):
+    return f'fragments:version:{section}'
+
+
+def _new_version():
+    # A fresh timestamp rather than incr(): a set is a single write on every
+    # backend, so two workers bumping at once can't collapse into one value,
+    # and a cleared cache never hands out a stamp that was used before.
+    return time.time_ns()
+
+
+def version(section):
+    """Current version stamp of a section, creating one if the cache has none."""
+    stamp = cache.get(_version_key(section))
+    if stamp is None:
+        stamp = _new_version()
+        cache.add(_version_key(section), stamp, timeout=None)
+        stamp = cache.get(_version_key(section), stamp)
+    return stamp
+
+
+def _set_versions(sections):
+    cache.set_many({_version_key(s): _new_version() for s in sections}, timeout=None)
+
+
+def bump(*sections):
+    """Invalidate every cached fragment of the given sections.
+
+    The stamp is replaced immediately and again once the surrounding
+    transaction commits, so a fragment another worker builds from the
+    not-yet-committed state in between is discarded as well.
+    """
+    _set_versions(sections)
+    transaction.on_commit(lambda: _set_versions(sections))
+
+
+def _key(section, name, parts):
+    suffix = ':'.join(str(p) for p in parts)
+    return f'fragments:{section}:{name}:{version(section)}:{suffix}'
+
+
+def cached(section, name, build, *key_parts):
+    """Return the cached value for ``name`` in ``section``, calling ``build()``
+    to compute and store it on a miss. ``key_parts`` are extra key components
+    (e.g. today's date for date-dependent fragments)."""
+    key = _key(section, name, key_parts)
+    value = cache.get(key)
+    if value is not None:
+        _hits[section] += 1
+        return value
+    _misses[section] += 1
+    value = build()
+    cache.set(key, value, _timeout())
+    return value
+
+
+def render(request, section, template_name, get_context, *key_parts):
+    """Render a template fragment through the cache.
+
+    ``get_context`` is only called on a miss, so the querysets behind a
+    fragment are never evaluated when it is served from the cache.
+    """
+    def build():
+        context = get_context()
+        context['csrf_token'] = CSRF_PLACEHOLDER
+        return str(render_to_string(template_name, context))
+
+    html = cached(section, template_name, build, *key_parts)
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+def stats():
+    """Hit/miss counters of this process, per section."""
+    result = {}
+    for section in SECTIONS:
+        hits, misses = _hits[section], _misses[section]
+        total = hits + misses
+        result[section] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else None,
+        }
+    return result
+
+
+def reset_stats():
+    _hits.clear()
+    _misses.clear()
+
+
+# --- Partial responses ---
+
+FRAGMENTS_HEADER = 'X-Fragments'
+# Page whose fragments an AJAX form wants back (defaults to the redirect target)
+FRAGMENTS_PAGE_HEADER = 'X-Fragments-Page'
+
+
+def supports_fragments(view):
+    """Mark a view as able to answer ``X-Fragments`` requests."""
+    view.supports_fragments = True
+    return view
+
+
+def requested(request):
+    """Fragment names listed in the request's ``X-Fragments`` header."""
+    header = request.headers.get(FRAGMENTS_HEADER, '')
+    return [name.strip() for name in header.split(',') if name.strip()]
+
+
+def partial_response(request, sections):
+    """Render only the requested entries of ``sections`` (name -> callable
+    returning HTML). Names the view doesn't know are left out."""
+    return JsonResponse({'fragments': {
+        name: str(sections[name]()) for name in requested(request) if name in sections
+    }})
@@ -0,0 +1,149 @@
+"""Resized copies of uploaded photos.
+
+Uploads are kept as they are, up to 10 MB. For every ``Goat.image`` and
+``GoatPhoto.image`` a set of smaller JPEG and WebP copies is written next to
+the original, rotated upright from the EXIF orientation, one per width in
+``WIDTHS`` narrower than the original. They are named after the whole file
+name (``goats/derivatives/<file name>-<width>.<ext>``), so ``a.jpg`` and
+``a.png`` don't share copies. The widths written are stored on the record (``image_widths``), and
+templates offer them as a ``srcset`` (see the ``picture`` tag in
+farm/templatetags/farm_filters.py) so a 50px avatar no longer downloads a
+full-size photo. Until a record has widths, the original is shown.
+
+The copies are made on a background thread once the upload's transaction
+commits, so the upload request returns straight away. With
+``IMAGE_DERIVATIVES_ASYNC = False`` they are made at commit instead.
+``manage.py build_image_derivatives`` makes them for existing photos. The
+copies of an image that is replaced, cleared or deleted with its record are
+removed once that commits (see farm/signals.py).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import posixpath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import fragments
+from .models import Goat
+
+WIDTHS = (128, 320, 640, 1280)
+FORMATS = {'jpeg': 'jpg', 'webp': 'webp'}
+QUALITY = {'jpeg': 82, 'webp': 80}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+
+
+def derivative_name(name, width, fmt):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, 'derivatives', f'{filename}-{width}.{FORMATS[fmt]}')
+
+
+def url(storage, name, width, fmt='jpeg'):
+    return storage.url(derivative_name(name, width, fmt))
+
+
+def srcset(field, widths, fmt='jpeg'):
+    return ', '.join(f'{url(field.storage, field.name, w, fmt)} {w}w' for w in widths)
+
+
+def fitting_url(storage, name, widths, width):
+    """URL of the smallest JPEG copy at least ``width`` wide (the largest
+    copy if none is, the original if there are no copies)."""
+    if not widths:
+        return storage.url(name)
+    return url(storage, name, next((w for w in widths if w >= width), widths[-1]))
+
+
+def _upright_rgb(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render(field):
+    """Write the copies of one stored image and return their widths,
+    smallest first. Raises OSError for an unreadable image."""
+    storage = field.storage
+    with storage.open(field.name, 'rb') as f:
+        original = _upright_rgb(Image.open(f))
+    widths = [w for w in WIDTHS if w < original.width]
+    if original.width <= WIDTHS[-1]:
+        widths.append(original.width)  # small uploads get one copy at full size
+    # Largest first, each resized from the previous copy: much cheaper than
+    # resizing the full upload every time
+    image = original
+    for width in sorted(widths, reverse=True):
+        height = max(1, round(original.height * width / original.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            buffer = BytesIO()
+            image.save(buffer, fmt.upper(), quality=QUALITY[fmt], optimize=True)
+            name = derivative_name(field.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+    return sorted(widths)
+
+
+def delete(storage, name, widths):
+    """Remove the copies of the image stored as ``name``."""
+    for width in widths:
+        for fmt in FORMATS:
+            storage.delete(derivative_name(name, width, fmt))
+
+
+def discard(storage, name, widths):
+    """Remove the copies of a replaced or deleted image once the
+    transaction commits."""
+    if widths:
+        transaction.on_commit(lambda: delete(storage, name, widths))
+
+
+def process(instance):
+    """Make the copies of a record's image and store their widths."""
+    if not instance.image:
+        return []
+    try:
+        widths = render(instance.image)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        print(f"Image Error: {instance.image.name}: {e}")
+        return []
+    # update(): no save signals, so this doesn't schedule itself again
+    type(instance).objects.filter(pk=instance.pk, image=instance.image.name).update(image_widths=widths)
+    instance.image_widths = widths
+    if isinstance(instance, Goat):
+        # The herd grid and pedigree graph hold goat photo URLs
+        fragments.bump('herd', 'pedigree')
+    return widths
+
+
+def _process_pk(label, pk):
+    instance = apps.get_model(label).objects.filter(pk=pk).first()
+    if instance is not None:
+        process(instance)
+
+
+def _process_later(label, pk):
+    # Runs on the worker thread, which has its own database connection
+    close_old_connections()
+    try:
+        _process_pk(label, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(instance):
+    """Make the copies of a just-uploaded image once the transaction commits."""
+    label, pk = instance._meta.label, instance.pk
+    if getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        transaction.on_commit(lambda: _executor.submit(_process_later, label, pk))
+    else:
+        transaction.on_commit(lambda: _process_pk(label, pk))
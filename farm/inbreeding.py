@@ -0,0 +1,211 @@
+"""Wright's inbreeding coefficients and kinship for mating planning.
+
+Kinship follows the tabular method over the pedigree graph (farm/pedigree.py),
+with animals ordered so parents come before their offspring:
+
+    f(a, a) = (1 + F(a)) / 2          F(a) = f(dam, sire)
+    f(a, b) = (f(dam_a, b) + f(sire_a, b)) / 2    for a younger than b
+
+Only the entries a question needs are computed, and each is memoized. Each
+animal's ancestry is kept as a bitset, so a pair with no common ancestor is
+answered as zero without walking the pedigree.
+
+Ranking pairings needs one animal's kinship with many others. That is one
+column of the relationship matrix, computed in a single pass over the
+ordered registry (Colleau's indirect method), so the full doe x buck matrix
+costs one pass per doe or buck rather than one recursion per pair and is
+never held in memory.
+
+The expected inbreeding coefficient of a kid equals its parents' kinship.
+An engine belongs to one pedigree graph, so it is rebuilt whenever the graph
+is, i.e. after parentage edits.
+"""
+from collections import deque
+import heapq
+import threading
+
+from . import pedigree
+
+# Expected offspring COI levels; 6.25% is a first-cousin mating
+CAUTION_COI = 0.0625
+HIGH_COI = 0.125
+
+BUCKS = ('Buck', 'Buckling')
+
+_engine = None
+_lock = threading.Lock()
+
+
+def _order(graph):
+    """Number every goat so parents come before their offspring. A parentage
+    cycle is broken by placing its lowest-id goat first; its parents inside
+    the cycle are then treated as unknown."""
+    pending = {gid: len({n.dam_id, n.sire_id} & graph.nodes.keys() - {gid}) for gid, n in graph.nodes.items()}
+    ready = deque(sorted(gid for gid, count in pending.items() if count == 0))
+    order = {}
+    while len(order) < len(pending):
+        if not ready:
+            ready.append(min(gid for gid in pending if gid not in order))
+        gid = ready.popleft()
+        if gid in order:
+            continue
+        order[gid] = len(order)
+        for kid in graph.children.get(gid, ()):
+            pending[kid] -= 1
+            if pending[kid] == 0:
+                ready.append(kid)
+    return order
+
+
+class Kinship:
+    def __init__(self, graph):
+        self.graph = graph
+        self.order = _order(graph)
+        self.ids = sorted(self.order, key=self.order.get)  # position -> goat id
+        self.parents = {}
+        self.ancestry = {}  # id -> bitset of itself and every ancestor, by order
+        for gid in self.ids:
+            node = graph.nodes[gid]
+            dam, sire = (p if p in self.order and self.order[p] < self.order[gid] else None
+                         for p in (node.dam_id, node.sire_id))
+            self.parents[gid] = (dam, sire)
+            self.ancestry[gid] = (1 << self.order[gid]) | self.ancestry.get(dam, 0) | self.ancestry.get(sire, 0)
+        self._kinship = {}
+        self._coi = {}
+        self._scale = None
+        self._ranked = {}  # limit -> herd-wide ranking
+
+    def kinship(self, a, b):
+        """Probability that alleles drawn from ``a`` and ``b`` are identical by descent."""
+        if a is None or b is None:
+            return 0.0
+        if a == b:
+            return 0.5 * (1 + self.coefficient(a))
+        if not self.ancestry[a] & self.ancestry[b]:
+            return 0.0
+        if self.order[a] < self.order[b]:
+            a, b = b, a
+        value = self._kinship.get((a, b))
+        if value is None:
+            dam, sire = self.parents[a]
+            value = 0.5 * (self.kinship(dam, b) + self.kinship(sire, b))
+            self._kinship[(a, b)] = value
+        return value
+
+    def coefficient(self, goat_id):
+        """Wright's inbreeding coefficient F of a goat."""
+        value = self._coi.get(goat_id)
+        if value is None:
+            value = self.kinship(*self.parents[goat_id])
+            self._coi[goat_id] = value
+        return value
+
+    def coefficients(self):
+        """``{goat id: F}`` for the whole registry."""
+        # Oldest first, so each animal's recursion stops at memoized parents
+        return {gid: self.coefficient(gid) for gid in self.ids}
+
+    def _prepare_columns(self):
+        # Parent positions (unknown = n, a zero slot) and the Mendelian
+        # sampling variance of each animal: A = T D T', T = (I - P)^-1
+        n = len(self.ids)
+        coefficients = self.coefficients()
+        self._dams, self._sires, self._scale = [], [], []
+        for gid in self.ids:
+            d = 1.0
+            positions = []
+            for parent in self.parents[gid]:
+                if parent is None:
+                    positions.append(n)
+                else:
+                    positions.append(self.order[parent])
+                    d -= 0.25 * (1 + coefficients[parent])
+            self._dams.append(positions[0])
+            self._sires.append(positions[1])
+            self._scale.append(d)
+
+    def column(self, goat_id):
+        """Kinship of every goat with ``goat_id``, as a list by position
+        (``self.order``)."""
+        if self._scale is None:
+            self._prepare_columns()
+        n = len(self.ids)
+        dams, sires, scale = self._dams, self._sires, self._scale
+        # w = D T' e: only the goat and its ancestors are non-zero
+        w = [0.0] * (n + 1)
+        w[self.order[goat_id]] = 1.0
+        start = self.order[goat_id]
+        for i in range(self.order[goat_id], -1, -1):
+            if w[i]:
+                start = i
+                for parent in (dams[i], sires[i]):
+                    if parent < n:
+                        w[parent] += 0.5 * w[i]
+                w[i] *= scale[i]
+        # v = T w, oldest first; halved, relationship becomes kinship
+        v = w  # updated in place; w[i] is only read before v[i] is written
+        for i in range(start, n):
+            v[i] += 0.5 * (v[dams[i]] + v[sires[i]])
+        return [0.5 * value for value in v[:n]]
+
+    def candidates(self):
+        """Living herd does and living bucks (external bucks included)."""
+        living = [n for n in self.graph.nodes.values() if n.status != 'Deceased']
+        does = sorted((n for n in living if n.gender in pedigree.FEMALE and not n.is_external),
+                      key=lambda n: n.name.lower())
+        bucks = sorted((n for n in living if n.gender in BUCKS), key=lambda n: n.name.lower())
+        return does, bucks
+
+    def _pairs(self, does, bucks):
+        # (coi, doe index, buck index): ties then rank by name, since both
+        # lists are sorted by name. One column per goat on the shorter side.
+        order = self.order
+        if len(does) <= len(bucks):
+            for i, doe in enumerate(does):
+                column = self.column(doe.id)
+                for j, buck in enumerate(bucks):
+                    if buck.id != doe.id:
+                        yield column[order[buck.id]], i, j
+        else:
+            for j, buck in enumerate(bucks):
+                column = self.column(buck.id)
+                for i, doe in enumerate(does):
+                    if doe.id != buck.id:
+                        yield column[order[doe.id]], i, j
+
+    def pairings(self, doe=None, buck=None, limit=None):
+        """``(coi, doe id, buck id)`` for candidate pairings, lowest expected
+        offspring COI first, optionally for one doe and/or buck."""
+        # The herd-wide ranking is kept; one doe's or buck's takes one pass
+        if doe is None and buck is None and limit in self._ranked:
+            return self._ranked[limit]
+        does, bucks = self.candidates()
+        does = [d for d in does if doe is None or d.id == doe]
+        bucks = [b for b in bucks if buck is None or b.id == buck]
+        pairs = self._pairs(does, bucks)
+        ranked = sorted(pairs) if limit is None else heapq.nsmallest(limit, pairs)
+        result = [(coi, does[i].id, bucks[j].id) for coi, i, j in ranked]
+        if doe is None and buck is None:
+            self._ranked[limit] = result
+        return result
+
+
+def level(coi):
+    if coi >= HIGH_COI:
+        return 'high'
+    if coi >= CAUTION_COI:
+        return 'caution'
+    return 'ok'
+
+
+def engine():
+    """The engine for this process's current pedigree graph."""
+    global _engine
+    graph = pedigree.graph()
+    current = _engine
+    if current is not None and current.graph is graph:
+        return current
+    with _lock:
+        if _engine is None or _engine.graph is not graph:
+            _engine = Kinship(graph)
+        return _engine
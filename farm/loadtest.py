@@ -0,0 +1,410 @@
+"""Concurrent load replay against a running GoatOS server.
+
+``manage.py benchmark_load`` starts gunicorn as the Docker image runs it
+(two sync workers, a file cache shared between them) on a synthetic farm
+(farm/synthetic.py), or targets a server given by URL. ``concurrency``
+simulated devices then replay a weighted mix (``MIX``) of what people do
+at the barn: open dashboards, log milk from the dashboard and the quick
+entry page, page through the calendar and download exports.
+
+Each device keeps its own session and logs in through the PIN page when a
+PIN is set. It posts forms the way base.html does: as AJAX, with the CSRF
+token from its cookie and the fragments of the page it is on. Devices send
+their next request as soon as the last one is answered, or after a random
+think time, so ``concurrency`` is the number of people using the farm at
+the same moment.
+
+``replay`` reports throughput, p50/p95/p99 latency and the error rate,
+overall and per mix entry. To the client a SQLite "database is locked"
+failure is just a 500. Locks are told apart by the traceback the server
+logs (``LOGGING`` in settings), so they are only counted for a server this
+module started.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.urls import Resolver404, resolve, reverse
+from django.utils import timezone
+import requests
+
+from . import calendar_feed, roster
+
+# Mix entry -> relative weight. Each entry is the ``Device`` method of the
+# same name.
+MIX = {
+    'index': 25,
+    'api_goats': 6,
+    'milk_dashboard': 6,
+    'breeding_dashboard': 3,
+    'calendar_dashboard': 3,
+    'api_calendar_events': 10,
+    'quick_entry': 6,
+    'quick_milk': 20,
+    'quick_entry_milk': 10,
+    'quick_entry_weight': 4,
+    'export_milk': 4,
+    'export_goats': 3,
+}
+
+WORKERS = 2  # as in supervisord.conf
+WORKER_TIMEOUT = 120  # seconds, as in supervisord.conf
+TIMEOUT = 30  # seconds a device waits for an answer
+STARTUP_TIMEOUT = 30  # seconds for gunicorn to start answering
+EXPORT_DAYS = 30  # milk export: the last month, as the export page offers
+
+LOCKED = 'database is locked'
+# django.request's log line for a 500, followed by the traceback
+_SERVER_ERROR = re.compile(r'^Internal Server Error: (\S+)$', re.MULTILINE)
+_FRAGMENT = re.compile(r'data-fragment="([\w-]+)"')
+
+
+class LoadError(RuntimeError):
+    """The server didn't start, or a device couldn't get in."""
+
+
+class Device:
+    """One phone or tablet with its own session. ``goats`` and ``milkers``
+    (goat ids) are filled in from ``herd`` before it replays the mix."""
+
+    def __init__(self, url, pin=None, seed=0, timeout=TIMEOUT):
+        self.url = url.rstrip('/')
+        self.random = random.Random(seed)
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.fragments = {}  # page path -> data-fragment names on it
+        self.goats = []
+        self.milkers = []
+        if pin:
+            self._login(pin)
+        response = self.index()
+        if response.status_code != 200:
+            raise LoadError(f"The dashboard answered {response.status_code}.")
+
+    def _login(self, pin):
+        path = reverse('pin_login')
+        self.get(path)
+        response = self.session.post(self.url + path, timeout=self.timeout, allow_redirects=False, data={
+            'pin': pin, 'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', ''),
+        })
+        if response.status_code != 302:
+            raise LoadError("The PIN was not accepted.")
+
+    def get(self, path, **params):
+        return self.session.get(self.url + path, params=params, timeout=self.timeout)
+
+    def page(self, path):
+        """GET a page and note the fragments its forms ask for."""
+        response = self.get(path)
+        if response.status_code == 200:
+            self.fragments[path] = _FRAGMENT.findall(response.text)
+        return response
+
+    def post(self, path, data, page):
+        """Submit a form on ``page`` the way base.html does."""
+        headers = {
+            'X-Requested-With': 'XMLHttpRequest',
+            'X-CSRFToken': self.session.cookies.get('csrftoken', ''),
+            'Referer': self.url + page,
+        }
+        if self.fragments.get(page):
+            headers['X-Fragments'] = ','.join(self.fragments[page])
+            headers['X-Fragments-Page'] = page
+        return self.session.post(self.url + path, data=data, headers=headers, timeout=self.timeout,
+                                 allow_redirects=False)
+
+    def herd(self):
+        """Every goat on the roster, through ``/api/goats/`` as the
+        dashboard grid pages it."""
+        goats, cursor = [], None
+        while True:
+            params = {'limit': roster.MAX_PAGE_SIZE, **({'cursor': cursor} if cursor else {})}
+            response = self.get(reverse('api_goats'), **params)
+            if response.status_code != 200:
+                raise LoadError(f"The roster answered {response.status_code}.")
+            data = response.json()
+            goats += data['results']
+            cursor = data['next_cursor']
+            if not cursor:
+                return goats
+
+    # --- The mix ---
+
+    def index(self):
+        return self.page(reverse('index'))
+
+    def api_goats(self):
+        return self.get(reverse('api_goats'))
+
+    def milk_dashboard(self):
+        return self.page(reverse('milk_dashboard'))
+
+    def breeding_dashboard(self):
+        return self.page(reverse('breeding_dashboard'))
+
+    def calendar_dashboard(self):
+        return self.page(reverse('calendar_dashboard'))
+
+    def api_calendar_events(self):
+        # This month, or one either side
+        day = timezone.localdate() + timedelta(days=31 * self.random.randint(-1, 1))
+        start, end = calendar_feed.month_grid(day)
+        return self.get(reverse('api_calendar_events'), start=start.isoformat(), end=end.isoformat())
+
+    def quick_entry(self):
+        return self.page(reverse('quick_entry'))
+
+    def quick_milk(self):
+        goat = self.random.choice(self.milkers)
+        return self.post(reverse('quick_milk', args=[goat]), {'amount': f'{self.random.uniform(1, 4.5):.1f}'},
+                         page=reverse('index'))
+
+    def quick_entry_milk(self):
+        return self.post(reverse('quick_entry'), page=reverse('quick_entry'), data={
+            'entry_type': 'milk',
+            'goat_id': self.random.choice(self.milkers),
+            'date': timezone.localdate().isoformat(),
+            'time': self.random.choice(['AM', 'PM']),
+            'amount': f'{self.random.uniform(1, 4.5):.1f}',
+        })
+
+    def quick_entry_weight(self):
+        return self.post(reverse('quick_entry'), page=reverse('quick_entry'), data={
+            'entry_type': 'weight',
+            'goat_id': self.random.choice(self.goats),
+            'date': timezone.localdate().isoformat(),
+            'weight': f'{self.random.uniform(40, 180):.1f}',
+        })
+
+    def export_milk(self):
+        start = timezone.localdate() - timedelta(days=EXPORT_DAYS)
+        return self.get(reverse('export_milk'), start=start.isoformat())
+
+    def export_goats(self):
+        return self.get(reverse('export_goats'))
+
+
+def devices(url, count, pin=None, seed=0, timeout=TIMEOUT):
+    """``count`` logged-in devices that know the herd."""
+    found = [Device(url, pin, seed + n, timeout) for n in range(count)]
+    herd = found[0].herd()
+    goats = [goat['id'] for goat in herd]
+    milkers = [goat['id'] for goat in herd if goat['can_milk']]
+    if not milkers:
+        raise LoadError("The farm has no goats to log milk for.")
+    for device in found:
+        device.goats, device.milkers = goats, milkers
+    return found
+
+
+def replay(devices, mix=None, duration=30, warmup=5, think=0, server=None):
+    """Have ``devices`` replay ``mix`` for ``warmup`` + ``duration``
+    seconds. Returns the summary of the ``duration`` part. ``think`` is the
+    mean pause between a device's requests, in seconds. Server errors are
+    read from ``server``'s log when given."""
+    mix = mix or MIX
+    names, weights = list(mix), list(mix.values())
+    samples = []  # (mix entry, started, seconds, status or 'timeout'/'connection')
+    stop = threading.Event()
+
+    def loop(device):
+        while not stop.is_set():
+            name = device.random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                outcome = getattr(device, name)().status_code
+            except requests.Timeout:
+                outcome = 'timeout'
+            except requests.RequestException:
+                outcome = 'connection'
+            samples.append((name, started, time.perf_counter() - started, outcome))
+            if think:
+                stop.wait(device.random.expovariate(1 / think))
+
+    threads = [threading.Thread(target=loop, args=(device,), daemon=True) for device in devices]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    if server:
+        server.errors()  # the warm-up's
+    begin = time.perf_counter()
+    time.sleep(duration)
+    end = time.perf_counter()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    measured = [s for s in samples if s[1] >= begin and s[1] + s[2] <= end]
+    result = summarize(measured, end - begin, server.errors() if server else None)
+    result['concurrency'] = len(devices)
+    return result
+
+
+# --- Analysis ---
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return 0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def _ok(outcome):
+    return isinstance(outcome, int) and outcome < 400
+
+
+def _stats(samples, seconds):
+    times = sorted(s[2] * 1000 for s in samples)
+    errors = sum(1 for s in samples if not _ok(s[3]))
+    return {
+        'requests': len(samples),
+        'throughput': round(len(samples) / seconds, 2),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'p50_ms': round(percentile(times, 0.50), 1),
+        'p95_ms': round(percentile(times, 0.95), 1),
+        'p99_ms': round(percentile(times, 0.99), 1),
+        'max_ms': round(times[-1], 1) if times else 0,
+        'outcomes': dict(Counter(str(s[3]) for s in samples)),
+    }
+
+
+def server_errors(log):
+    """``(path, locked)`` of each 500 in a stretch of server log."""
+    matches = list(_SERVER_ERROR.finditer(log))
+    ends = [m.start() for m in matches[1:]] + [len(log)]
+    return [(m.group(1), LOCKED in log[m.end():end]) for m, end in zip(matches, ends)]
+
+
+def _view_name(path):
+    try:
+        return resolve(path).url_name or path
+    except Resolver404:
+        return path
+
+
+def summarize(samples, seconds, errors=None):
+    """Totals and per mix entry for ``samples`` taken over ``seconds``.
+    ``errors`` are ``server_errors`` of the same stretch, when known."""
+    result = _stats(samples, seconds)
+    result['seconds'] = round(seconds, 2)
+    result['endpoints'] = {}
+    for name in sorted({s[0] for s in samples}):
+        result['endpoints'][name] = _stats([s for s in samples if s[0] == name], seconds)
+    if errors is None:
+        result['locked'] = result['server_errors'] = None
+    else:
+        result['locked'] = sum(1 for _, locked in errors if locked)
+        result['server_errors'] = {}
+        for path, locked in errors:
+            counts = result['server_errors'].setdefault(_view_name(path), {'errors': 0, 'locked': 0})
+            counts['errors'] += 1
+            counts['locked'] += locked
+    return result
+
+
+def report(results):
+    """Plain-text report of a run (the JSON ``benchmark_load`` writes)."""
+    runs = results['runs']
+    lines = [f"{results['target']}, {results['duration']:g} s per level"
+             + (f", {results['think']:g} s think time" if results['think'] else ''), '']
+    lines.append(f"{'devices':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'locked':>8}")
+    for run in runs:
+        locked = '-' if run['locked'] is None else run['locked']
+        lines.append(f"{run['concurrency']:>8}{run['throughput']:>9.1f}{run['p50_ms']:>9.1f}{run['p95_ms']:>9.1f}"
+                     f"{run['p99_ms']:>9.1f}{run['error_rate']:>8.1%}{locked:>8}")
+    for run in runs:
+        lines += ['', f"{run['concurrency']} device{'s' if run['concurrency'] != 1 else ''}:",
+                  f"  {'endpoint':<22}{'requests':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                  f"{'errors':>8}  outcomes"]
+        for name, stats in sorted(run['endpoints'].items(), key=lambda item: -item[1]['p95_ms']):
+            outcomes = ' '.join(f'{outcome}:{n}' for outcome, n in sorted(stats['outcomes'].items()))
+            lines.append(f"  {name:<22}{stats['requests']:>9}{stats['throughput']:>8.1f}{stats['p50_ms']:>9.1f}"
+                         f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['errors']:>8}  {outcomes}")
+        for view, counts in sorted((run['server_errors'] or {}).items()):
+            lines.append(f"  server errors in {view}: {counts['errors']} ({counts['locked']} database is locked)")
+    return '\n'.join(lines) + '\n'
+
+
+# --- Local server ---
+
+class Server:
+    """A gunicorn started by ``serve``, at ``url``."""
+
+    def __init__(self, url, log_path):
+        self.url = url
+        self.log_path = log_path
+        self._read = 0
+
+    def log(self):
+        """Server output since the last call."""
+        with open(self.log_path, errors='replace') as f:
+            f.seek(self._read)
+            text = f.read()
+            self._read = f.tell()
+        return text
+
+    def errors(self):
+        """``server_errors`` logged since the last call."""
+        return server_errors(self.log())
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve(database, workers=WORKERS, pin=None):
+    """Run gunicorn on ``database`` (a SQLite file) for the duration, with
+    the settings of the Docker image: ``workers`` sync workers, a file
+    cache they share, DEBUG off."""
+    with tempfile.TemporaryDirectory(prefix='goatos-load-') as directory:
+        port = _free_port()
+        env = {
+            **os.environ,
+            'DATABASE_PATH': str(database),
+            'CACHE_DIR': os.path.join(directory, 'cache'),
+            'ALLOWED_HOSTS': '127.0.0.1',
+            'FARM_PIN': pin or '',
+            'DEBUG': 'False',
+            'PERF_MONITOR': 'False',
+        }
+        server = Server(f'http://127.0.0.1:{port}', os.path.join(directory, 'server.log'))
+        with open(server.log_path, 'w') as log:
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', 'goatos.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                 '--workers', str(workers), '--timeout', str(WORKER_TIMEOUT)],
+                cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while True:
+                if process.poll() is not None:
+                    raise LoadError(f"gunicorn exited with {process.returncode}:\n{server.log()[-2000:]}")
+                try:
+                    requests.get(server.url + reverse('pin_login'), timeout=TIMEOUT)
+                    break
+                except requests.ConnectionError:
+                    if time.monotonic() > deadline:
+                        raise LoadError(f"gunicorn didn't answer within {STARTUP_TIMEOUT} s.")
+                    time.sleep(0.2)
+            server.log()  # start-up messages
+            yield server
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from farm import queryplans
+
+
+class Command(BaseCommand):
+    help = ("EXPLAIN QUERY PLAN the registered dashboard queries (farm/queryplans.py) and fail on "
+            "full table scans or temp B-trees.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Only these registered queries.")
+        parser.add_argument('--plans', action='store_true', help="Print every query's plan, not just problems.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - queryplans.QUERIES.keys()
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}")
+        results = queryplans.audit(timezone.localdate(), options['names'])
+        failed = [r for r in results if r.problems]
+        for result in results:
+            status = self.style.ERROR('FAIL') if result.problems else self.style.SUCCESS('ok')
+            self.stdout.write(f"{status:>4} {result.name}")
+            for problem in result.problems:
+                self.stdout.write(f"       {problem}")
+            if options['plans']:
+                for sql, plan in result.plans:
+                    self.stdout.write(f"       {sql}")
+                    for detail in plan:
+                        self.stdout.write(f"         {detail}")
+        if failed:
+            raise CommandError(f"{len(failed)} of {len(results)} queries scan or sort without an index.")
+        self.stdout.write(self.style.SUCCESS(f"All {len(results)} queries use indexes."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from farm import activity
+from farm.models import ActivityEvent
+
+
+class Command(BaseCommand):
+    help = "Create activity feed entries for records logged before the feed table existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Delete all entries and rebuild from scratch.")
+
+    def handle(self, *args, **options):
+        created = activity.backfill(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Activity feed backfilled: {created} entries added, {ActivityEvent.objects.count()} total."))
@@ -0,0 +1,19 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from farm import backups
+
+
+class Command(BaseCommand):
+    help = "Write a consistent copy of the database into BACKUP_DIR and remove the oldest beyond BACKUP_KEEP."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Backup directory (default: BACKUP_DIR).")
+        parser.add_argument('--keep', type=int, help="Number of backups to keep, 0 for all (default: BACKUP_KEEP).")
+        parser.add_argument('--gzip', action='store_true', help="Compress the copy (.sqlite3.gz).")
+
+    def handle(self, *args, **options):
+        path = backups.save(options['dir'], options['keep'], compress=options['gzip'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Database backed up to {path} ({os.path.getsize(path) // 1024} KiB)."))
@@ -0,0 +1,38 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from farm import archives
+
+
+class Command(BaseCommand):
+    help = ("Write a ZIP of MEDIA_ROOT into BACKUP_DIR: every file, or with --since only the files "
+            "added or changed since an earlier archive.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Earlier archive (or its manifest.json) to make an incremental against.")
+        parser.add_argument('--output', help="Archive path (default: a timestamped name in BACKUP_DIR).")
+
+    def handle(self, *args, **options):
+        base = None
+        if options['since']:
+            try:
+                base = archives.read_manifest(options['since'])
+            except (archives.InvalidArchive, OSError) as e:
+                raise CommandError(str(e))
+        path = options['output']
+        if not path:
+            kind = 'incremental' if base else 'full'
+            path = os.path.join(settings.BACKUP_DIR, f'goatos-media-{timezone.localtime():%Y%m%d-%H%M%S}-{kind}.zip')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Written under another name and renamed when complete
+        with open(path + '.partial', 'wb') as f:
+            for chunk in archives.stream(str(settings.MEDIA_ROOT), base):
+                f.write(chunk)
+        os.replace(path + '.partial', path)
+        manifest = archives.read_manifest(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Media backed up to {path}: {len(manifest['files'])} files, "
+            f"{os.path.getsize(path) // 1024} KiB."))
@@ -0,0 +1,64 @@
+import os
+import resource
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from farm import backups
+
+
+class Command(BaseCommand):
+    help = ("Build a throwaway SQLite database of the given size and compare reading it whole "
+            "(the old download) with a streamed backup-API copy, raw and gzipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=300, help="Database size in MB.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            self._build(path, options['size'])
+            self.stdout.write(f"Database: {os.path.getsize(path) // (1024 * 1024)} MB")
+            self.stdout.write(f"{'method':>16} {'seconds':>8} {'bytes':>12} {'py peak KiB':>12} {'max RSS KiB':>12}")
+            for compress in (False, True):
+                source = sqlite3.connect(path)
+                try:
+                    name = 'backup + gzip' if compress else 'backup stream'
+                    self._measure(name, lambda: self._stream(backups.download(compress, source)))
+                finally:
+                    source.close()
+            # Last, since max RSS never comes back down after it
+            self._measure('read whole file', lambda: self._read(path))
+
+    def _build(self, path, size_mb):
+        # Text rows compress roughly like farm logs do, unlike random bytes
+        db = sqlite3.connect(path)
+        db.execute('CREATE TABLE log (id INTEGER PRIMARY KEY, day TEXT, notes TEXT)')
+        row = ('2024-01-01', 'Morning milking, 2.5 lbs, udder looks good. ' * 20)
+        for _ in range(size_mb):
+            db.executemany('INSERT INTO log (day, notes) VALUES (?, ?)', [row] * 1150)  # ~1 MB
+        db.commit()
+        db.close()
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return len(f.read())
+
+    def _stream(self, response):
+        try:
+            return sum(len(chunk) for chunk in response.streaming_content)
+        finally:
+            response.close()
+
+    def _measure(self, name, run):
+        tracemalloc.start()
+        start = time.perf_counter()
+        written = run()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux, never shrinks
+        self.stdout.write(f"{name:>16} {elapsed:>8.2f} {written:>12} {peak // 1024:>12} {rss:>12}")
@@ -0,0 +1,57 @@
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from farm import views
+from farm.models import Goat, MilkLog
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Stream the milk log export at growing row counts and report peak memory. "
+            "Seeded rows are rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,50000,200000',
+                            help="Comma-separated milk log row counts to test.")
+        parser.add_argument('--gzip', action='store_true', help="Benchmark the gzip-encoded export.")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(n) for n in options['sizes'].split(','))
+        try:
+            with transaction.atomic():
+                self._run(sizes, options['gzip'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, sizes, gzip):
+        goat = Goat.objects.create(name="Benchmark Doe", gender='Doe', is_external=True)
+        request = RequestFactory().get('/export/milk/', {'gzip': '1'} if gzip else {})
+        seeded = MilkLog.objects.count()
+        self.stdout.write(f"{'rows':>10} {'seconds':>8} {'bytes':>12} {'py peak KiB':>12} {'max RSS KiB':>12}")
+        for size in sizes:
+            # Seed in small batches so seeding itself doesn't raise the peak RSS
+            while seeded < size:
+                batch = min(5000, size - seeded)
+                MilkLog.objects.bulk_create(MilkLog(goat=goat, amount=2, notes="benchmark") for _ in range(batch))
+                seeded += batch
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = views.export_milk_csv(request)
+            written = sum(len(chunk) for chunk in response.streaming_content)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            # ru_maxrss is KiB on Linux; it only ever grows, so a flat column means
+            # the larger exports needed no more memory than the smaller ones
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(f"{seeded:>10} {elapsed:>8.2f} {written:>12} {peak // 1024:>12} {rss:>12}")
@@ -0,0 +1,104 @@
+from contextlib import nullcontext
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from farm import benchmarks, loadtest, synthetic
+
+
+class Command(BaseCommand):
+    help = ("Replay a weighted mix of barn traffic (dashboards, quick milk and quick entry posts, calendar, "
+            "exports) against gunicorn at growing concurrency, and report throughput, latency percentiles "
+            "and errors, including SQLite lock errors. Starts gunicorn on a synthetic farm unless --url is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,2,4,8,16',
+                            help="Comma-separated numbers of simultaneous devices, one run each.")
+        parser.add_argument('--duration', type=float, default=30, help="Measured seconds per run.")
+        parser.add_argument('--warmup', type=float, default=5, help="Unmeasured seconds before each run.")
+        parser.add_argument('--think', type=float, default=0,
+                            help="Mean pause between a device's requests, in seconds (0: none).")
+        parser.add_argument('--mix', help="Weights as name=weight,... (default: %s)."
+                            % ','.join(f'{name}={weight}' for name, weight in loadtest.MIX.items()))
+        parser.add_argument('--url', help="Load a running server instead, e.g. http://localhost:8080. "
+                                          "Lock errors can't be told apart then.")
+        parser.add_argument('--pin', help="PIN the devices log in with (default: FARM_PIN with --url, none "
+                                          "for the local server).")
+        parser.add_argument('--workers', type=int, default=loadtest.WORKERS, help="gunicorn workers.")
+        parser.add_argument('--goats', type=int, default=200, help="Herd size of the generated farm.")
+        parser.add_argument('--years', type=float, default=3, help="Years of records on the generated farm.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the farm and the devices.")
+        parser.add_argument('--timeout', type=float, default=loadtest.TIMEOUT,
+                            help="Seconds a device waits for an answer.")
+        parser.add_argument('--output', help="Results file (default: benchmarks/load-<timestamp>.json).")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(n) for n in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError("--concurrency must be comma-separated numbers, e.g. 1,2,4,8")
+        if min(levels) < 1:
+            raise CommandError("Every run needs at least 1 device.")
+        mix = loadtest.MIX
+        if options['mix']:
+            try:
+                mix = {name: float(weight) for name, weight in
+                       (item.split('=') for item in options['mix'].split(','))}
+            except ValueError:
+                raise CommandError("--mix must look like index=10,quick_milk=5")
+            unknown = set(mix) - set(loadtest.MIX)
+            if unknown:
+                raise CommandError(f"Unknown mix entries: {', '.join(sorted(unknown))}")
+        if options['goats'] < 2:
+            raise CommandError("A farm needs at least 2 goats.")
+        output = options['output'] or os.path.join('benchmarks', f'load-{timezone.localtime():%Y%m%d-%H%M%S}.json')
+
+        results = {
+            'created': timezone.now().isoformat(),
+            'duration': options['duration'],
+            'warmup': options['warmup'],
+            'think': options['think'],
+            'mix': mix,
+            'runs': [],
+        }
+        if options['url']:
+            results['target'] = options['url']
+            pin = options['pin'] if options['pin'] is not None else settings.FARM_PIN
+            scratch = nullcontext()
+        else:
+            results['target'] = (f"{options['workers']} gunicorn worker{'s' if options['workers'] != 1 else ''}, "
+                                  f"{options['goats']} goats")
+            pin = options['pin']
+            scratch = benchmarks.scratch_database()
+
+        with scratch:
+            serving = nullcontext()
+            if not options['url']:
+                counts = synthetic.generate(goats=options['goats'], years=options['years'], seed=options['seed'])
+                results['rows'] = sum(counts.values())
+                self.stdout.write(f"Generated {options['goats']} goats, {results['rows']} rows.")
+                serving = loadtest.serve(connection.settings_dict['NAME'], options['workers'], pin)
+            try:
+                with serving as server:
+                    url = server.url if server else options['url']
+                    for level in levels:
+                        devices = loadtest.devices(url, level, pin, options['seed'], options['timeout'])
+                        run = loadtest.replay(devices, mix, options['duration'], options['warmup'],
+                                              options['think'], server)
+                        results['runs'].append(run)
+                        locked = '' if run['locked'] is None else f", {run['locked']} locked"
+                        self.stdout.write(f"{level:>4} devices: {run['throughput']:.1f} req/s, "
+                                          f"p95 {run['p95_ms']:.0f} ms, {run['error_rate']:.1%} errors{locked}")
+            except loadtest.LoadError as e:
+                raise CommandError(str(e))
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+        self.stdout.write('')
+        self.stdout.write(loadtest.report(results))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
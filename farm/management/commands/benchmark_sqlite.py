@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from farm import database
+
+
+def _writer(path, pragmas, seconds, seed):
+    # One gunicorn worker logging milk: an insert, then the dashboard total.
+    # Python's default 5 s timeout stands in for the busy handler when the
+    # profile sets no busy_timeout.
+    db = sqlite3.connect(path, timeout=5, isolation_level=None)
+    database.apply(db.cursor(), pragmas)
+    writes, locked, latencies = 0, 0, []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        try:
+            db.execute('INSERT INTO milk (goat, day, amount, notes) VALUES (?, date(), 2.5, ?)',
+                       (seed % 50, 'Morning milking, udder looks good'))
+            db.execute('SELECT SUM(amount) FROM milk WHERE day = date()').fetchone()
+            writes += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+        latencies.append(time.perf_counter() - start)
+    db.close()
+    return writes, locked, latencies
+
+
+class Command(BaseCommand):
+    help = ("Compare SQLite profiles (farm/database.py) with parallel writer processes on a "
+            "throwaway database file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help="Parallel writer processes.")
+        parser.add_argument('--seconds', type=float, default=5, help="Run time per profile.")
+
+    def handle(self, *args, **options):
+        writers, seconds = options['writers'], options['seconds']
+        self.stdout.write(f"{writers} writers, {seconds:g} s per profile")
+        self.stdout.write(f"{'profile':>12} {'writes/s':>9} {'locked':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for profile in database.PROFILES:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                db = sqlite3.connect(path)
+                db.execute('CREATE TABLE milk (id INTEGER PRIMARY KEY, goat INTEGER, day TEXT, amount REAL, notes TEXT)')
+                db.execute('CREATE INDEX milk_day ON milk (day)')
+                db.commit()
+                db.close()
+                pragmas = database.PROFILES[profile]
+                with multiprocessing.get_context('fork').Pool(writers) as pool:
+                    results = pool.starmap(_writer, [(path, pragmas, seconds, n) for n in range(writers)])
+            writes = sum(r[0] for r in results)
+            locked = sum(r[1] for r in results)
+            latencies = sorted(ms * 1000 for r in results for ms in r[2])
+            p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+            self.stdout.write(f"{profile:>12} {writes / seconds:>9.0f} {locked:>7} "
+                              f"{statistics.median(latencies or [0]):>8.2f} {p95:>8.2f} {max(latencies or [0]):>8.2f}")
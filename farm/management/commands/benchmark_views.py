@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from farm import benchmarks, synthetic
+
+
+class Command(BaseCommand):
+    help = ("Benchmark every named view against synthetic farms of growing size, each in a scratch "
+            "database. Writes the measurements as JSON and reports views that scale super-linearly "
+            "or regressed against a baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='50,500,5000', help="Comma-separated herd sizes.")
+        parser.add_argument('--years', type=float, default=3, help="Years of records per farm.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the farms.")
+        parser.add_argument('--repeat', type=int, default=3, help="Cold requests per view (the median is kept).")
+        parser.add_argument('--views', help="Comma-separated URL names to run (default: all).")
+        parser.add_argument('--output', help="Results file (default: benchmarks/views-<timestamp>.json).")
+        parser.add_argument('--baseline', help="Earlier results file to compare against.")
+        parser.add_argument('--report', help="Also write the text report to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            scales = sorted({int(n) for n in options['scales'].split(',')})
+        except ValueError:
+            raise CommandError("--scales must be comma-separated numbers, e.g. 50,500,5000")
+        if scales[0] < 2:
+            raise CommandError("Every scale needs at least 2 goats.")
+        names = options['views'].split(',') if options['views'] else None
+        if names:
+            unknown = set(names) - {name for name, _ in benchmarks.views()}
+            if unknown:
+                raise CommandError(f"Unknown or skipped views: {', '.join(sorted(unknown))}")
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Can't read the baseline: {e}")
+        output = options['output'] or os.path.join('benchmarks', f'views-{timezone.localtime():%Y%m%d-%H%M%S}.json')
+
+        results = {
+            'created': timezone.now().isoformat(),
+            'scales': scales,
+            'years': options['years'],
+            'seed': options['seed'],
+            'rows': {},
+            'skipped': benchmarks.SKIP,
+            'views': {},
+        }
+        for scale in scales:
+            with benchmarks.scratch_database():
+                started = time.perf_counter()
+                counts = synthetic.generate(goats=scale, years=options['years'], seed=options['seed'])
+                results['rows'][str(scale)] = sum(counts.values())
+                self.stdout.write(f"{scale} goats: {sum(counts.values())} rows generated in "
+                                  f"{time.perf_counter() - started:.1f} s")
+
+                def progress(name, measurements):
+                    self.stdout.write(f"  {name:<28} {measurements['cold_ms']:>9.1f} ms "
+                                      f"{measurements['queries']:>5} queries  {measurements['status']}")
+                measured = benchmarks.run(names, options['repeat'], progress if options['verbosity'] > 1 else None)
+            for name, measurements in measured.items():
+                results['views'].setdefault(name, {})[str(scale)] = measurements
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1)
+        report = benchmarks.report(results, baseline)
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                f.write(report)
+        self.stdout.write('')
+        self.stdout.write(report)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
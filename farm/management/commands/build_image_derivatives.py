@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from farm import images
+from farm.models import Goat, GoatPhoto
+
+
+class Command(BaseCommand):
+    help = "Make the resized copies of goat and gallery photos that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Remake the copies of every photo.")
+
+    def handle(self, *args, **options):
+        made = failed = 0
+        for model in (Goat, GoatPhoto):
+            records = model.objects.exclude(image='').exclude(image__isnull=True)
+            if not options['force']:
+                records = records.filter(image_widths=[])
+            for record in records.order_by('pk').iterator():
+                if images.process(record):
+                    made += 1
+                else:
+                    failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Resized copies made for {made} photos ({failed} unreadable)."))
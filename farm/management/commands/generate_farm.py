@@ -0,0 +1,37 @@
+from datetime import date
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from farm import synthetic
+from farm.models import Goat
+
+
+class Command(BaseCommand):
+    help = ("Fill an empty database with a synthetic farm for scale testing: a multi-generation herd "
+            "with years of records, pens and paddocks. The same seed always gives the same farm.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goats', type=int, default=200, help="Herd size.")
+        parser.add_argument('--years', type=float, default=3, help="Years of history.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+        parser.add_argument('--until', type=date.fromisoformat,
+                            help="Last day of history, YYYY-MM-DD (default: today).")
+        parser.add_argument('--batch-size', type=int, default=synthetic.BATCH_SIZE,
+                            help="Rows per bulk insert.")
+
+    def handle(self, *args, **options):
+        if options['goats'] < 2:
+            raise CommandError("A farm needs at least 2 goats.")
+        if Goat.objects.exists():
+            raise CommandError("The database already has goats. Generate into an empty database "
+                               "(e.g. after manage.py flush).")
+        started = time.perf_counter()
+        counts = synthetic.generate(goats=options['goats'], years=options['years'], seed=options['seed'],
+                                    until=options['until'], batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        for model, rows in sorted(counts.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"{model:>24} {rows:>9}")
+        total = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['goats']} goats, {total} rows in {elapsed:.1f} s ({total / elapsed:.0f} rows/s)."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from farm import alerts
+from farm.models import Alert
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized alert store from scratch."
+
+    def handle(self, *args, **options):
+        alerts.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Alert store rebuilt: {Alert.objects.count()} active alerts."))
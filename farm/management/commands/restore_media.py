@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from farm import archives
+
+
+class Command(BaseCommand):
+    help = ("Restore MEDIA_ROOT from a full media backup followed by its incremental backups, "
+            "oldest first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('archives', nargs='+', help="Full archive, then incrementals in the order made.")
+        parser.add_argument('--target', help="Directory to restore into (default: MEDIA_ROOT).")
+
+    def handle(self, *args, **options):
+        target = options['target'] or str(settings.MEDIA_ROOT)
+        try:
+            written, removed = archives.restore(options['archives'], target)
+        except (archives.InvalidArchive, OSError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Media restored to {target}: {written} files written, {removed} removed."))
@@ -0,0 +1,24 @@
+import zoneinfo
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from farm import alerts
+from farm.models import FarmSettings
+
+
+class Command(BaseCommand):
+    help = "Re-evaluate date-dependent alerts (run nightly, after midnight farm time)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-evaluate even if already done today.")
+
+    def handle(self, *args, **options):
+        farm_settings, _ = FarmSettings.objects.get_or_create(pk=1)
+        # "Today" is the farm's date, not the server's
+        timezone.activate(zoneinfo.ZoneInfo(farm_settings.timezone))
+        if options['force']:
+            alerts.rollover()
+        else:
+            alerts.ensure_current(farm_settings)
+        self.stdout.write(self.style.SUCCESS("Alert store is current."))
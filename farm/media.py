@@ -0,0 +1,130 @@
+"""Uploaded media, served after the PIN gate.
+
+``/media/`` goes through Django so ``PinGateMiddleware`` can check the
+session, but the file itself is only streamed by Django when there is no
+web server in front (runsslserver). Behind nginx, set
+``MEDIA_ACCEL_REDIRECT`` to the internal location that maps onto
+``MEDIA_ROOT`` (``/protected-media/`` in nginx.conf). Django then answers
+with an ``X-Accel-Redirect`` header and nginx sends the file, so a gunicorn
+worker isn't tied up for the length of a download.
+
+Either way responses carry ``ETag`` and ``Last-Modified``, and repeat views
+are answered 304 before any file is opened. Without nginx, single byte
+ranges (``Range: bytes=...``) are answered 206 so PDFs and large photos can
+resume and seek.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+MAX_AGE = 60 * 60  # seconds a browser reuses a file before revalidating
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _path(name):
+    name = posixpath.normpath(name).lstrip('/')
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404("No such file")
+    if not os.path.isfile(path):
+        raise Http404("No such file")
+    return name, path
+
+
+def byte_range(header, size):
+    """``(start, end)``, inclusive, of a single-range ``Range`` header, or
+    None to send the whole file (no header, several ranges, or a form not
+    understood). Raises ValueError for a range outside the file."""
+    match = _RANGE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _range_matches(request, etag, mtime):
+    """Whether an ``If-Range`` precondition (if any) still holds."""
+    validator = request.headers.get('If-Range')
+    if not validator:
+        return True
+    if validator.startswith(('"', 'W/')):
+        return validator == etag
+    return parse_http_date_safe(validator) == mtime
+
+
+def _chunks(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def response(request, name):
+    """Response for the media file ``name`` (relative to MEDIA_ROOT)."""
+    name, path = _path(name)
+    stat = os.stat(path)
+    mtime = int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    def finish(resp):
+        resp['ETag'] = etag
+        resp['Last-Modified'] = http_date(mtime)
+        resp['Cache-Control'] = f'private, max-age={MAX_AGE}'
+        return resp
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if not_modified is not None:
+        return finish(not_modified)
+
+    accel = getattr(settings, 'MEDIA_ACCEL_REDIRECT', '')
+    if accel:
+        # nginx answers Range requests itself
+        resp = HttpResponse(content_type=content_type)
+        resp['X-Accel-Redirect'] = accel.rstrip('/') + '/' + quote(name)
+        return finish(resp)
+
+    try:
+        requested = byte_range(request.headers.get('Range'), stat.st_size)
+    except ValueError:
+        resp = HttpResponse(status=416)
+        resp['Content-Range'] = f'bytes */{stat.st_size}'
+        return finish(resp)
+
+    if requested is None or not _range_matches(request, etag, mtime):
+        resp = FileResponse(open(path, 'rb'), content_type=content_type)
+        resp.block_size = CHUNK_SIZE
+    else:
+        start, end = requested
+        resp = StreamingHttpResponse(_chunks(path, start, end - start + 1), status=206,
+                                     content_type=content_type)
+        resp['Content-Length'] = end - start + 1
+        resp['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    resp['Accept-Ranges'] = 'bytes'
+    return finish(resp)
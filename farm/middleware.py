@@ -1,9 +1,33 @@
 from django.shortcuts import redirect
 from django.conf import settings
-from django.http import JsonResponse
+from django.contrib import messages
+from django.http import JsonResponse, QueryDict
+from django.urls import Resolver404, resolve
+from urllib.parse import urlsplit
+import copy
+import json
 import zoneinfo
 import os
 
+from farm import backups, fragments, perf
+
+
+def apply_farm_timezone():
+    """Set the process timezone from FarmSettings."""
+    try:
+        from farm.models import FarmSettings
+        fs = FarmSettings.objects.first()
+        if fs and fs.timezone:
+            os.environ['TZ'] = fs.timezone
+            settings.TIME_ZONE = fs.timezone
+            try:
+                import time
+                time.tzset()
+            except AttributeError:
+                pass  # Windows doesn't have tzset
+    except Exception:
+        pass
+
 
 class TimezoneMiddleware:
     """Set the process timezone from FarmSettings so date.today() and
@@ -15,25 +39,40 @@ class TimezoneMiddleware:
 
     def __call__(self, request):
         if not self._tz_loaded:
-            try:
-                from farm.models import FarmSettings
-                fs = FarmSettings.objects.first()
-                if fs and fs.timezone:
-                    os.environ['TZ'] = fs.timezone
-                    settings.TIME_ZONE = fs.timezone
-                    try:
-                        import time
-                        time.tzset()
-                    except AttributeError:
-                        pass  # Windows doesn't have tzset
-            except Exception:
-                pass
+            apply_farm_timezone()
             self._tz_loaded = True
         return self.get_response(request)
 
 
+class RestoreMiddleware:
+    """Pick up a database restored by any worker (see farm/backups.py).
+
+    When the restore generation in the shared cache moves on, this process
+    drops its database connections and in-process caches and re-reads the
+    farm timezone before handling the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.generation = None
+
+    def __call__(self, request):
+        generation = backups.generation()
+        if self.generation is not None and generation != self.generation:
+            backups.reset()
+            apply_farm_timezone()
+        self.generation = generation
+        return self.get_response(request)
+
+
 class AjaxFormMiddleware:
-    """Convert redirect responses to JSON for AJAX form submissions."""
+    """Convert redirect responses to JSON for AJAX form submissions.
+
+    When the request lists fragments in ``X-Fragments`` (see farm/fragments.py),
+    the page named by ``X-Fragments-Page`` (or the redirect target) is asked for
+    just those blocks and they are returned along with the redirect, together
+    with any flash messages, so the client can update in a single round-trip.
+    """
 
     def __init__(self, get_response):
         self.get_response = get_response
@@ -42,19 +81,50 @@ class AjaxFormMiddleware:
         response = self.get_response(request)
         if (request.headers.get('X-Requested-With') == 'XMLHttpRequest'
                 and response.status_code in (301, 302)):
-            return JsonResponse({'success': True, 'redirect': response.url})
+            data = {'success': True, 'redirect': response.url}
+            if fragments.requested(request):
+                rendered = self._fragments(request, response.url)
+                if rendered is not None:
+                    data['fragments'] = rendered
+            # Consumed here, otherwise they would show up on the next full page load
+            data['messages'] = [
+                {'level': m.level_tag, 'message': str(m)}
+                for m in messages.get_messages(request)
+            ]
+            return JsonResponse(data)
         return response
 
+    def _fragments(self, request, redirect_url):
+        page = urlsplit(request.headers.get(fragments.FRAGMENTS_PAGE_HEADER) or redirect_url)
+        try:
+            match = resolve(page.path)
+        except Resolver404:
+            return None
+        if not getattr(match.func, 'supports_fragments', False):
+            return None
+
+        sub = copy.copy(request)
+        sub.method = 'GET'
+        sub.GET = QueryDict(page.query)
+        sub.POST = QueryDict()
+        sub.path = sub.path_info = page.path
+        sub.resolver_match = match
+        response = match.func(sub, *match.args, **match.kwargs)
+        if response.status_code != 200:
+            return None
+        return json.loads(response.content)['fragments']
+
 
 class PinGateMiddleware:
     """Simple PIN-based authentication middleware.
 
     Checks if the user has entered the correct PIN (stored in session).
     Redirects to the PIN entry page if not authenticated.
-    Set FARM_PIN in .env to enable. Leave unset to disable.
+    Set FARM_PIN in .env to enable. Leave unset to disable. Uploaded media is
+    gated too (see farm/media.py).
     """
 
-    EXEMPT_URLS = ['/pin/', '/admin/', '/static/', '/media/']
+    EXEMPT_URLS = ['/pin/', '/admin/', '/static/']
 
     def __init__(self, get_response):
         self.get_response = get_response
@@ -73,3 +143,24 @@ class PinGateMiddleware:
             return redirect('pin_login')
 
         return self.get_response(request)
+
+
+class PerfMiddleware:
+    """Record query count, DB time, template time and wall time per URL name.
+
+    Off unless PERF_MONITOR is set. Results are kept in a rolling in-process
+    window (see farm/perf.py) and shown on /tools/perf/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'PERF_MONITOR', False):
+            return self.get_response(request)
+
+        with perf.measure() as sample:
+            response = self.get_response(request)
+        match = request.resolver_match
+        perf.record(match.view_name if match else '<unresolved>', sample)
+        return response
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm', '0032_add_feeding_time_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmsettings',
+            name='alerts_evaluated_on',
+            field=models.DateField(blank=True, editable=False, help_text='Date the alert store was last re-evaluated', null=True),
+        ),
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('kidding', 'Kidding'), ('medical', 'Medical Treatment'), ('schedule', 'Scheduled Treatment'), ('famacha', 'FAMACHA'), ('heat', 'Heat Prediction'), ('low_stock', 'Low Feed Stock'), ('expired_med', 'Expired Medicine'), ('overcrowded', 'Overcrowded Pen')], max_length=20)),
+                ('source_id', models.PositiveIntegerField()),
+                ('severity', models.CharField(choices=[('danger', 'Danger'), ('warning', 'Warning'), ('info', 'Info')], default='info', max_length=10)),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.CharField(max_length=300)),
+                ('due_date', models.DateField(blank=True, null=True)),
+                ('evaluated_on', models.DateField(default=django.utils.timezone.localdate)),
+                ('goat', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='farm.goat')),
+            ],
+            options={
+                'ordering': ['category', 'due_date', 'title'],
+                'indexes': [models.Index(fields=['category', 'due_date'], name='farm_alert_categor_018022_idx')],
+                'unique_together': {('category', 'source_id')},
+            },
+        ),
+    ]
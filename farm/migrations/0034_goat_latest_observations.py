@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:14
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_latest_observations(apps, schema_editor):
+    Goat = apps.get_model('farm', 'Goat')
+    HealthScore = apps.get_model('farm', 'HealthScore')
+    HeatObservation = apps.get_model('farm', 'HeatObservation')
+    latest = HealthScore.objects.filter(goat=OuterRef('pk')).order_by('-date', '-pk')
+    Goat.objects.update(
+        latest_famacha=Subquery(latest.values('famacha_score')[:1]),
+        latest_bcs=Subquery(latest.values('body_condition_score')[:1]),
+        latest_score_date=Subquery(latest.values('date')[:1]),
+        latest_heat_date=Subquery(
+            HeatObservation.objects.filter(goat=OuterRef('pk')).values('goat')
+            .annotate(last=Max('date_observed')).values('last')
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm', '0033_alert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goat',
+            name='latest_bcs',
+            field=models.DecimalField(blank=True, decimal_places=1, editable=False, max_digits=2, null=True),
+        ),
+        migrations.AddField(
+            model_name='goat',
+            name='latest_famacha',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='goat',
+            name='latest_heat_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='goat',
+            name='latest_score_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_latest_observations, migrations.RunPython.noop),
+    ]
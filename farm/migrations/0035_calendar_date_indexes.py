@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm', '0034_goat_latest_observations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='breedinglog',
+            name='due_date',
+            field=models.DateField(blank=True, db_index=True, help_text='Auto-calculated (150 days) if left blank', null=True),
+        ),
+        migrations.AlterField(
+            model_name='farmevent',
+            name='date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='Start Date'),
+        ),
+        migrations.AlterField(
+            model_name='farmevent',
+            name='end_date',
+            field=models.DateField(blank=True, db_index=True, null=True, verbose_name='End Date'),
+        ),
+        migrations.AlterField(
+            model_name='heatobservation',
+            name='date_observed',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='kiddingrecord',
+            name='kidding_date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='medicalrecord',
+            name='next_due_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm', '0035_calendar_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('medical', 'Medical'), ('milk', 'Milk'), ('breeding', 'Breeding'), ('weight', 'Weight'), ('feeding', 'Feeding'), ('kidding', 'Kidding'), ('health', 'Health'), ('heat', 'Heat'), ('finance', 'Finance')], max_length=20)),
+                ('source_id', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('goat_label', models.CharField(blank=True, max_length=100)),
+                ('label', models.CharField(max_length=200)),
+                ('detail', models.CharField(blank=True, max_length=100)),
+                ('goat', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_events', to='farm.goat')),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+                'indexes': [models.Index(fields=['date', 'type'], name='farm_activi_date_0fafa1_idx'), models.Index(fields=['goat', 'date'], name='farm_activi_goat_id_9af918_idx')],
+                'unique_together': {('type', 'source_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm', '0036_activityevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goat',
+            name='image_widths',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='goatphoto',
+            name='image_widths',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm', '0037_image_widths'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='milklog',
+            index=models.Index(fields=['date', 'time'], name='farm_milklo_date_382e8a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pastureassignment',
+            index=models.Index(fields=['end_date'], name='farm_pastur_end_dat_1802a4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='penassignment',
+            index=models.Index(fields=['goat', 'date_out', 'date_in'], name='farm_penass_goat_id_912ed8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='penassignment',
+            index=models.Index(fields=['date_out', 'date_in'], name='farm_penass_date_ou_816417_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcompletion',
+            index=models.Index(fields=['date', 'completed'], name='farm_taskco_date_7ee50b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['type', 'date'], name='farm_transa_type_d8d905_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date'], name='farm_transa_date_f646ab_idx'),
+        ),
+    ]
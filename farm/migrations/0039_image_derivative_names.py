@@ -0,0 +1,30 @@
+import posixpath
+
+from django.db import migrations
+
+
+def forget_stem_named_copies(apps, schema_editor):
+    # Copies used to be named after the file's stem, so a.jpg and a.png
+    # shared them. Remove those and let build_image_derivatives remake them
+    # under the new names; until then the originals are shown.
+    for model in ('Goat', 'GoatPhoto'):
+        Model = apps.get_model('farm', model)
+        storage = Model._meta.get_field('image').storage
+        for record in Model.objects.exclude(image_widths=[]).exclude(image=''):
+            directory, filename = posixpath.split(record.image.name)
+            stem = posixpath.splitext(filename)[0]
+            for width in record.image_widths:
+                for ext in ('jpg', 'webp'):
+                    storage.delete(posixpath.join(directory, 'derivatives', f'{stem}-{width}.{ext}'))
+        Model.objects.exclude(image_widths=[]).update(image_widths=[])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farm', '0038_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(forget_stem_named_copies, migrations.RunPython.noop),
+    ]
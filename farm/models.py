@@ -20,10 +20,33 @@ class FarmSettings(models.Model):
     longitude = models.FloatField(default=0.0)
     google_maps_api_key = models.CharField(max_length=100, blank=True, default="", help_text="Your Google Maps API Key")
     timezone = models.CharField(max_length=50, choices=TIMEZONE_CHOICES, default='America/New_York')
+    alerts_evaluated_on = models.DateField(null=True, blank=True, editable=False, help_text="Date the alert store was last re-evaluated")
 
     def __str__(self):
         return self.name
 
+def age_label(birthdate, age):
+    """Human-readable age ("3 Weeks", "2 Years") from a birthdate, or the
+    approximate age in years when there is none."""
+    if birthdate:
+        today = timezone.localdate()
+        total_days = (today - birthdate).days
+        if total_days < 7:
+            return f"{total_days} Days"
+        elif total_days < 30:
+            weeks = total_days // 7
+            return f"{weeks} Week{'s' if weeks != 1 else ''}"
+        elif total_days < 365:
+            months = total_days // 30
+            weeks = (total_days % 30) // 7
+            if weeks > 0:
+                return f"{months} Month{'s' if months != 1 else ''}, {weeks} Week{'s' if weeks != 1 else ''}"
+            return f"{months} Month{'s' if months != 1 else ''}"
+        else:
+            years = today.year - birthdate.year - ((today.month, today.day) < (birthdate.month, birthdate.day))
+            return f"{years} Year{'s' if years != 1 else ''}"
+    return f"{age} Years"
+
 class Goat(models.Model):
     STATUS_CHOICES = [
         ('Healthy', 'Healthy'),
@@ -48,6 +71,8 @@ class Goat(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Healthy')
     bio = models.TextField(blank=True)
     image = models.ImageField(upload_to='goats/', blank=True, null=True)
+    # Widths of the resized copies of ``image`` (farm/images.py); empty until made
+    image_widths = models.JSONField(default=list, blank=True, editable=False)
 
     # Pedigree Fields
     dam = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='kids_dam', verbose_name="Dam (Mother)")
@@ -59,29 +84,19 @@ class Goat(models.Model):
     microchip = models.CharField(max_length=100, blank=True, help_text="Microchip ID number")
     external_owner = models.CharField(max_length=200, blank=True)
 
+    # Latest observations, denormalized from HealthScore / HeatObservation
+    # (kept in sync by farm/signals.py) so herd-wide views need no per-goat query
+    latest_famacha = models.IntegerField(null=True, blank=True, editable=False)
+    latest_bcs = models.DecimalField(max_digits=2, decimal_places=1, null=True, blank=True, editable=False)
+    latest_score_date = models.DateField(null=True, blank=True, editable=False)
+    latest_heat_date = models.DateField(null=True, blank=True, editable=False)
+
     def __str__(self):
         return f"{self.name} ({self.status})"
 
     @property
     def display_age(self):
-        if self.birthdate:
-            today = timezone.localdate()
-            total_days = (today - self.birthdate).days
-            if total_days < 7:
-                return f"{total_days} Days"
-            elif total_days < 30:
-                weeks = total_days // 7
-                return f"{weeks} Week{'s' if weeks != 1 else ''}"
-            elif total_days < 365:
-                months = total_days // 30
-                weeks = (total_days % 30) // 7
-                if weeks > 0:
-                    return f"{months} Month{'s' if months != 1 else ''}, {weeks} Week{'s' if weeks != 1 else ''}"
-                return f"{months} Month{'s' if months != 1 else ''}"
-            else:
-                years = today.year - self.birthdate.year - ((today.month, today.day) < (self.birthdate.month, self.birthdate.day))
-                return f"{years} Year{'s' if years != 1 else ''}"
-        return f"{self.age} Years"
+        return age_label(self.birthdate, self.age)
 
     @property
     def age_in_days(self):
@@ -89,6 +104,29 @@ class Goat(models.Model):
             return (timezone.localdate() - self.birthdate).days
         return self.age * 365  # Approximate from manual age field
 
+    def refresh_latest_health_score(self):
+        latest = self.health_scores.order_by('-date', '-pk').first()
+        self.latest_famacha = latest.famacha_score if latest else None
+        self.latest_bcs = latest.body_condition_score if latest else None
+        self.latest_score_date = latest.date if latest else None
+        # update() rather than save(): no Goat signals for a cache refresh
+        Goat.objects.filter(pk=self.pk).update(
+            latest_famacha=self.latest_famacha,
+            latest_bcs=self.latest_bcs,
+            latest_score_date=self.latest_score_date,
+        )
+
+    def refresh_latest_heat(self):
+        latest = self.heat_observations.order_by('-date_observed', '-pk').first()
+        self.latest_heat_date = latest.date_observed if latest else None
+        Goat.objects.filter(pk=self.pk).update(latest_heat_date=self.latest_heat_date)
+
+    @property
+    def next_heat_date(self):
+        if self.latest_heat_date:
+            return self.latest_heat_date + timedelta(days=21)
+        return None
+
 class GoatLog(models.Model):
     goat = models.ForeignKey(Goat, on_delete=models.CASCADE, related_name='logs')
     date = models.DateTimeField(auto_now_add=True)
@@ -132,6 +170,7 @@ class PastureAssignment(models.Model):
 
     class Meta:
         ordering = ['-start_date']
+        indexes = [models.Index(fields=['end_date'])]  # active: end_date IS NULL OR > today
 
     def __str__(self):
         return f"{self.grazing_area.name}: {self.start_date} - {self.end_date or 'Active'}"
@@ -207,6 +246,7 @@ class TaskCompletion(models.Model):
 
     class Meta:
         unique_together = ('task', 'date')
+        indexes = [models.Index(fields=['date', 'completed'])]
 
 class Vet(models.Model):
     name = models.CharField(max_length=200)
@@ -231,7 +271,7 @@ class MedicalRecord(models.Model):
     date = models.DateField(default=timezone.now)
     record_type = models.CharField(max_length=20, choices=RECORD_TYPES)
     notes = models.TextField(blank=True)
-    next_due_date = models.DateField(null=True, blank=True)
+    next_due_date = models.DateField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return f"{self.goat.name} - {self.record_type}"
@@ -251,7 +291,7 @@ class BreedingLog(models.Model):
     goat = models.ForeignKey(Goat, on_delete=models.CASCADE, related_name='breeding_logs')
     mate_name = models.CharField(max_length=100, verbose_name="Buck/Partner Name")
     breeding_date = models.DateField()
-    due_date = models.DateField(blank=True, null=True, help_text="Auto-calculated (150 days) if left blank")
+    due_date = models.DateField(blank=True, null=True, db_index=True, help_text="Auto-calculated (150 days) if left blank")
     notes = models.TextField(blank=True)
     
     def save(self, *args, **kwargs):
@@ -280,6 +320,10 @@ class MilkLog(models.Model):
     amount = models.DecimalField(max_digits=5, decimal_places=2, help_text="Amount in lbs")
     notes = models.TextField(blank=True)
 
+    class Meta:
+        # Date ranges and the newest-first list (date, then AM/PM)
+        indexes = [models.Index(fields=['date', 'time'])]
+
     def __str__(self):
         return f"{self.goat.name} - {self.date} {self.time} ({self.amount} lbs)"
 
@@ -308,6 +352,10 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['type', 'date']),  # income/expense totals
+            models.Index(fields=['date']),  # newest-first list
+        ]
 
 # --- WEIGHT MODEL ---
 class WeightLog(models.Model):
@@ -325,8 +373,8 @@ class WeightLog(models.Model):
 # --- CALENDAR MODEL ---
 class FarmEvent(models.Model):
     title = models.CharField(max_length=200)
-    date = models.DateField(default=timezone.now, verbose_name="Start Date")
-    end_date = models.DateField(null=True, blank=True, verbose_name="End Date") # Added
+    date = models.DateField(default=timezone.now, db_index=True, verbose_name="Start Date")
+    end_date = models.DateField(null=True, blank=True, db_index=True, verbose_name="End Date") # Added
     category = models.CharField(max_length=50, default='General', help_text="e.g. Vet, Show, Maintenance")
     description = models.TextField(blank=True)
 
@@ -366,6 +414,7 @@ class Medicine(models.Model):
 class GoatPhoto(models.Model):
     goat = models.ForeignKey(Goat, on_delete=models.CASCADE, related_name='photos')
     image = models.ImageField(upload_to='goat_gallery/')
+    image_widths = models.JSONField(default=list, blank=True, editable=False)  # see Goat.image_widths
     caption = models.CharField(max_length=200, blank=True)
     date_added = models.DateTimeField(auto_now_add=True)
 
@@ -446,7 +495,7 @@ class KiddingRecord(models.Model):
 
     breeding_log = models.ForeignKey(BreedingLog, on_delete=models.SET_NULL, null=True, blank=True, related_name='kidding_records')
     dam = models.ForeignKey(Goat, on_delete=models.CASCADE, related_name='kidding_records')
-    kidding_date = models.DateField(default=timezone.now)
+    kidding_date = models.DateField(default=timezone.now, db_index=True)
     num_kids_born = models.IntegerField(default=1)
     num_alive = models.IntegerField(default=1)
     num_stillborn = models.IntegerField(default=0)
@@ -486,7 +535,7 @@ class HealthScore(models.Model):
 # --- Feature 3: Heat Detection / Estrus ---
 class HeatObservation(models.Model):
     goat = models.ForeignKey(Goat, on_delete=models.CASCADE, related_name='heat_observations')
-    date_observed = models.DateField(default=timezone.now)
+    date_observed = models.DateField(default=timezone.now, db_index=True)
     signs = models.CharField(max_length=200, blank=True, help_text="e.g. flagging, mounting, mucus discharge")
     notes = models.TextField(blank=True)
 
@@ -595,10 +644,90 @@ class PenAssignment(models.Model):
 
     class Meta:
         ordering = ['-date_in']
+        indexes = [
+            models.Index(fields=['goat', 'date_out', 'date_in']),  # a goat's current pen
+            models.Index(fields=['date_out', 'date_in']),  # everyone currently penned
+        ]
 
     def __str__(self):
         return f"{self.goat.name} in {self.pen.name}"
 
     @property
     def is_active(self):
-        return self.date_out is None
\ No newline at end of file
+        return self.date_out is None
+
+# --- Materialized Alerts ---
+class Alert(models.Model):
+    """A farm alert kept current by signals (see farm/alerts.py).
+
+    ``source_id`` is the pk of the object the alert was derived from; its
+    model depends on the category (e.g. BreedingLog for kidding, Pen for
+    overcrowded, Goat for FAMACHA and heat).
+    """
+    CATEGORY_CHOICES = [
+        ('kidding', 'Kidding'),
+        ('medical', 'Medical Treatment'),
+        ('schedule', 'Scheduled Treatment'),
+        ('famacha', 'FAMACHA'),
+        ('heat', 'Heat Prediction'),
+        ('low_stock', 'Low Feed Stock'),
+        ('expired_med', 'Expired Medicine'),
+        ('overcrowded', 'Overcrowded Pen'),
+    ]
+    SEVERITY_CHOICES = [('danger', 'Danger'), ('warning', 'Warning'), ('info', 'Info')]
+
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
+    source_id = models.PositiveIntegerField()
+    severity = models.CharField(max_length=10, choices=SEVERITY_CHOICES, default='info')
+    title = models.CharField(max_length=200)
+    message = models.CharField(max_length=300)
+    # No DB constraint: alerts are purged in Goat's post_delete handler, after
+    # the goat's own records have been cascaded (and re-evaluated).
+    goat = models.ForeignKey(Goat, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    due_date = models.DateField(null=True, blank=True)
+    evaluated_on = models.DateField(default=timezone.localdate)
+
+    class Meta:
+        ordering = ['category', 'due_date', 'title']
+        unique_together = ('category', 'source_id')
+        indexes = [models.Index(fields=['category', 'due_date'])]
+
+    def __str__(self):
+        return f"[{self.category}] {self.title}: {self.message}"
+
+# --- Activity Log ---
+class ActivityEvent(models.Model):
+    """One entry of the activity feed, written by signals from the logging
+    models (see farm/activity.py). ``source_id`` is the pk of the record in
+    the model ``type`` stands for."""
+    TYPE_CHOICES = [
+        ('medical', 'Medical'),
+        ('milk', 'Milk'),
+        ('breeding', 'Breeding'),
+        ('weight', 'Weight'),
+        ('feeding', 'Feeding'),
+        ('kidding', 'Kidding'),
+        ('health', 'Health'),
+        ('heat', 'Heat'),
+        ('finance', 'Finance'),
+    ]
+
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    source_id = models.PositiveIntegerField()
+    date = models.DateField()
+    goat = models.ForeignKey(Goat, on_delete=models.SET_NULL, null=True, blank=True, related_name='activity_events')
+    # Shown instead of a goat for herd-wide entries (e.g. "All Goats")
+    goat_label = models.CharField(max_length=100, blank=True)
+    label = models.CharField(max_length=200)
+    detail = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ['-date', '-id']
+        unique_together = ('type', 'source_id')
+        indexes = [
+            models.Index(fields=['date', 'type']),
+            models.Index(fields=['goat', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} [{self.type}] {self.label}"
@@ -0,0 +1,103 @@
+from datetime import timedelta
+import json
+
+from django.db.models import Max, OuterRef, Prefetch, Q, Subquery
+from django.utils import timezone
+
+from .models import GrazingArea, PastureAssignment, PastureCondition
+
+
+def _active_assignment_filter(today):
+    return Q(end_date__isnull=True) | Q(end_date__gt=today)
+
+
+def annotate_pasture_state(queryset, today=None):
+    """Annotate a GrazingArea queryset with the data behind the
+    active_assignment / latest_condition / days_resting properties.
+
+    Adds ``active_assignment_id``, ``condition_score`` and ``last_rest_date``
+    so a whole list of areas costs a single query instead of several per area.
+    """
+    today = today or timezone.localdate()
+    active = PastureAssignment.objects.filter(
+        _active_assignment_filter(today), grazing_area=OuterRef('pk')
+    ).order_by('-start_date', '-pk').values('pk')[:1]
+    latest_condition = PastureCondition.objects.filter(
+        grazing_area=OuterRef('pk')
+    ).order_by('-date', '-pk').values('score')[:1]
+    return queryset.annotate(
+        active_assignment_id=Subquery(active),
+        condition_score=Subquery(latest_condition),
+        last_rest_date=Max('assignments__end_date'),
+    )
+
+
+def snapshot(today=None):
+    """Build the per-area state used by the dashboard and map pages.
+
+    Returns ``(areas, areas_list)`` where ``areas`` is the annotated
+    GrazingArea list and ``areas_list`` the JSON-ready dicts for the map.
+    Runs in a constant number of queries regardless of the number of areas:
+    one for the annotated areas, one for the active assignments and one
+    prefetch for their goats.
+    """
+    today = today or timezone.localdate()
+    areas = list(annotate_pasture_state(GrazingArea.objects.all(), today))
+
+    active_ids = [a.active_assignment_id for a in areas if a.active_assignment_id]
+    assignments = {}
+    if active_ids:
+        assignments = PastureAssignment.objects.filter(pk__in=active_ids).prefetch_related(
+            Prefetch('goats', to_attr='goat_list')
+        ).in_bulk()
+
+    areas_list = []
+    for area in areas:
+        try:
+            coords = json.loads(area.coordinates)
+        except (json.JSONDecodeError, TypeError):
+            continue
+        active = assignments.get(area.active_assignment_id)
+        goat_names = [g.name for g in active.goat_list] if active else []
+        areas_list.append({
+            'id': area.id,
+            'name': area.name,
+            'color': area.color,
+            'coords': coords,
+            'goat_count': len(goat_names),
+            'goat_names': goat_names,
+            'days_resting': days_resting(area, today),
+            'condition_score': area.condition_score,
+        })
+    return areas, areas_list
+
+
+def days_resting(area, today=None):
+    """Days since the area's most recent rotation ended, from an annotated area."""
+    if area.last_rest_date is None:
+        return None
+    today = today or timezone.localdate()
+    return (today - area.last_rest_date).days
+
+
+def rotation_timeline(today=None, days=90):
+    """Grazing assignments overlapping the last ``days`` days, for the timeline chart."""
+    today = today or timezone.localdate()
+    since = today - timedelta(days=days)
+    history = PastureAssignment.objects.filter(
+        Q(start_date__gte=since) | Q(end_date__gte=since) | Q(end_date__isnull=True)
+    ).select_related('grazing_area').prefetch_related('goats').order_by('start_date')
+    return [{
+        'area_name': a.grazing_area.name,
+        'color': a.grazing_area.color,
+        'start_date': a.start_date.isoformat(),
+        'end_date': a.end_date.isoformat() if a.end_date else None,
+        'goats': [g.name for g in a.goats.all()],
+    } for a in history]
+
+
+def active_assignments(today=None):
+    today = today or timezone.localdate()
+    return PastureAssignment.objects.filter(
+        _active_assignment_filter(today)
+    ).select_related('grazing_area').prefetch_related('goats')
@@ -0,0 +1,194 @@
+"""In-memory pedigree graph.
+
+The whole registry (herd and external goats) is loaded with one query into
+``Graph``, which answers ancestor trees, descendant sets and sibling lists
+at any depth without going back to the database. Each process keeps one
+graph and reuses it until the ``pedigree`` fragment section (see
+farm/fragments.py) is bumped, which farm/signals.py does when a goat is
+added or removed or one of the fields held here changes.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+import threading
+
+from . import fragments, images
+from .models import Goat
+
+MAX_DEPTH = 10  # generations an ancestor tree may be asked for
+
+# Goat fields held in the graph, in Node order after ``id``
+FIELDS = ('name', 'gender', 'breed', 'status', 'is_external', 'registration_number', 'image',
+          'dam_id', 'sire_id', 'image_widths')
+AVATAR_WIDTH = 100  # pedigree node photos are 50px; 2x for high-density screens
+
+FEMALE = ('Doe', 'Doeling')
+GENDERS = dict(Goat.GENDER_CHOICES)
+
+_graph = None
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Node:
+    id: int
+    name: str
+    gender: str
+    breed: str
+    status: str
+    is_external: bool
+    registration: str
+    image: str  # file name in storage, '' if none
+    dam_id: int = None
+    sire_id: int = None
+    image_widths: tuple = ()
+
+    @property
+    def gender_display(self):
+        return GENDERS.get(self.gender, self.gender)
+
+    @property
+    def image_url(self):
+        if not self.image:
+            return ''
+        storage = Goat._meta.get_field('image').storage
+        return images.fitting_url(storage, self.image, self.image_widths, AVATAR_WIDTH)
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'gender': self.gender,
+            'breed': self.breed,
+            'is_external': self.is_external,
+            'registration': self.registration,
+            'image': self.image_url,
+        }
+
+
+def _node(values):
+    values = list(values)
+    values[7] = values[7] or ''  # image
+    values[10] = tuple(values[10] or ())  # image_widths
+    return Node(*values)
+
+
+class Graph:
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.nodes = {}
+        self.children = defaultdict(list)
+        for row in rows:
+            node = _node(row)
+            self.nodes[node.id] = node
+        # Offspring in id order, as they were added
+        for node in self.nodes.values():
+            for parent_id in {node.dam_id, node.sire_id} - {None}:
+                self.children[parent_id].append(node.id)
+
+    def __contains__(self, goat_id):
+        return goat_id in self.nodes
+
+    def __getitem__(self, goat_id):
+        return self.nodes[goat_id]
+
+    def get(self, goat_id):
+        return self.nodes.get(goat_id)
+
+    def offspring(self, goat_id):
+        return [self.nodes[kid] for kid in self.children.get(goat_id, ())]
+
+    def tree(self, goat_id, depth=3):
+        """Nested ``dam``/``sire`` dicts for ``depth`` generations (the goat
+        itself is the first), each node listing its ``kids``."""
+        node = self.nodes.get(goat_id)
+        if node is None or depth <= 0:
+            return None
+        data = node.serialize()
+        data['dam'] = self.tree(node.dam_id, depth - 1)
+        data['sire'] = self.tree(node.sire_id, depth - 1)
+        data['kids'] = [{'id': k.id, 'name': k.name, 'gender': k.gender} for k in self.offspring(goat_id)]
+        return data
+
+    def ancestors(self, goat_id, depth=None):
+        """``{ancestor id: generation}`` (1 = parent), at the nearest
+        generation an ancestor appears in."""
+        found = {}
+        frontier = [goat_id]
+        generation = 0
+        while frontier and (depth is None or generation < depth):
+            generation += 1
+            parents = []
+            for child_id in frontier:
+                node = self.nodes.get(child_id)
+                if node is None:
+                    continue
+                for parent_id in (node.dam_id, node.sire_id):
+                    if parent_id in self.nodes and parent_id not in found and parent_id != goat_id:
+                        found[parent_id] = generation
+                        parents.append(parent_id)
+            frontier = parents
+        return found
+
+    def descendants(self, goat_id, depth=None):
+        """Ids of every descendant, down to ``depth`` generations."""
+        found = set()
+        frontier = [goat_id]
+        generation = 0
+        while frontier and (depth is None or generation < depth):
+            generation += 1
+            kids = []
+            for parent_id in frontier:
+                for kid_id in self.children.get(parent_id, ()):
+                    if kid_id not in found and kid_id != goat_id:
+                        found.add(kid_id)
+                        kids.append(kid_id)
+            frontier = kids
+        return found
+
+    def siblings(self, goat_id):
+        """``(node, 'full' | 'half')`` for every goat sharing a parent,
+        full siblings first."""
+        node = self.nodes.get(goat_id)
+        if node is None:
+            return []
+        result = {}
+        for parent_id in (node.dam_id, node.sire_id):
+            for kid_id in self.children.get(parent_id, ()) if parent_id else ():
+                if kid_id == goat_id or kid_id in result:
+                    continue
+                kid = self.nodes[kid_id]
+                full = node.dam_id and node.sire_id and (kid.dam_id, kid.sire_id) == (node.dam_id, node.sire_id)
+                result[kid_id] = (kid, 'full' if full else 'half')
+        return sorted(result.values(), key=lambda s: (s[1] != 'full', s[0].name.lower()))
+
+
+def load(version=None):
+    """Build a graph from the database (one query)."""
+    return Graph(Goat.objects.order_by('pk').values_list('id', *FIELDS), version)
+
+
+def graph():
+    """This process's graph, rebuilt if the registry changed since it was loaded."""
+    global _graph
+    stamp = fragments.version('pedigree')
+    current = _graph
+    if current is not None and current.version == stamp:
+        return current
+    with _lock:
+        if _graph is None or _graph.version != stamp:
+            _graph = load(stamp)
+        return _graph
+
+
+def changed(goat):
+    """Whether a saved goat differs from its node in this process's graph.
+
+    Answers True when that can't be told without a query (no graph loaded,
+    or one that is already out of date), so the caller invalidates.
+    """
+    current = _graph
+    if current is None or current.version != fragments.version('pedigree'):
+        return True
+    values = [goat.pk] + [getattr(goat, f) for f in FIELDS]
+    values[7] = values[7].name if values[7] else ''  # image FieldFile
+    return current.get(goat.pk) != _node(values)
@@ -0,0 +1,180 @@
+"""Per-view performance instrumentation.
+
+``PerfMiddleware`` (farm/middleware.py) measures each request with
+``measure()`` when ``PERF_MONITOR`` is enabled and files the sample under the
+request's URL name in a rolling in-process window, summarised on
+``/tools/perf/``. ``measure()`` is also what the query-budget assertions in
+farm/tests.py use.
+
+Template render time is collected by the ``DjangoTemplates`` backend below,
+which is configured in settings and only adds a timer while a measurement is
+active. It includes any queries evaluated lazily from templates.
+"""
+from collections import deque
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+# Upper bounds (ms) of the wall-time histogram buckets
+BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500]
+
+_local = threading.local()
+_lock = threading.Lock()
+_samples = {}
+
+
+class Sample:
+    """Measurements of a single request (or any block under ``measure()``)."""
+
+    def __init__(self, keep_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.wall_time = 0.0
+        self.sql = [] if keep_sql else None
+        self.params = [] if keep_sql else None  # alongside sql
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            if self.sql is not None:
+                self.sql.append(sql)
+                self.params.append(params)
+
+
+def _active():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def measure(keep_sql=False):
+    """Measure queries, DB time, template time and wall time of a block."""
+    sample = Sample(keep_sql)
+    stack = _active()
+    stack.append(sample)
+    start = time.perf_counter()
+    try:
+        with _wrap_connections(sample):
+            yield sample
+    finally:
+        sample.wall_time = time.perf_counter() - start
+        stack.remove(sample)
+
+
+@contextmanager
+def _wrap_connections(sample):
+    wrapped = []
+    try:
+        for conn in connections.all():
+            cm = conn.execute_wrapper(sample)
+            cm.__enter__()
+            wrapped.append(cm)
+        yield
+    finally:
+        for cm in reversed(wrapped):
+            cm.__exit__(None, None, None)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        stack = _active()
+        if not stack:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            elapsed = time.perf_counter() - start
+            for sample in stack:
+                sample.template_time += elapsed
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Django template backend that reports render time to ``measure()``."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+# --- Rolling window ---
+
+def record(view_name, sample):
+    window = getattr(settings, 'PERF_WINDOW', 500)
+    row = (sample.queries, sample.db_time * 1000, sample.template_time * 1000, sample.wall_time * 1000)
+    with _lock:
+        samples = _samples.get(view_name)
+        if samples is None or samples.maxlen != window:
+            samples = _samples[view_name] = deque(samples or (), maxlen=window)
+        samples.append(row)
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+
+def _percentile(ordered, pct):
+    # Nearest-rank percentile
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _describe(values):
+    ordered = sorted(values)
+    return {
+        'mean': round(sum(ordered) / len(ordered), 2),
+        'p50': round(_percentile(ordered, 50), 2),
+        'p95': round(_percentile(ordered, 95), 2),
+        'max': round(ordered[-1], 2),
+    }
+
+
+def _histogram(wall_times):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for ms in wall_times:
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    labels = [f'<={b}ms' for b in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+    return dict(zip(labels, counts))
+
+
+def summary():
+    """Per-view statistics over the rolling window, slowest (p95 wall) first."""
+    with _lock:
+        snapshot = {name: list(rows) for name, rows in _samples.items()}
+    views = []
+    for name, rows in snapshot.items():
+        queries, db, template, wall = zip(*rows)
+        views.append({
+            'view': name,
+            'count': len(rows),
+            'queries': _describe(queries),
+            'db_ms': _describe(db),
+            'template_ms': _describe(template),
+            'wall_ms': _describe(wall),
+            'histogram': _histogram(wall),
+        })
+    views.sort(key=lambda v: v['wall_ms']['p95'], reverse=True)
+    return views
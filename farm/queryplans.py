@@ -0,0 +1,145 @@
+"""Query-plan audit of the dashboard queries.
+
+``QUERIES`` registers the filters the dashboards run on every load, each
+as a callable that runs them the way the view does. ``audit`` runs each
+one, captures the SQL it sent and asks SQLite for its ``EXPLAIN QUERY
+PLAN``. Two things are flagged:
+
+* ``SCAN <table>`` with no index: every row of the table is read. (A
+  scan ``USING INDEX`` walks an index in order, e.g. for a LIMIT, and
+  is fine.)
+* ``USE TEMP B-TREE``: the rows are sorted or grouped in a temporary
+  structure rather than read in index order.
+
+SQLite plans from the schema even on empty tables, so the audit gives the
+same answer in development, in the test suite (``QueryPlanTest`` fails on
+a regression) and on a production copy. ``manage.py audit_queries`` prints
+the plans.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from . import alerts, pasture, perf
+from .models import MilkLog, PenAssignment, TaskCompletion, Transaction
+
+
+# name -> (callable(today) running the queries as the page does, plan
+# problems accepted for it)
+QUERIES = {}
+
+
+def register(name, allow=()):
+    """Register a dashboard query path. ``allow`` lists plan lines that are
+    expected, e.g. sorting the few rows an index has already narrowed to."""
+    def decorate(run):
+        QUERIES[name] = (run, tuple(allow))
+        return run
+    return decorate
+
+
+@register('milk.recent_logs')
+def _milk_recent(today):
+    list(MilkLog.objects.order_by('-date', '-time')[:50])
+
+
+@register('milk.total_30_days')
+def _milk_total(today):
+    MilkLog.objects.filter(date__gte=today - timedelta(days=30)).aggregate(Sum('amount'))
+
+
+@register('alerts.kidding')
+def _kidding_alerts(today):
+    list(alerts.EVALUATORS['kidding'](today))
+
+
+@register('alerts.medical')
+def _medical_alerts(today):
+    list(alerts.EVALUATORS['medical'](today))
+
+
+@register('finance.totals')
+def _finance(today):
+    transactions = Transaction.objects.select_related('goat', 'supplier').all()
+    list(transactions[:50])
+    for kind in ('Income', 'Expense'):
+        transactions.filter(type=kind).aggregate(Sum('amount'))
+        transactions.filter(type=kind, date__gte=today.replace(day=1)).aggregate(Sum('amount'))
+
+
+@register('pens.current_pen')
+def _current_pen(today):
+    PenAssignment.objects.filter(goat_id=1, date_out__isnull=True).select_related('pen').first()
+
+
+@register('pens.assigned_goats')
+def _assigned_goats(today):
+    list(PenAssignment.objects.filter(date_out__isnull=True).values_list('goat_id', flat=True))
+
+
+# "end_date IS NULL OR end_date > today" reads two index ranges, whose
+# (few, active) rows are then sorted
+@register('pasture.active_assignments', allow=['USE TEMP B-TREE FOR ORDER BY'])
+def _active_pastures(today):
+    list(pasture.active_assignments(today))
+
+
+@register('chores.completed_today')
+def _completed_chores(today):
+    set(TaskCompletion.objects.filter(date=today, completed=True).values_list('task_id', flat=True))
+
+
+@dataclass
+class Result:
+    name: str
+    plans: list = field(default_factory=list)  # (sql, [plan detail lines])
+    problems: list = field(default_factory=list)
+
+
+def explain(sql, params=()):
+    """The ``EXPLAIN QUERY PLAN`` detail lines of a SELECT."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[3] for row in cursor.fetchall()]
+
+
+def problems(plan, allow=()):
+    found = []
+    for detail in plan:
+        if detail in allow:
+            continue
+        if detail.startswith('SCAN ') and ' USING ' not in detail:
+            found.append(f'full table scan: {detail}')
+        elif 'TEMP B-TREE' in detail:
+            found.append(f'temp b-tree: {detail}')
+    return found
+
+
+class _Rollback(Exception):
+    pass
+
+
+def audit(today, names=None):
+    """Results for the registered queries (or those in ``names``)."""
+    results = []
+    for name, (run, allow) in QUERIES.items():
+        if names and name not in names:
+            continue
+        result = Result(name)
+        # Rolled back: anything a query path writes (e.g. alert bookkeeping) is discarded
+        try:
+            with transaction.atomic(), perf.measure(keep_sql=True) as sample:
+                run(today)
+                raise _Rollback
+        except _Rollback:
+            pass
+        for sql, params in zip(sample.sql, sample.params):
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = explain(sql, params)
+            result.plans.append((sql, plan))
+            result.problems.extend(p for p in problems(plan, allow) if p not in result.problems)
+        results.append(result)
+    return results
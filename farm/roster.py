@@ -0,0 +1,138 @@
+"""Herd roster paging for the dashboard grid and ``/api/goats/``.
+
+Pages are keyset-paginated: the opaque cursor carries the sort key and id of
+the last goat on the previous page, so every page is a single range query
+however deep into the herd it is, and goats added or removed between
+requests don't shift later pages.
+"""
+import base64
+from datetime import timedelta
+import json
+
+from django.db.models import DurationField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Coalesce, Lower
+from django.urls import reverse
+from django.utils import timezone
+
+from . import images
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# sort name -> (annotated key, descending)
+SORTS = {
+    'name': ('sort_name', False),
+    'age': ('age_days', False),    # youngest first
+    '-age': ('age_days', True),    # oldest first
+}
+
+NON_MILKING_GENDERS = ('Buck', 'Wether', 'Buckling')
+AVATAR_WIDTH = 160  # card avatars are 80px; 2x for high-density screens
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _age_days(today):
+    # Same rule as Goat.age_in_days: birthdate if known, else approx age in years
+    return Coalesce(
+        ExpressionWrapper(Value(today) - F('birthdate'), output_field=DurationField()),
+        ExpressionWrapper(F('age') * Value(timedelta(days=365)), output_field=DurationField()),
+    )
+
+
+def filtered(queryset, params):
+    """Apply the status / breed / gender / name-prefix filters from ``params``."""
+    status = params.get('status')
+    if status and status != 'all':
+        queryset = queryset.filter(status=status)
+    if params.get('breed'):
+        queryset = queryset.filter(breed__iexact=params['breed'])
+    if params.get('gender'):
+        queryset = queryset.filter(gender=params['gender'])
+    if params.get('q'):
+        queryset = queryset.filter(name__istartswith=params['q'].strip())
+    return queryset
+
+
+def encode_cursor(sort, key, pk):
+    raw = json.dumps([sort, key, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, key, pk = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Malformed cursor')
+    if cursor_sort != sort:
+        raise InvalidCursor('Cursor belongs to a different sort order')
+    if not isinstance(pk, int) or not isinstance(key, (int, str)):
+        raise InvalidCursor('Malformed cursor')
+    return key, pk
+
+
+def _key_value(goat, field):
+    value = getattr(goat, field)
+    return value.days if isinstance(value, timedelta) else value
+
+
+def page(queryset, sort='name', cursor=None, limit=PAGE_SIZE, today=None):
+    """One page of ``queryset`` in ``sort`` order.
+
+    Returns ``(goats, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    field, descending = SORTS[sort]
+    today = today or timezone.localdate()
+    queryset = queryset.annotate(sort_name=Lower('name'), age_days=_age_days(today))
+
+    if cursor:
+        key, pk = decode_cursor(cursor, sort)
+        if field == 'age_days':
+            key = timedelta(days=key)
+        after = '__lt' if descending else '__gt'
+        queryset = queryset.filter(
+            Q(**{field + after: key}) | Q(**{field: key, 'pk' + after: pk})
+        )
+
+    prefix = '-' if descending else ''
+    goats = list(queryset.order_by(prefix + field, prefix + 'pk')[:limit + 1])
+    next_cursor = None
+    if len(goats) > limit:
+        goats = goats[:limit]
+        last = goats[-1]
+        next_cursor = encode_cursor(sort, _key_value(last, field), last.pk)
+    return goats, next_cursor
+
+
+def serialize(goat):
+    """JSON-ready card data for one goat."""
+    return {
+        'id': goat.id,
+        'name': goat.name,
+        'breed': goat.breed,
+        'gender': goat.gender,
+        'gender_display': goat.get_gender_display() if goat.gender else '',
+        'status': goat.status,
+        'is_fainting': goat.is_fainting,
+        'display_age': goat.display_age,
+        'age_in_days': goat.age_in_days,
+        'image': images.fitting_url(goat.image.storage, goat.image.name, goat.image_widths, AVATAR_WIDTH)
+        if goat.image else None,
+        'image_srcset': images.srcset(goat.image, goat.image_widths) if goat.image else '',
+        'can_milk': goat.gender not in NON_MILKING_GENDERS,
+        'url': reverse('goat_detail', args=[goat.id]),
+        'toggle_sick_url': reverse('toggle_sick', args=[goat.id]),
+    }
+
+
+def payload(queryset, sort='name', cursor=None, limit=PAGE_SIZE, today=None):
+    """Response body of ``/api/goats/``. The first page also carries the
+    total ``count`` of matching goats."""
+    goats, next_cursor = page(queryset, sort, cursor, limit, today)
+    data = {'results': [serialize(g) for g in goats], 'next_cursor': next_cursor}
+    if not cursor:
+        data['count'] = queryset.count()
+    return data
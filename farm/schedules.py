@@ -0,0 +1,121 @@
+"""Recurring treatment schedules expanded into dated occurrences.
+
+A ``MedicalSchedule`` repeats every ``interval_days`` after
+``last_performed``. ``with_next_due()`` computes the next due date in SQL so
+schedules outside a window are filtered in the database, and ``occurrences()``
+expands every schedule into its concrete dates over a window. Herd-wide
+schedules (no goat) are resolved against the current roster: each
+occurrence lists the goats it covers.
+
+Expansions are cached in the ``schedules`` fragment section (see
+farm/fragments.py), which schedule and goat writes invalidate. The calendar
+feed and the schedule alerts both read them from here.
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.db.models import DateField, DurationField, ExpressionWrapper, F, Value
+
+from . import fragments
+from .models import Goat, MedicalSchedule
+
+DUE_SOON_DAYS = 14  # as MedicalSchedule.is_due_soon
+
+# Cap on dates produced per schedule, so a one-day interval over a long
+# window stays bounded
+MAX_PER_SCHEDULE = 400
+
+
+@dataclass
+class Occurrence:
+    schedule_id: int
+    record_type: str
+    label: str           # record type display name
+    interval_days: int
+    date: date
+    goat_id: int = None  # None for herd-wide schedules
+    goat_name: str = ''
+    goats: list = field(default_factory=list)  # (id, name) covered by a herd-wide schedule
+
+    @property
+    def herd_wide(self):
+        return self.goat_id is None
+
+    @property
+    def target(self):
+        return self.goat_name if self.goat_id else f"Herd ({len(self.goats)})"
+
+
+def with_next_due(queryset=None):
+    """Annotate ``next_due_on`` (last_performed + interval_days) in SQL."""
+    queryset = MedicalSchedule.objects.all() if queryset is None else queryset
+    interval = ExpressionWrapper(F('interval_days') * Value(timedelta(days=1)), output_field=DurationField())
+    return queryset.annotate(
+        next_due_on=ExpressionWrapper(F('last_performed') + interval, output_field=DateField())
+    )
+
+
+def roster():
+    """Goats a herd-wide schedule applies to."""
+    return list(
+        Goat.objects.filter(is_external=False).exclude(status='Deceased')
+        .order_by('name').values_list('id', 'name')
+    )
+
+
+def _expand(start, end):
+    schedules = with_next_due().select_related('goat')
+    if end is not None:
+        schedules = schedules.filter(next_due_on__lte=end)
+    herd = None
+    result = []
+    for schedule in schedules.order_by('next_due_on', 'pk'):
+        if schedule.interval_days <= 0:
+            dates = [schedule.next_due_on]
+        else:
+            step = timedelta(days=schedule.interval_days)
+            first = schedule.next_due_on
+            if start is not None and first < start:
+                # Only the next occurrence can be overdue; skip past later ones
+                first += step * -(-(start - first).days // schedule.interval_days)
+            dates = []
+            while (end is None or first <= end) and len(dates) < MAX_PER_SCHEDULE:
+                dates.append(first)
+                if end is None:
+                    break
+                first += step
+        if schedule.goat_id is None and herd is None:
+            herd = roster()
+        for day in dates:
+            result.append(Occurrence(
+                schedule_id=schedule.pk,
+                record_type=schedule.record_type,
+                label=schedule.get_record_type_display(),
+                interval_days=schedule.interval_days,
+                date=day,
+                goat_id=schedule.goat_id,
+                goat_name=schedule.goat.name if schedule.goat else '',
+                goats=herd if schedule.goat_id is None else [],
+            ))
+    result.sort(key=lambda o: (o.date, o.schedule_id))
+    return result
+
+
+def occurrences(start=None, end=None):
+    """Every occurrence dated ``start`` <= day <= ``end``, in date order.
+
+    Without ``start`` the window opens at each schedule's next due date,
+    which may be in the past (overdue).
+    """
+    return fragments.cached('schedules', 'occurrences', lambda: _expand(start, end), start, end)
+
+
+def next_occurrences(until):
+    """The next occurrence of each schedule due on or before ``until``."""
+    seen = set()
+    first = []
+    for occurrence in occurrences(None, until):
+        if occurrence.schedule_id not in seen:
+            seen.add(occurrence.schedule_id)
+            first.append(occurrence)
+    return first
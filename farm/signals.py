@@ -0,0 +1,189 @@
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import activity, alerts, database, fragments, images, pedigree
+from .models import (Alert, BreedingLog, DailyTask, FarmEvent, FeedItem, Goat, GoatPhoto, GrazingArea,
+    HealthScore, HeatObservation, KiddingRecord, MapMarker, MedicalRecord, MedicalSchedule, Medicine,
+    PastureAssignment, PastureCondition, Pen, PenAssignment, TaskCompletion)
+
+
+# --- SQLite performance profile (farm/database.py) ---
+
+@receiver(connection_created, dispatch_uid='database_configure')
+def database_connected(sender, connection, **kwargs):
+    database.configure(connection)
+
+
+@receiver(request_finished, dispatch_uid='database_optimize')
+def database_optimize(sender, **kwargs):
+    database.optimize()
+
+
+# --- Alert store / denormalized observation maintenance ---
+
+@receiver([post_save, post_delete], sender=BreedingLog, dispatch_uid='alerts_kidding')
+def refresh_kidding_alert(sender, instance, **kwargs):
+    alerts.refresh('kidding', ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=MedicalRecord, dispatch_uid='alerts_medical')
+def refresh_medical_alert(sender, instance, **kwargs):
+    alerts.refresh('medical', ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=MedicalSchedule, dispatch_uid='alerts_schedule')
+def refresh_schedule_alert(sender, instance, **kwargs):
+    # The alert is built from the cached projection, so drop that first
+    fragments.bump('schedules')
+    alerts.refresh('schedule', ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=FeedItem, dispatch_uid='alerts_low_stock')
+def refresh_low_stock_alert(sender, instance, **kwargs):
+    alerts.refresh('low_stock', ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Medicine, dispatch_uid='alerts_expired_med')
+def refresh_expired_med_alert(sender, instance, **kwargs):
+    alerts.refresh('expired_med', ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=HealthScore, dispatch_uid='health_score_changed')
+def health_score_changed(sender, instance, **kwargs):
+    instance.goat.refresh_latest_health_score()
+    alerts.refresh('famacha', ids=[instance.goat_id])
+
+
+@receiver([post_save, post_delete], sender=HeatObservation, dispatch_uid='heat_observation_changed')
+def heat_observation_changed(sender, instance, **kwargs):
+    instance.goat.refresh_latest_heat()
+    alerts.refresh('heat', ids=[instance.goat_id])
+
+
+@receiver([post_save, post_delete], sender=PenAssignment, dispatch_uid='alerts_pen_assignment')
+@receiver([post_save, post_delete], sender=Pen, dispatch_uid='alerts_pen')
+def refresh_overcrowded_alerts(sender, instance, **kwargs):
+    # Assignments are also ended in bulk with .update(), which sends no
+    # signal, so re-check every pen (one aggregate query) rather than one.
+    alerts.refresh('overcrowded')
+
+
+@receiver(post_save, sender=Goat, dispatch_uid='alerts_goat_save')
+def refresh_goat_alerts(sender, instance, **kwargs):
+    # Status, gender and external flag decide whether a goat is alerted on
+    alerts.refresh('famacha', ids=[instance.pk])
+    alerts.refresh('heat', ids=[instance.pk])
+    # Kidding, medical and schedule alerts carry the name in their title.
+    # Schedule occurrences are cached with it: goat_fragments_changed drops
+    # them too, but only after this receiver has run.
+    fragments.bump('schedules')
+    alerts.refresh_titles(instance)
+
+
+@receiver(post_delete, sender=Goat, dispatch_uid='alerts_goat_delete')
+def purge_goat_alerts(sender, instance, **kwargs):
+    Alert.objects.filter(goat_id=instance.pk).delete()
+    fragments.bump('alerts')
+
+
+# --- Dashboard fragment invalidation (see farm/fragments.py) ---
+# The alerts section is bumped by alerts.refresh(), since the Alert table is
+# written with bulk operations that send no signals.
+
+@receiver([post_save, post_delete], sender=Goat, dispatch_uid='fragments_goat')
+def goat_fragments_changed(sender, instance, **kwargs):
+    # schedules: herd-wide schedules are resolved against the roster
+    fragments.bump('herd', 'map', 'rotation', 'calendar', 'schedules')
+
+
+@receiver([post_save, post_delete], sender=TaskCompletion, dispatch_uid='fragments_task_completion')
+@receiver([post_save, post_delete], sender=DailyTask, dispatch_uid='fragments_task')
+def chores_fragments_changed(sender, instance, **kwargs):
+    fragments.bump('chores')
+
+
+@receiver(m2m_changed, sender=PastureAssignment.goats.through, dispatch_uid='fragments_assignment_goats')
+@receiver([post_save, post_delete], sender=PastureAssignment, dispatch_uid='fragments_assignment')
+@receiver([post_save, post_delete], sender=GrazingArea, dispatch_uid='fragments_grazing_area')
+def pasture_fragments_changed(sender, **kwargs):
+    fragments.bump('map', 'rotation')
+
+
+@receiver([post_save, post_delete], sender=MapMarker, dispatch_uid='fragments_marker')
+@receiver([post_save, post_delete], sender=PastureCondition, dispatch_uid='fragments_condition')
+def map_fragments_changed(sender, instance, **kwargs):
+    fragments.bump('map')
+
+
+@receiver([post_save, post_delete], sender=BreedingLog, dispatch_uid='fragments_breeding_log')
+@receiver([post_save, post_delete], sender=MedicalRecord, dispatch_uid='fragments_medical_record')
+@receiver([post_save, post_delete], sender=MedicalSchedule, dispatch_uid='fragments_medical_schedule')
+@receiver([post_save, post_delete], sender=HeatObservation, dispatch_uid='fragments_heat')
+@receiver([post_save, post_delete], sender=KiddingRecord, dispatch_uid='fragments_kidding')
+@receiver([post_save, post_delete], sender=FarmEvent, dispatch_uid='fragments_farm_event')
+def calendar_fragments_changed(sender, instance, **kwargs):
+    fragments.bump('calendar')
+
+
+# --- Pedigree graph (see farm/pedigree.py) ---
+
+@receiver(post_save, sender=Goat, dispatch_uid='pedigree_goat_save')
+def pedigree_goat_saved(sender, instance, **kwargs):
+    # Edits that leave parentage, names and flags alone keep the graph
+    if pedigree.changed(instance):
+        fragments.bump('pedigree')
+
+
+@receiver(post_delete, sender=Goat, dispatch_uid='pedigree_goat_delete')
+def pedigree_goat_deleted(sender, instance, **kwargs):
+    fragments.bump('pedigree')
+
+
+# --- Photo copies (see farm/images.py) ---
+
+@receiver(pre_save, sender=GoatPhoto, dispatch_uid='images_photo_upload')
+@receiver(pre_save, sender=Goat, dispatch_uid='images_goat_upload')
+def image_uploading(sender, instance, **kwargs):
+    # A new upload is an uncommitted file until the model stores it
+    instance._image_uploaded = bool(instance.image) and not instance.image._committed
+    instance._replaced_image = None
+    if instance._image_uploaded or not instance.image:
+        if instance.pk and (instance._image_uploaded or instance.image_widths):
+            # The stored image may have copies; look up its name to remove them
+            instance._replaced_image = (sender.objects.filter(pk=instance.pk)
+                                        .values_list('image', 'image_widths').first())
+        instance.image_widths = []
+
+
+@receiver(post_save, sender=GoatPhoto, dispatch_uid='images_photo_saved')
+@receiver(post_save, sender=Goat, dispatch_uid='images_goat_saved')
+def image_uploaded(sender, instance, **kwargs):
+    replaced = getattr(instance, '_replaced_image', None)
+    if replaced and replaced[0] and replaced[0] != instance.image.name:
+        images.discard(instance.image.storage, *replaced)
+    if getattr(instance, '_image_uploaded', False):
+        images.schedule(instance)
+
+
+@receiver(post_delete, sender=GoatPhoto, dispatch_uid='images_photo_deleted')
+@receiver(post_delete, sender=Goat, dispatch_uid='images_goat_deleted')
+def image_deleted(sender, instance, **kwargs):
+    if instance.image:
+        images.discard(instance.image.storage, instance.image.name, instance.image_widths)
+
+
+# --- Activity feed (see farm/activity.py) ---
+
+def activity_saved(sender, instance, **kwargs):
+    activity.record(instance)
+
+
+def activity_deleted(sender, instance, **kwargs):
+    activity.remove(instance)
+
+
+for _model in activity.SOURCES:
+    post_save.connect(activity_saved, sender=_model, dispatch_uid=f'activity_save_{_model.__name__}')
+    post_delete.connect(activity_deleted, sender=_model, dispatch_uid=f'activity_delete_{_model.__name__}')
@@ -0,0 +1,566 @@
+"""Synthetic farm data for scale testing.
+
+``generate`` fills an empty database with a farm of a chosen size: a herd
+bred over several kidding seasons from a set of founders (so pedigrees run
+several generations deep), and for every goat the milk, weight, FAMACHA/BCS,
+heat, medical, breeding and kidding records it would have collected, plus
+herd-wide feeding and finance history, pens, paddock polygons around the
+farm location and a grazing rotation through them.
+
+Everything is drawn from one ``random.Random(seed)``, so a seed, size and
+end date always give the same farm. Rows are written with ``bulk_create`` in
+batches of ``BATCH_SIZE`` inside one transaction. bulk_create sends no
+signals, so what they maintain is written alongside: activity feed entries
+(``activity.entries``) and the goats' latest observations; the alert store
+is rebuilt and every fragment section bumped at the end.
+
+``manage.py generate_farm`` is the command-line front end.
+"""
+from collections import Counter, defaultdict
+from datetime import date, time, timedelta
+from decimal import Decimal
+import json
+import math
+import random
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import activity, alerts, fragments
+from .models import (ActivityEvent, BreedingLog, DailyTask, FarmEvent, FarmSettings, FeedingLog, FeedItem,
+    Goat, GrazingArea, HealthScore, HeatObservation, KiddingRecord, MedicalRecord, MedicalSchedule, Medicine,
+    MilkLog, PastureAssignment, PastureCondition, Pen, PenAssignment, Supplier, TaskCompletion, Transaction,
+    Vet, WeightLog)
+
+BATCH_SIZE = 2000
+
+# Used when the farm settings have no location yet
+DEFAULT_LOCATION = (38.03, -78.48)
+
+# breed -> (adult doe weight in lbs, share of a standard doe's milk)
+BREEDS = {
+    'Nubian': (140, 0.9),
+    'Alpine': (135, 1.0),
+    'Saanen': (145, 1.1),
+    'LaMancha': (130, 0.9),
+    'Nigerian Dwarf': (70, 0.4),
+    'Boer': (190, 0.3),
+}
+CROSSBRED = (130, 0.8)
+
+NAMES = [
+    'Daisy', 'Clover', 'Hazel', 'Juniper', 'Maple', 'Willow', 'Pepper', 'Ginger', 'Olive', 'Poppy',
+    'Rosie', 'Luna', 'Stella', 'Bella', 'Hattie', 'Mabel', 'Nellie', 'Pearl', 'Ruby', 'Sadie',
+    'Thistle', 'Tansy', 'Fern', 'Sage', 'Basil', 'Nutmeg', 'Cocoa', 'Honey', 'Biscuit', 'Marigold',
+    'Buttercup', 'Dandelion', 'Acorn', 'Bramble', 'Cinder', 'Dusty', 'Ember', 'Freckles', 'Gus', 'Hank',
+    'Jasper', 'Kip', 'Louie', 'Moose', 'Ned', 'Oscar', 'Pip', 'Rocco', 'Scout', 'Tucker',
+]
+HEAT_SIGNS = ['flagging', 'mounting', 'mucus discharge', 'vocalizing', 'swollen vulva', 'off feed']
+PAD_COLORS = ['#4caf50', '#8bc34a', '#cddc39', '#009688', '#ff9800', '#795548', '#3f51b5', '#e91e63']
+
+SEASON_START = (2, 1)  # kidding runs from Feb 1...
+SEASON_DAYS = 89  # ...to the end of April
+GESTATION = 150
+LACTATION = 305
+GRAZING = ((4, 1), (10, 31))  # the herd is out on pasture from April through October
+
+TWO = Decimal('0.01')
+
+
+def _money(value):
+    return Decimal(value).quantize(TWO)
+
+
+def _age_days(goat, on):
+    return (on - goat.birthdate).days
+
+
+def _alive(goat, on):
+    return goat.birthdate <= on and (goat._died is None or on < goat._died)
+
+
+def _days(first, last, step=1):
+    day = first
+    while day <= last:
+        yield day
+        day += timedelta(days=step)
+
+
+class _Writer:
+    """Buffers unsaved rows per model and writes them in batches, with the
+    activity feed entries of the models the feed shows."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = defaultdict(list)
+        self.counts = Counter()
+
+    def add(self, obj):
+        rows = self.pending[type(obj)]
+        rows.append(obj)
+        if len(rows) >= self.batch_size:
+            self.flush(type(obj))
+
+    def flush(self, model=None):
+        for model in [model] if model else list(self.pending):
+            rows = self.pending.pop(model, [])
+            if not rows:
+                continue
+            model.objects.bulk_create(rows, batch_size=self.batch_size)
+            self.counts[model.__name__] += len(rows)
+            if model in activity.SOURCES:
+                events = activity.entries(rows)
+                ActivityEvent.objects.bulk_create(events, batch_size=self.batch_size)
+                self.counts[ActivityEvent.__name__] += len(events)
+
+
+class _Farm:
+
+    def __init__(self, size, years, rng, until, writer):
+        self.size = size
+        self.rng = rng
+        self.until = until
+        self.start = until - timedelta(days=round(365 * years))
+        self.writer = writer
+        self.herd = []  # Goat instances, parents before offspring
+        self.kiddings = []  # (dam, sire, date, born, alive)
+        self.bred = defaultdict(list)  # doe -> her breeding dates
+        self._names = Counter()
+
+    # --- Herd and pedigree ---
+
+    def _name(self):
+        base = self.rng.choice(NAMES)
+        self._names[base] += 1
+        return base if self._names[base] == 1 else f'{base} {self._names[base]}'
+
+    def _goat(self, breed, female, birthdate, dam=None, sire=None):
+        rng = self.rng
+        goat = Goat(name=self._name(), breed=breed, birthdate=birthdate, dam=dam, sire=sire, status='Healthy')
+        # Most bucklings are wethered; a few are kept intact for breeding
+        goat._intact = not female and rng.random() < 0.15
+        goat._level = 1 + max(dam._level, sire._level) if dam else 0
+        goat._died = None
+        if rng.random() < 0.04:
+            lifetime = (self.until - birthdate).days
+            if lifetime > 30:
+                goat._died = birthdate + timedelta(days=rng.randint(20, lifetime))
+                goat.status = 'Deceased'
+        if goat.status == 'Healthy':
+            goat.status = rng.choices(['Healthy', 'Sick', 'Vet'], [97, 2.5, 0.5])[0]
+        adult = _age_days(goat, self.until) >= 365
+        if female:
+            goat.gender = 'Doe' if adult else 'Doeling'
+        elif goat._intact:
+            goat.gender = 'Buck' if adult else 'Buckling'
+        else:
+            goat.gender = 'Wether'
+        if rng.random() < 0.6:
+            goat.registration_number = f'{rng.choice(["ADGA", "AGS", "ABGA"])}-{rng.randrange(10**6, 10**7)}'
+        if rng.random() < 0.3:
+            goat.microchip = f'985{rng.randrange(10**11, 10**12)}'
+        self.herd.append(goat)
+        return goat
+
+    def _founder(self, latest_birth, buck=False):
+        rng = self.rng
+        birthdate = latest_birth - timedelta(days=rng.randint(0, 5 * 365))
+        goat = self._goat(rng.choice(list(BREEDS)), not buck and rng.random() < 0.9, birthdate)
+        if buck:
+            goat._intact = True
+            goat.gender = 'Buck'
+        return goat
+
+    def _season(self, year, quota):
+        """One kidding season: every doe old enough may kid, to a sire that
+        isn't her own. Records up to ``quota`` of the live kids as goats."""
+        rng = self.rng
+        opening = date(year, *SEASON_START)
+        does = [g for g in self.herd if g.gender in ('Doe', 'Doeling') and _age_days(g, opening) >= 240]
+        mating = opening - timedelta(days=GESTATION)
+        bucks = [g for g in self.herd if g._intact and _alive(g, mating) and _age_days(g, mating) >= 180]
+        if not bucks:
+            return
+        rng.shuffle(does)
+        for dam in does:
+            kidded = opening + timedelta(days=rng.randint(0, SEASON_DAYS))
+            # Doelings are bred from seven months, so kid at a year or so
+            if not (self.start <= kidded <= self.until) or _age_days(dam, kidded) < 360 \
+                    or not _alive(dam, kidded) or rng.random() > 0.85:
+                continue
+            sire = rng.choice([g for g in bucks if g is not dam.sire] or bucks)
+            born = rng.choices([1, 2, 3, 4], [30, 50, 17, 3])[0]
+            alive = sum(rng.random() > 0.05 for _ in range(born))
+            self.kiddings.append((dam, sire, kidded, born, alive))
+            breed = dam.breed if dam.breed == sire.breed else 'Crossbred'
+            for _ in range(alive):
+                if quota <= 0:
+                    break  # sold or kept off the books
+                self._goat(breed, rng.random() < 0.5, kidded, dam=dam, sire=sire)
+                quota -= 1
+
+    def breed_herd(self):
+        rng = self.rng
+        founders = max(2, math.ceil(self.size * 0.3))
+        self._founder(self.start - timedelta(days=365), buck=True)
+        for _ in range(founders - 1):
+            self._founder(self.start - timedelta(days=365))
+        years = [year for year in range(self.start.year, self.until.year + 1)
+                 if date(year, *SEASON_START) <= self.until
+                 and date(year, *SEASON_START) + timedelta(days=SEASON_DAYS) >= self.start]
+        for i, year in enumerate(years):
+            remaining = self.size - len(self.herd)
+            self._season(year, math.ceil(remaining / (len(years) - i)))
+        # Bought in to make up the numbers when the seasons fall short
+        while len(self.herd) < self.size:
+            self._founder(self.until - timedelta(days=365))
+        # Parents are written before their offspring, a generation at a time
+        for level in range(max(g._level for g in self.herd) + 1):
+            Goat.objects.bulk_create([g for g in self.herd if g._level == level], batch_size=self.writer.batch_size)
+        self.writer.counts['Goat'] += len(self.herd)
+        self.kiddings.sort(key=lambda k: k[2])
+        for dam, _, kidded, _, _ in self.kiddings:
+            self.bred[dam].append(kidded - timedelta(days=GESTATION))
+
+    def breedings(self):
+        rng = self.rng
+        kiddings = []
+        for dam, sire, kidded, born, alive in self.kiddings:
+            log = BreedingLog(goat=dam, mate_name=sire.name, breeding_date=kidded - timedelta(days=GESTATION),
+                              due_date=kidded)
+            self.writer.add(log)
+            kiddings.append((log, dam, kidded, born, alive))
+        # This season's matings, not due yet, for does that aren't still
+        # nursing a recent litter
+        bucks = [g for g in self.herd if g._intact and _alive(g, self.until)]
+        for goat in self.herd:
+            if not bucks or goat.gender != 'Doe' or not _alive(goat, self.until) or rng.random() > 0.4:
+                continue
+            bred = self.until - timedelta(days=rng.randint(5, GESTATION - 10))
+            if any(bred - previous < timedelta(days=GESTATION + 60) for previous in self.bred[goat]):
+                continue
+            self.bred[goat].append(bred)
+            self.writer.add(BreedingLog(goat=goat, mate_name=rng.choice(bucks).name, breeding_date=bred,
+                                        due_date=bred + timedelta(days=GESTATION)))
+        self.writer.flush(BreedingLog)
+        for log, dam, kidded, born, alive in kiddings:
+            birth_type = ['Single', 'Twins', 'Triplets', 'Quads'][born - 1]
+            presentation = rng.choices(['Normal', 'Breach', 'Other'], [90, 8, 2])[0]
+            self.writer.add(KiddingRecord(
+                breeding_log=log, dam=dam, kidding_date=kidded, num_kids_born=born, num_alive=alive,
+                num_stillborn=born - alive, birth_type=birth_type, presentation=presentation,
+                assisted=presentation != 'Normal' or rng.random() < 0.05,
+                notes=rng.choice(['', '', 'Kids up and nursing quickly', 'Long labor'])))
+
+    # --- Per-goat history ---
+
+    def _span(self, goat):
+        end = self.until if goat._died is None else min(self.until, goat._died - timedelta(days=1))
+        return max(self.start, goat.birthdate), end
+
+    def weights(self, goat):
+        rng = self.rng
+        adult = BREEDS.get(goat.breed, CROSSBRED)[0] * (1.3 if goat._intact else 1)
+        first, last = self._span(goat)
+        for day in _days(first + timedelta(days=rng.randint(0, 29)), last, 30):
+            grown = 1 - 0.93 * math.exp(-_age_days(goat, day) / 200)
+            self.writer.add(WeightLog(goat=goat, date=day, weight=_money(adult * grown * rng.uniform(0.94, 1.06))))
+
+    def health(self, goat):
+        """Monthly scores. Returns the dewormings the poor ones led to,
+        unsaved, so ``medical`` can set the due date of the last one first."""
+        rng = self.rng
+        first, last = self._span(goat)
+        latest = None
+        dewormings = []
+        for day in _days(first + timedelta(days=rng.randint(14, 44)), last, 30):
+            famacha = rng.choices([1, 2, 3, 4, 5], [30, 40, 20, 8, 2])[0]
+            bcs = Decimal(rng.choices(['2.0', '2.5', '3.0', '3.5', '4.0'], [5, 25, 40, 25, 5])[0])
+            notes = 'Pale eyelids' if famacha >= 4 else ''
+            latest = HealthScore(goat=goat, date=day, famacha_score=famacha, body_condition_score=bcs, notes=notes)
+            self.writer.add(latest)
+            if famacha >= 4:
+                dewormings.append(MedicalRecord(goat=goat, date=day, record_type='Deworm',
+                                                notes=rng.choice(['Safe-Guard', 'Cydectin', 'Valbazen'])))
+        if latest is not None and goat._died is None:
+            goat.latest_famacha = latest.famacha_score
+            goat.latest_bcs = latest.body_condition_score
+            goat.latest_score_date = latest.date
+        return dewormings
+
+    def medical(self, goat):
+        """Vaccinations, hoof trims and the odd illness. Only the latest of
+        each recurring treatment carries a next due date, as if the farmer
+        cleared the older ones."""
+        rng = self.rng
+        first, last = self._span(goat)
+        records = []
+        latest = {}
+        for year in range(first.year, last.year + 1):
+            day = date(year, 3, 15) + timedelta(days=rng.randint(0, 20))
+            if first <= day <= last and _age_days(goat, day) >= 35:
+                latest['Vaccine'] = MedicalRecord(goat=goat, date=day, record_type='Vaccine', notes='CDT booster')
+                records.append(latest['Vaccine'])
+        for day in _days(first + timedelta(days=rng.randint(60, 90)), last, rng.randint(60, 75)):
+            latest['Hoof'] = MedicalRecord(goat=goat, date=day, record_type='Hoof')
+            records.append(latest['Hoof'])
+        for day in _days(first, last, 365):
+            if rng.random() < 0.1:
+                sick = day + timedelta(days=rng.randint(0, 364))
+                if sick <= last:
+                    records.append(MedicalRecord(goat=goat, date=sick, record_type='Illness',
+                                                 notes=rng.choice(['Limping', 'Scours', 'Cough', 'Pinkeye'])))
+        dewormings = self.health(goat)
+        if dewormings:
+            latest['Deworm'] = dewormings[-1]
+        records += dewormings
+        intervals = {'Vaccine': 365, 'Hoof': 60, 'Deworm': 14}
+        if goat._died is None:
+            for kind, record in latest.items():
+                record.next_due_date = record.date + timedelta(days=intervals[kind])
+        # Only now: a batch may be written as soon as a record is added
+        for record in records:
+            self.writer.add(record)
+
+    def heats(self, goat):
+        """Heats every 21 days through the breeding season (late August
+        to January) until the doe is bred; about a third go unnoticed."""
+        if goat.gender not in ('Doe', 'Doeling'):
+            return
+        rng = self.rng
+        first, last = self._span(goat)
+        bred = self.bred[goat]
+        latest = None
+        for year in range(first.year - 1, last.year + 1):
+            season_end = date(year + 1, 1, 31)
+            stop = min([b for b in bred if date(year, 8, 1) <= b <= season_end], default=season_end)
+            for day in _days(date(year, 8, 20) + timedelta(days=rng.randint(0, 20)), stop, 21):
+                if not first <= day <= last or _age_days(goat, day) < 210 or rng.random() < 0.33:
+                    continue
+                signs = ', '.join(rng.sample(HEAT_SIGNS, rng.randint(1, 3)))
+                latest = HeatObservation(goat=goat, date_observed=day, signs=signs)
+                self.writer.add(latest)
+        if latest is not None and goat._died is None:
+            goat.latest_heat_date = latest.date_observed
+
+    def milk(self):
+        """Twice-daily milkings for each lactation, following a lactation
+        curve that peaks around seven weeks in."""
+        rng = self.rng
+        for dam, _, kidded, _, alive in self.kiddings:
+            if not alive:
+                continue
+            peak = 8 * BREEDS.get(dam.breed, CROSSBRED)[1] * rng.uniform(0.8, 1.2)  # lbs a day
+            end = min(self.until, kidded + timedelta(days=LACTATION))
+            if dam._died is not None:
+                end = min(end, dam._died - timedelta(days=1))
+            for day in _days(kidded + timedelta(days=4), end):
+                t = (day - kidded).days
+                daily = peak * (t / 50) ** 0.25 * math.exp(0.25 * (1 - t / 50))
+                for session, share in (('AM', 0.53), ('PM', 0.47)):
+                    self.writer.add(MilkLog(goat=dam, date=day, time=session,
+                                            amount=_money(daily * share * rng.uniform(0.9, 1.1))))
+
+    def histories(self):
+        for goat in self.herd:
+            self.weights(goat)
+            self.medical(goat)
+            self.heats(goat)
+        self.milk()
+        self.writer.flush()
+        Goat.objects.bulk_update(
+            self.herd, ['latest_famacha', 'latest_bcs', 'latest_score_date', 'latest_heat_date'],
+            batch_size=self.writer.batch_size)
+
+    # --- Farm-wide records ---
+
+    def feeding(self):
+        rng = self.rng
+        for day in _days(self.start, self.until):
+            self.writer.add(FeedingLog(date=day, feed_type='Hay', amount=f'{rng.randint(2, 6)} Flakes',
+                                       time_of_day='Morning', feeding_time=time(6, rng.randint(30, 59))))
+            self.writer.add(FeedingLog(date=day, feed_type='Grain', amount=f'{rng.randint(1, 3)} Scoops',
+                                       time_of_day='Morning', feeding_time=time(7, rng.randint(0, 30))))
+            self.writer.add(FeedingLog(date=day, feed_type='Hay', amount=f'{rng.randint(2, 6)} Flakes',
+                                       time_of_day='Evening', feeding_time=time(17, rng.randint(0, 59))))
+            if day.weekday() == 0:
+                self.writer.add(FeedingLog(date=day, feed_type='Minerals', amount='Refilled feeder'))
+
+    def finances(self):
+        rng = self.rng
+        suppliers = [
+            Supplier(name='County Feed & Seed', category='Feed', phone='555-0100'),
+            Supplier(name='Valley Large Animal Clinic', category='Vet', phone='555-0142'),
+            Supplier(name='Premier Farm Supply', category='Equipment', phone='555-0177'),
+        ]
+        for supplier in suppliers:
+            self.writer.add(supplier)
+        self.writer.add(Vet(name='Dr. Alvarez', phone='555-0142', address='12 Clinic Rd'))
+        self.writer.flush()
+        feed, vet, equipment = suppliers
+        scale = max(1, len(self.herd) / 20)
+        living = [g for g in self.herd if g._died is None]
+        for day in _days(self.start, self.until, 7):
+            self.writer.add(Transaction(date=day, type='Expense', category='Feed', supplier=feed,
+                                        amount=_money(scale * rng.uniform(60, 140)), description='Hay and grain'))
+            self.writer.add(Transaction(date=day, type='Income', category='Product Sale',
+                                        amount=_money(scale * rng.uniform(40, 120)),
+                                        description=rng.choice(['Milk shares', 'Soap sales', 'Cheese'])))
+            if rng.random() < 0.3:
+                patients = [g for g in living if g.birthdate <= day]
+                self.writer.add(Transaction(date=day, type='Expense', category='Vet', supplier=vet,
+                                            goat=rng.choice(patients) if patients else None,
+                                            amount=_money(rng.uniform(45, 400)), description='Farm call'))
+            if rng.random() < 0.08:
+                self.writer.add(Transaction(date=day, type='Expense', category='Equipment', supplier=equipment,
+                                            amount=_money(rng.uniform(20, 600)),
+                                            description=rng.choice(['Fencing', 'Milk pail', 'Hoof shears'])))
+        for _, _, kidded, _, alive in self.kiddings:
+            if alive and rng.random() < 0.5:
+                self.writer.add(Transaction(date=min(self.until, kidded + timedelta(days=70)), type='Income',
+                                            category='Goat Sale', amount=_money(rng.choice([250, 350, 450, 600])),
+                                            description='Kid sold at weaning'))
+
+    def supplies(self):
+        """Feed and medicine stock, schedules, chores and calendar events."""
+        rng = self.rng
+        for item in [
+            FeedItem(name='Alfalfa Hay', quantity=rng.randint(10, 80), unit='Bales', low_stock_threshold=10),
+            FeedItem(name='Goat Pellets', quantity=rng.randint(0, 300), unit='lbs', low_stock_threshold=50),
+            FeedItem(name='Loose Minerals', quantity=rng.randint(0, 40), unit='lbs', low_stock_threshold=5),
+            Medicine(name='CDT Vaccine', quantity=rng.randint(5, 100), unit='ml', dosage_amount=2,
+                     expiration_date=self.until + timedelta(days=rng.randint(-30, 400))),
+            Medicine(name='Safe-Guard', quantity=rng.randint(50, 500), unit='ml', dosage_amount=1,
+                     dosage_weight_interval=25, expiration_date=self.until + timedelta(days=rng.randint(60, 700))),
+            MedicalSchedule(record_type='Vaccine', interval_days=365,
+                            last_performed=self.until - timedelta(days=rng.randint(0, 364))),
+            MedicalSchedule(record_type='Hoof', interval_days=60,
+                            last_performed=self.until - timedelta(days=rng.randint(0, 59))),
+        ]:
+            self.writer.add(item)
+        tasks = [DailyTask(name='Morning milking', time_of_day='AM'), DailyTask(name='Evening milking', time_of_day='PM'),
+                 DailyTask(name='Check water troughs'), DailyTask(name='Walk the fence line')]
+        for task in tasks:
+            self.writer.add(task)
+        self.writer.flush()
+        for day in _days(max(self.start, self.until - timedelta(days=60)), self.until):
+            for task in tasks:
+                if rng.random() < 0.9:
+                    self.writer.add(TaskCompletion(task=task, date=day, completed=True))
+        for day in _days(self.start, self.until + timedelta(days=90), 91):
+            self.writer.add(FarmEvent(title='Herd health visit', date=day + timedelta(days=rng.randint(0, 20)),
+                                      category='Vet'))
+        for year in range(self.start.year, self.until.year + 1):
+            opening = date(year, 8, 10) + timedelta(days=rng.randint(0, 10))
+            self.writer.add(FarmEvent(title='County fair goat show', date=opening,
+                                      end_date=opening + timedelta(days=2), category='Show'))
+
+    def pens(self):
+        """Everyone still on the farm has one current pen; pens fill to
+        capacity before another of the same kind is opened."""
+        rng = self.rng
+        kinds = defaultdict(list)
+        for goat in self.herd:
+            if goat._died is not None:
+                continue
+            if goat.status != 'Healthy':
+                kind = 'Sick'
+            elif goat.gender in ('Buck', 'Buckling'):
+                kind = 'Buck'
+            elif goat.gender == 'Doeling':
+                kind = 'Kid'
+            else:
+                kind = 'Doe'
+            kinds[kind].append(goat)
+        pens = []
+        for kind, goats in kinds.items():
+            capacity = 4 if kind == 'Sick' else 15
+            for n, i in enumerate(range(0, len(goats), capacity), start=1):
+                pen = Pen(name=f'{kind} Pen {n}', pen_type=kind, capacity=capacity)
+                pens.append((pen, goats[i:i + capacity]))
+                self.writer.add(pen)
+        self.writer.flush(Pen)
+        for pen, goats in pens:
+            for goat in goats:
+                date_in = max(goat.birthdate, self.until - timedelta(days=rng.randint(0, 400)))
+                self.writer.add(PenAssignment(pen=pen, goat=goat, date_in=date_in))
+
+    def paddocks(self, center):
+        """A grid of roughly 2.5 acre paddocks (irregular quadrilaterals)
+        around ``center``, grazed in turn by groups of the herd."""
+        rng = self.rng
+        count = max(4, min(60, len(self.herd) // 20))
+        columns = math.ceil(math.sqrt(count))
+        lat0, lng0 = center
+        step_lat = 0.0009  # about 100 m
+        step_lng = step_lat / max(0.1, math.cos(math.radians(lat0)))
+        areas = []
+        for i in range(count):
+            row, col = divmod(i, columns)
+            south = lat0 + (row - columns / 2) * step_lat * 1.05
+            west = lng0 + (col - columns / 2) * step_lng * 1.05
+
+            def corner(lat, lng):
+                return {'lat': round(lat + rng.uniform(-0.05, 0.05) * step_lat, 6),
+                        'lng': round(lng + rng.uniform(-0.05, 0.05) * step_lng, 6)}
+            polygon = [corner(south, west), corner(south + step_lat, west),
+                       corner(south + step_lat, west + step_lng), corner(south, west + step_lng)]
+            area = GrazingArea(name=f'Paddock {i + 1}', color=PAD_COLORS[i % len(PAD_COLORS)],
+                               coordinates=json.dumps(polygon))
+            areas.append(area)
+            self.writer.add(area)
+        self.writer.flush(GrazingArea)
+
+        groups = max(1, count // 4)
+        members = [self.herd[n::groups] for n in range(groups)]
+        stints = []
+        for n in range(groups):
+            paddocks = areas[n::groups]
+            turn = rng.randrange(len(paddocks))
+            for year in range(self.start.year, self.until.year + 1):
+                day, season_end = date(year, *GRAZING[0]), date(year, *GRAZING[1])
+                while day <= min(season_end, self.until):
+                    end = min(season_end, day + timedelta(days=rng.randint(10, 21)))
+                    if end >= self.start:
+                        area = paddocks[turn % len(paddocks)]
+                        assignment = PastureAssignment(grazing_area=area, start_date=day,
+                                                       end_date=None if end > self.until else end)
+                        stints.append((assignment, [g for g in members[n] if _alive(g, day)]))
+                        self.writer.add(assignment)
+                        if end <= self.until:
+                            self.writer.add(PastureCondition(grazing_area=area, date=end, score=rng.randint(2, 5)))
+                    turn += 1
+                    day = end + timedelta(days=1)
+        self.writer.flush(PastureAssignment)
+        through = PastureAssignment.goats.through
+        for assignment, goats in stints:
+            for goat in goats:
+                self.writer.add(through(pastureassignment=assignment, goat=goat))
+
+
+def generate(goats=200, years=3, seed=0, until=None, batch_size=BATCH_SIZE):
+    """Fill an empty database with a farm of ``goats`` goats and ``years``
+    of history ending on ``until`` (today). Returns the number of rows
+    written per model."""
+    until = until or timezone.localdate()
+    writer = _Writer(batch_size)
+    farm = _Farm(goats, years, random.Random(seed), until, writer)
+    with transaction.atomic():
+        farm_settings, _ = FarmSettings.objects.get_or_create(pk=1)
+        if farm_settings.latitude or farm_settings.longitude:
+            center = (farm_settings.latitude, farm_settings.longitude)
+        else:
+            center = DEFAULT_LOCATION
+            FarmSettings.objects.filter(pk=1).update(latitude=center[0], longitude=center[1])
+        farm.breed_herd()
+        farm.breedings()
+        farm.histories()
+        farm.feeding()
+        farm.finances()
+        farm.supplies()
+        farm.pens()
+        farm.paddocks(center)
+        writer.flush()
+        alerts.rebuild()
+    fragments.bump(*fragments.SECTIONS)
+    return dict(writer.counts)
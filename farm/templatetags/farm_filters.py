@@ -1,8 +1,11 @@
 import builtins
 
 from django import template
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 
+from farm import images
+
 register = template.Library()
 
 
@@ -23,3 +26,37 @@ def gender_icon(gender):
     css = 'female' if female else 'male'
     symbol = '\u2640' if female else '\u2642'
     return mark_safe(f'<span class="gender-icon {css}">{symbol}</span>')
+
+
+@register.filter
+def percent(value, places=2):
+    """Format a fraction (0.0625) as a percentage ("6.25%")."""
+    try:
+        return f'{float(value) * 100:.{int(places)}f}%'
+    except (TypeError, ValueError):
+        return value
+
+
+@register.simple_tag
+def picture(field, widths, sizes, **attrs):
+    """An ``<img>`` of an uploaded photo that lets the browser pick a resized
+    copy (WebP where supported) for the displayed ``sizes``. Keyword
+    arguments become attributes of the ``<img>`` (``data_x`` -> ``data-x``).
+    Falls back to the original while no copies exist."""
+    attrs.setdefault('loading', 'lazy')
+    img_attrs = format_html_join('', ' {}="{}"', ((k.replace('_', '-'), v) for k, v in attrs.items()))
+    if not widths:
+        return format_html('<img src="{}"{}>', field.url, img_attrs)
+    return format_html(
+        '<picture class="responsive"><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        images.srcset(field, widths, 'webp'), sizes,
+        images.fitting_url(field.storage, field.name, widths, widths[-1]),
+        images.srcset(field, widths), sizes, img_attrs,
+    )
+
+
+@register.simple_tag
+def image_url(field, widths, width):
+    """URL of the smallest copy of a photo at least ``width`` pixels wide."""
+    return images.fitting_url(field.storage, field.name, widths, width)
@@ -1,29 +1,34 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
-from datetime import timedelta, datetime, date
+from django.utils.html import json_script
+from django.template.loader import render_to_string
+from datetime import timedelta, datetime, date, timezone as dt_timezone
 from django.db.models import F, Sum, Q, Avg
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.views.decorators.http import require_POST
 from django.urls import reverse
 from django.contrib import messages
 from django.conf import settings as django_settings
 import json
 import csv
+import functools
 import requests
 import qrcode
 from io import BytesIO
 import base64
 from .forms import MeatHarvestForm
+from . import (activity, alerts, archives, backups, calendar_feed, costs, exports, fragments, inbreeding,
+    media, pasture, perf, roster, schedules, weather)
+from . import pedigree as pedigree_graph  # the pedigree name is taken by its view
 from .models import (Goat, GoatLog, GrazingArea, DailyTask, TaskCompletion, Vet, MedicalRecord,
     FarmSettings, FeedingLog, BreedingLog, FeedItem, MilkLog, Transaction, WeightLog, FarmEvent,
     Medicine, GoatPhoto, Customer, WaitingList, Sale, MeatHarvest, PastureAssignment, MapMarker,
     PastureCondition, MedicalSchedule, KiddingRecord, HealthScore, HeatObservation, GoatDocument,
-    Supplier, Pen, PenAssignment)
+    Supplier, Pen, PenAssignment, ActivityEvent, age_label)
 from django.db.models import Count
 import os
-import zipfile
 import sqlite3
-import zipfile
+import tempfile
 import sqlite3 as sqlite3_lib
 
 # --- HELPER FUNCTIONS ---
@@ -32,152 +37,147 @@ def get_common_context():
     farm_settings, _ = FarmSettings.objects.get_or_create(pk=1)
     return {'farm_settings': farm_settings}
 
+def _date_range(params):
+    """Optional ``start``/``end`` (YYYY-MM-DD) query parameters as dates.
+    Raises ValueError if either is malformed."""
+    return tuple(
+        datetime.strptime(params[name], '%Y-%m-%d').date() if params.get(name) else None
+        for name in ('start', 'end')
+    )
+
 def get_weather_data(lat, lon):
+    """Current weather for a location, through the cache in farm/weather.py."""
     if not lat or not lon or (lat == 0.0 and lon == 0.0):
         return None
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "current": "temperature_2m,relative_humidity_2m,weather_code",
-        "wind_speed_unit": "ms"
-    }
-    try:
-        r = requests.get(url, params=params, timeout=5)
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        print(f"Weather Error: {e}")
-        return None
+    return weather.current(lat, lon)
 
 # --- DASHBOARDS ---
+@fragments.supports_fragments
 def index(request):
     context = get_common_context()
     farm_settings = context['farm_settings']
 
     goats = Goat.objects.filter(is_external=False)
-    grazing_areas = GrazingArea.objects.all()
-    vets = Vet.objects.all()
     today = timezone.now().date()
     
-    # Alerts Logic
-    low_stock_items = FeedItem.objects.filter(quantity__lte=F('low_stock_threshold'))
-    two_weeks = today + timedelta(days=14)
-    medical_alerts = MedicalRecord.objects.filter(
-        next_due_date__isnull=False,
-        next_due_date__lte=two_weeks
-    ).select_related('goat').order_by('next_due_date')
-    three_weeks = today + timedelta(days=21)
-    kidding_alerts = BreedingLog.objects.filter(
-        due_date__isnull=False,
-        due_date__gte=today,
-        due_date__lte=three_weeks
-    ).select_related('goat').order_by('due_date')
-    expired_meds = Medicine.objects.filter(expiration_date__lte=today)
-    
-    has_alerts = low_stock_items.exists() or medical_alerts.exists() or kidding_alerts.exists() or expired_meds.exists()
-
-    all_tasks = DailyTask.objects.all()
-    completed_task_ids = set(
-        TaskCompletion.objects.filter(date=today, completed=True)
-        .values_list('task_id', flat=True)
-    )
-    
-    areas_list = []
-    for area in grazing_areas:
-        try:
-            active = area.active_assignment
-            goat_names = []
-            goat_count = 0
-            if active:
-                assigned_goats = active.goats.all()
-                goat_count = assigned_goats.count()
-                goat_names = [g.name for g in assigned_goats]
-            latest_cond = area.latest_condition
-            areas_list.append({
-                'id': area.id,
-                'name': area.name,
-                'color': area.color,
-                'coords': json.loads(area.coordinates),
-                'goat_count': goat_count,
-                'goat_names': goat_names,
-                'days_resting': area.days_resting,
-                'condition_score': latest_cond.score if latest_cond else None,
-            })
-        except (json.JSONDecodeError, TypeError):
-            pass
+    # Alerts (materialized, kept current by farm/signals.py)
+    alerts.ensure_current(farm_settings)
 
-    # Map markers
-    markers_list = list(MapMarker.objects.all().values('id', 'name', 'marker_type', 'latitude', 'longitude', 'notes'))
+    def chores_context():
+        all_tasks = DailyTask.objects.all()
+        return {
+            'am_tasks': all_tasks.filter(time_of_day='AM'),
+            'pm_tasks': all_tasks.filter(time_of_day='PM'),
+            'any_tasks': all_tasks.filter(time_of_day='ANY'),
+            'completed_task_ids': set(
+                TaskCompletion.objects.filter(date=today, completed=True)
+                .values_list('task_id', flat=True)
+            ),
+        }
 
-    # Active pasture assignments
-    active_assignments = PastureAssignment.objects.filter(
-        Q(end_date__isnull=True) | Q(end_date__gt=today)
-    ).select_related('grazing_area').prefetch_related('goats')
+    def alerts_context():
+        alert_groups = alerts.grouped()
+        return {'alerts': alert_groups, 'has_alerts': any(alert_groups.values())}
 
-    # Medical schedule alerts
-    schedule_alerts = [s for s in MedicalSchedule.objects.select_related('goat').all() if s.is_due_soon]
+    def rotation_context():
+        return {
+            'all_grazing_areas': GrazingArea.objects.all(),
+            'goats': goats,
+            'active_assignments': pasture.active_assignments(today),
+        }
 
-    # FAMACHA alerts: goats with score >= 4 (needs deworming)
-    famacha_alerts = []
-    for goat in goats:
-        latest_score = goat.health_scores.first()
-        if latest_score and latest_score.famacha_score and latest_score.famacha_score >= 4:
-            famacha_alerts.append({'goat': goat, 'score': latest_score.famacha_score, 'date': latest_score.date})
-
-    # Heat alerts: does predicted in heat within 3 days
-    three_days = today + timedelta(days=3)
-    heat_alerts = []
-    for goat in goats.filter(gender__in=['Doe', 'Doeling']):
-        latest_heat = goat.heat_observations.first()
-        if latest_heat and latest_heat.next_heat_date >= today and latest_heat.next_heat_date <= three_days:
-            heat_alerts.append({'goat': goat, 'predicted_date': latest_heat.next_heat_date})
-
-    # Pen over-capacity alerts
-    overcrowded_pens = [p for p in Pen.objects.all() if p.is_over_capacity]
-
-    has_alerts = has_alerts or len(schedule_alerts) > 0 or len(famacha_alerts) > 0 or len(heat_alerts) > 0 or len(overcrowded_pens) > 0
-
-    # Rotation timeline (last 90 days)
-    ninety_days_ago = today - timedelta(days=90)
-    rotation_history = PastureAssignment.objects.filter(
-        Q(start_date__gte=ninety_days_ago) | Q(end_date__gte=ninety_days_ago) | Q(end_date__isnull=True)
-    ).select_related('grazing_area').prefetch_related('goats').order_by('start_date')
-    rotation_timeline = []
-    for a in rotation_history:
-        rotation_timeline.append({
-            'area_name': a.grazing_area.name,
-            'color': a.grazing_area.color,
-            'start_date': a.start_date.isoformat(),
-            'end_date': a.end_date.isoformat() if a.end_date else None,
-            'goats': [g.name for g in a.goats.all()],
-        })
+    @functools.cache
+    def herd_page():
+        # First page of the grid; later pages come from /api/goats/ on scroll
+        return fragments.cached('herd', 'first_page', lambda: roster.payload(goats, today=today), today)
+
+    # Sections are cached per version (see farm/fragments.py); the querysets
+    # above only run when a section has changed since it was last rendered.
+    # Each one can also be fetched on its own with the X-Fragments header.
+    sections = {
+        'herd': lambda: json_script(herd_page(), 'herd-page'),
+        'alerts': lambda: fragments.render(request, 'alerts', 'farm/fragments/alerts.html',
+                                           alerts_context),
+        'chores': lambda: fragments.render(request, 'chores', 'farm/fragments/chores.html',
+                                           chores_context, today),
+        'rotation': lambda: fragments.render(request, 'rotation', 'farm/fragments/rotation_panel.html',
+                                             rotation_context, today),
+        'vets': lambda: render_to_string('farm/fragments/vets.html', {'vets': Vet.objects.all()},
+                                         request=request),
+    }
+    if fragments.requested(request):
+        return fragments.partial_response(request, sections)
 
+    map_data = fragments.cached('map', 'data', lambda: _map_data(today), today)
     context.update({
-        'goats': goats,
-        'grazing_areas': areas_list,
-        'map_markers': markers_list,
-        'active_assignments': active_assignments,
-        'all_grazing_areas': grazing_areas,
-        'am_tasks': all_tasks.filter(time_of_day='AM'),
-        'pm_tasks': all_tasks.filter(time_of_day='PM'),
-        'any_tasks': all_tasks.filter(time_of_day='ANY'),
-        'completed_task_ids': completed_task_ids,
-        'has_tasks': all_tasks.exists(),
-        'vets': vets,
-        'low_stock_items': low_stock_items,
-        'medical_alerts': medical_alerts,
-        'kidding_alerts': kidding_alerts,
-        'expired_meds': expired_meds,
-        'schedule_alerts': schedule_alerts,
-        'famacha_alerts': famacha_alerts,
-        'heat_alerts': heat_alerts,
-        'overcrowded_pens': overcrowded_pens,
-        'has_alerts': has_alerts,
-        'rotation_timeline_data': rotation_timeline,
+        'herd_page': herd_page(),
+        'fragments': {name: build() for name, build in sections.items()},
+        'grazing_areas': map_data['areas'],
+        'map_markers': map_data['markers'],
     })
     return render(request, 'farm/index.html', context)
 
+
+def api_goats(request):
+    """Cursor-paginated herd roster for the dashboard grid.
+
+    Filters: ``status``, ``breed``, ``gender``, ``q`` (name prefix).
+    Sort: ``sort=name|age|-age``. Pass ``cursor`` from the previous page's
+    ``next_cursor`` to continue.
+    """
+    sort = request.GET.get('sort', 'name')
+    if sort not in roster.SORTS:
+        return JsonResponse({'status': 'error', 'message': f'Unknown sort: {sort}'}, status=400)
+    try:
+        limit = int(request.GET.get('limit', roster.PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit must be an integer'}, status=400)
+    limit = max(1, min(limit, roster.MAX_PAGE_SIZE))
+
+    goats = roster.filtered(Goat.objects.filter(is_external=False), request.GET)
+    try:
+        data = roster.payload(goats, sort, request.GET.get('cursor'), limit)
+    except roster.InvalidCursor as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse(data)
+
+
+def api_weather(request):
+    """Current weather at the farm location for the dashboard card.
+
+    Served from a short-lived server-side cache; ``stale`` is true when the
+    upstream API is failing and the last good answer is being returned.
+    """
+    farm_settings = get_common_context()['farm_settings']
+    lat, lon = farm_settings.latitude, farm_settings.longitude
+    if not lat and not lon:
+        lat, lon = weather.DEFAULT_LOCATION
+    result = get_weather_data(lat, lon)
+    if result is None:
+        return JsonResponse({'status': 'error', 'message': 'Weather unavailable'}, status=503)
+    data = result['data']
+    return JsonResponse({
+        'current': data.get('current', {}),
+        'units': data.get('current_units', {}),
+        'fetched_at': datetime.fromtimestamp(result['fetched_at'], tz=dt_timezone.utc).isoformat(),
+        'stale': result['stale'],
+    })
+
+
+def _map_data(today):
+    _, areas_list = pasture.snapshot(today)
+    markers_list = list(MapMarker.objects.all().values('id', 'name', 'marker_type', 'latitude', 'longitude', 'notes'))
+    return {'areas': areas_list, 'markers': markers_list}
+
+
+def fragment_cache_stats(request):
+    """Hit/miss counters of the dashboard fragment cache (this worker only)."""
+    return JsonResponse({
+        'backend': django_settings.CACHES['default']['BACKEND'],
+        'pid': os.getpid(),
+        'sections': fragments.stats(),
+    })
+
 def update_settings(request):
     if request.method == 'POST':
         settings, _ = FarmSettings.objects.get_or_create(pk=1)
@@ -334,95 +334,24 @@ def calendar_dashboard(request):
         messages.success(request, 'Event added to calendar.')
         return redirect('calendar_dashboard')
 
-    events = []
-    
-    # System Events (Read Only)
-    for log in BreedingLog.objects.filter(due_date__isnull=False):
-        events.append({
-            'title': f"👶 Due: {log.goat.name}",
-            'start': log.due_date.isoformat(),
-            'color': '#9C27B0', 
-            'url': f"/goat/{log.goat.id}/",
-            'editable': False 
-        })
-    
-    for record in MedicalRecord.objects.filter(next_due_date__isnull=False):
-        events.append({
-            'title': f"🏥 {record.get_record_type_display()}: {record.goat.name}",
-            'start': record.next_due_date.isoformat(),
-            'color': '#e91e63', 
-            'url': f"/goat/{record.goat.id}/",
-            'editable': False
-        })
-        
-    # Medical Schedule Events (Recurring)
-    for schedule in MedicalSchedule.objects.select_related('goat').all():
-        target = schedule.goat.name if schedule.goat else "Herd"
-        events.append({
-            'title': f"🔁 {schedule.get_record_type_display()}: {target}",
-            'start': schedule.next_due.isoformat(),
-            'color': '#FF5722',
-            'editable': False,
-            'url': f"/goat/{schedule.goat.id}/" if schedule.goat else '',
-        })
-
-    # Heat / Estrus Events (predicted cycles)
-    for obs in HeatObservation.objects.select_related('goat').all():
-        # Show the observed heat
-        events.append({
-            'title': f"🔥 Heat: {obs.goat.name}",
-            'start': obs.date_observed.isoformat(),
-            'color': '#E91E63',
-            'url': f"/goat/{obs.goat.id}/",
-            'editable': False,
-        })
-        # Show predicted next heat
-        next_heat = obs.next_heat_date
-        if next_heat >= timezone.localdate() - timedelta(days=7):
-            events.append({
-                'title': f"🔮 Predicted Heat: {obs.goat.name}",
-                'start': next_heat.isoformat(),
-                'color': '#FF80AB',
-                'url': f"/goat/{obs.goat.id}/",
-                'editable': False,
-            })
+    # Events are fetched per visible range from /api/calendar/events/
+    context = get_common_context()
+    return render(request, 'farm/calendar.html', context)
 
-    # Kidding records (past births)
-    for kr in KiddingRecord.objects.select_related('dam').all():
-        events.append({
-            'title': f"🐣 Kidding: {kr.dam.name} ({kr.birth_type})",
-            'start': kr.kidding_date.isoformat(),
-            'color': '#4CAF50',
-            'url': f"/goat/{kr.dam.id}/",
-            'editable': False,
-        })
 
-    # Custom Events (Editable)
-    for event in FarmEvent.objects.all():
-        event_data = {
-            'id': event.id,
-            'title': f"{event.title}",
-            'start': event.date.isoformat(),
-            'extendedProps': { 'type': 'custom', 'category': event.category }
-        }
-        
-        cat = event.category
-        if cat == 'Vet': event_data['color'] = '#f44336'
-        elif cat == 'Show': event_data['color'] = '#FF9800'
-        elif cat == 'Breeding': event_data['color'] = '#9C27B0'
-        elif cat == 'Maintenance': event_data['color'] = '#607D8B'
-        elif cat == 'Purchase': event_data['color'] = '#4CAF50'
-        else: event_data['color'] = '#2196F3'
-
-        if event.end_date:
-            end_d = event.end_date + timedelta(days=1)
-            event_data['end'] = end_d.isoformat()
-            
-        events.append(event_data)
+def api_calendar_events(request):
+    """Calendar events between ``start`` (inclusive) and ``end`` (exclusive).
 
-    context = get_common_context()
-    context.update({'events_json': json.dumps(events)})
-    return render(request, 'farm/calendar.html', context)
+    FullCalendar sends ISO timestamps; only the date part is used.
+    """
+    try:
+        start = datetime.strptime(request.GET.get('start', '')[:10], '%Y-%m-%d').date()
+        end = datetime.strptime(request.GET.get('end', '')[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'start and end must be dates'}, status=400)
+    if not start < end or (end - start).days > calendar_feed.MAX_RANGE_DAYS:
+        return JsonResponse({'status': 'error', 'message': 'Invalid date range'}, status=400)
+    return JsonResponse(calendar_feed.events(start, end), safe=False)
 
 def medicine_dashboard(request):
     if request.method == 'POST':
@@ -440,10 +369,10 @@ def medicine_dashboard(request):
         return redirect('medicine_dashboard')
     
     meds = Medicine.objects.all().order_by('expiration_date')
-    schedules = MedicalSchedule.objects.select_related('goat').all()
+    upcoming = schedules.with_next_due(MedicalSchedule.objects.select_related('goat')).order_by('next_due_on')
     goats = Goat.objects.filter(is_external=False)
     context = get_common_context()
-    context.update({'meds': meds, 'schedules': schedules, 'goats': goats})
+    context.update({'meds': meds, 'schedules': upcoming, 'goats': goats})
     return render(request, 'farm/medicine.html', context)
 
 # --- NEW: CRM DASHBOARD ---
@@ -513,6 +442,33 @@ def tools_dashboard(request):
     context.update({'goats': goats})
     return render(request, 'farm/tools.html', context)
 
+def perf_dashboard(request):
+    """Per-view query counts and timings collected by PerfMiddleware."""
+    context = get_common_context()
+    context.update({
+        'views': perf.summary(),
+        'enabled': django_settings.PERF_MONITOR,
+        'window': django_settings.PERF_WINDOW,
+    })
+    return render(request, 'farm/perf.html', context)
+
+
+def api_perf_stats(request):
+    return JsonResponse({
+        'enabled': django_settings.PERF_MONITOR,
+        'window': django_settings.PERF_WINDOW,
+        'pid': os.getpid(),
+        'views': perf.summary(),
+    })
+
+
+@require_POST
+def perf_reset(request):
+    perf.reset()
+    messages.success(request, 'Performance samples cleared.')
+    return redirect('perf_dashboard')
+
+
 # --- API ENDPOINTS ---
 @require_POST
 def move_event(request):
@@ -742,7 +698,7 @@ def goat_detail(request, goat_id):
         'weight_chart_data': json.dumps(weight_chart_data),
         'milk_chart_data': json.dumps(milk_chart_data),
         'latest_weight': latest_weight,
-        'medicines_json': json.dumps(list(medicines)),
+        'medicines_json': json.dumps(list(medicines), default=float),
         'gallery_photos': gallery_photos,
         'offspring': offspring,
         'health_scores': health_scores,
@@ -943,6 +899,12 @@ def pin_logout(request):
     return redirect('pin_login')
 
 
+# --- MEDIA ---
+def serve_media(request, path):
+    """Uploaded photos and documents, behind the PIN gate (see farm/media.py)."""
+    return media.response(request, path)
+
+
 # --- ADD GOAT ---
 def add_goat(request):
     from .forms import GoatForm
@@ -960,54 +922,78 @@ def add_goat(request):
 
 
 # --- CSV EXPORTS ---
+# Streamed in chunks (farm/exports.py). All accept ``goat`` (id) and
+# ``gzip=1``; the dated ones also accept ``start``/``end`` (YYYY-MM-DD).
+def _export_params(request):
+    """Validated export filters, or a 400 response if they're malformed."""
+    try:
+        start, end = _date_range(request.GET)
+        goat = int(request.GET['goat']) if request.GET.get('goat') else None
+    except ValueError:
+        return None, JsonResponse(
+            {'status': 'error', 'message': 'Use YYYY-MM-DD dates and a numeric goat id'}, status=400)
+    gzip = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+    return {'start': start, 'end': end, 'goat': goat, 'gzip': gzip}, None
+
+
 def export_goats_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="goats_export.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Breed', 'Gender', 'Status', 'Birthdate', 'Age', 'Is Fainting', 'Dam', 'Sire', 'Registration #', 'External', 'External Owner', 'Bio'])
-    for goat in Goat.objects.select_related('dam', 'sire').all():
-        writer.writerow([
-            goat.name, goat.breed, goat.gender,
-            goat.status, goat.birthdate, goat.display_age,
-            goat.is_fainting,
-            goat.dam.name if goat.dam else '',
-            goat.sire.name if goat.sire else '',
-            goat.registration_number,
-            goat.is_external,
-            goat.external_owner,
-            goat.bio
-        ])
-    return response
+    params, error = _export_params(request)
+    if error:
+        return error
+    goats = exports.filtered(Goat.objects.all(), params, goat_field='pk')
+    rows = (
+        (name, breed, gender, status, birthdate, age_label(birthdate, age), is_fainting,
+         dam or '', sire or '', registration_number, is_external, external_owner, bio)
+        for (name, breed, gender, status, birthdate, age, is_fainting, dam, sire,
+             registration_number, is_external, external_owner, bio)
+        in exports.rows(goats, 'name', 'breed', 'gender', 'status', 'birthdate', 'age',
+                        'is_fainting', 'dam__name', 'sire__name', 'registration_number',
+                        'is_external', 'external_owner', 'bio')
+    )
+    return exports.stream_csv(
+        'goats_export.csv',
+        ['Name', 'Breed', 'Gender', 'Status', 'Birthdate', 'Age', 'Is Fainting', 'Dam', 'Sire', 'Registration #', 'External', 'External Owner', 'Bio'],
+        rows, gzip=params['gzip'],
+    )
 
 
 def export_finances_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="finances_export.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Type', 'Category', 'Amount', 'Description'])
-    for t in Transaction.objects.all():
-        writer.writerow([t.date, t.type, t.category, t.amount, t.description])
-    return response
+    params, error = _export_params(request)
+    if error:
+        return error
+    transactions = exports.filtered(Transaction.objects.all(), params, 'date', 'goat_id')
+    return exports.stream_csv(
+        'finances_export.csv',
+        ['Date', 'Type', 'Category', 'Amount', 'Description'],
+        exports.rows(transactions, 'date', 'type', 'category', 'amount', 'description'),
+        gzip=params['gzip'],
+    )
 
 
 def export_milk_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="milk_export.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Time', 'Goat', 'Amount (lbs)', 'Notes'])
-    for log in MilkLog.objects.select_related('goat').all():
-        writer.writerow([log.date, log.time, log.goat.name, log.amount, log.notes])
-    return response
+    params, error = _export_params(request)
+    if error:
+        return error
+    logs = exports.filtered(MilkLog.objects.all(), params, 'date', 'goat_id')
+    return exports.stream_csv(
+        'milk_export.csv',
+        ['Date', 'Time', 'Goat', 'Amount (lbs)', 'Notes'],
+        exports.rows(logs, 'date', 'time', 'goat__name', 'amount', 'notes'),
+        gzip=params['gzip'],
+    )
 
 
 def export_medical_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="medical_export.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Goat', 'Type', 'Notes', 'Next Due Date'])
-    for r in MedicalRecord.objects.select_related('goat').all():
-        writer.writerow([r.date, r.goat.name, r.record_type, r.notes, r.next_due_date])
-    return response
+    params, error = _export_params(request)
+    if error:
+        return error
+    records = exports.filtered(MedicalRecord.objects.all(), params, 'date', 'goat_id')
+    return exports.stream_csv(
+        'medical_export.csv',
+        ['Date', 'Goat', 'Type', 'Notes', 'Next Due Date'],
+        exports.rows(records, 'date', 'goat__name', 'record_type', 'notes', 'next_due_date'),
+        gzip=params['gzip'],
+    )
 
 
 # --- VET CRUD ---
@@ -1246,8 +1232,8 @@ def end_pasture_assignment(request, assignment_id):
 
 
 def api_rotation_history(request, area_id):
-    area = get_object_or_404(GrazingArea, pk=area_id)
-    assignments = area.assignments.all()[:20]
+    area = get_object_or_404(pasture.annotate_pasture_state(GrazingArea.objects.all()), pk=area_id)
+    assignments = area.assignments.prefetch_related('goats')[:20]
     history = []
     for a in assignments:
         history.append({
@@ -1258,7 +1244,7 @@ def api_rotation_history(request, area_id):
             'goats': [g.name for g in a.goats.all()],
             'notes': a.notes,
         })
-    return JsonResponse({'history': history, 'days_resting': area.days_resting})
+    return JsonResponse({'history': history, 'days_resting': pasture.days_resting(area)})
 
 
 # Feature 3: Map Markers
@@ -1359,52 +1345,16 @@ def map_dashboard(request):
     context = get_common_context()
     today = timezone.now().date()
     goats = Goat.objects.filter(is_external=False)
-    grazing_areas = GrazingArea.objects.all()
-
-    areas_list = []
-    for area in grazing_areas:
-        try:
-            active = area.active_assignment
-            goat_names, goat_count = [], 0
-            if active:
-                assigned_goats = active.goats.all()
-                goat_count = assigned_goats.count()
-                goat_names = [g.name for g in assigned_goats]
-            latest_cond = area.latest_condition
-            areas_list.append({
-                'id': area.id, 'name': area.name, 'color': area.color,
-                'coords': json.loads(area.coordinates),
-                'goat_count': goat_count, 'goat_names': goat_names,
-                'days_resting': area.days_resting,
-                'condition_score': latest_cond.score if latest_cond else None,
-            })
-        except (json.JSONDecodeError, TypeError):
-            pass
-
-    markers_list = list(MapMarker.objects.all().values('id', 'name', 'marker_type', 'latitude', 'longitude', 'notes'))
-    active_assignments = PastureAssignment.objects.filter(
-        Q(end_date__isnull=True) | Q(end_date__gt=today)
-    ).select_related('grazing_area').prefetch_related('goats')
-
-    ninety_days_ago = today - timedelta(days=90)
-    rotation_history = PastureAssignment.objects.filter(
-        Q(start_date__gte=ninety_days_ago) | Q(end_date__gte=ninety_days_ago) | Q(end_date__isnull=True)
-    ).select_related('grazing_area').prefetch_related('goats').order_by('start_date')
-    rotation_timeline = []
-    for a in rotation_history:
-        rotation_timeline.append({
-            'area_name': a.grazing_area.name, 'color': a.grazing_area.color,
-            'start_date': a.start_date.isoformat(),
-            'end_date': a.end_date.isoformat() if a.end_date else None,
-            'goats': [g.name for g in a.goats.all()],
-        })
+    map_data = fragments.cached('map', 'data', lambda: _map_data(today), today)
+    active_assignments = pasture.active_assignments(today)
+    rotation_timeline = fragments.cached('rotation', 'timeline', lambda: pasture.rotation_timeline(today), today)
 
     context.update({
         'goats': goats,
-        'grazing_areas': areas_list,
-        'map_markers': markers_list,
+        'grazing_areas': map_data['areas'],
+        'map_markers': map_data['markers'],
         'active_assignments': active_assignments,
-        'all_grazing_areas': grazing_areas,
+        'all_grazing_areas': GrazingArea.objects.all(),
         'rotation_timeline_data': rotation_timeline,
     })
     return render(request, 'farm/map.html', context)
@@ -1412,7 +1362,7 @@ def map_dashboard(request):
 
 def export_grazing_areas_kml(request):
     """Export all grazing areas as KML for Google Earth / GIS tools."""
-    areas = GrazingArea.objects.all()
+    areas = pasture.annotate_pasture_state(GrazingArea.objects.all())
     kml_placemarks = []
     for area in areas:
         try:
@@ -1422,8 +1372,7 @@ def export_grazing_areas_kml(request):
         coord_str = ' '.join(f"{c['lng']},{c['lat']},0" for c in coords)
         if coords:
             coord_str += f" {coords[0]['lng']},{coords[0]['lat']},0"
-        latest_cond = area.latest_condition
-        cond_text = f"Condition: {latest_cond.score}/5" if latest_cond else "No condition data"
+        cond_text = f"Condition: {area.condition_score}/5" if area.condition_score is not None else "No condition data"
         hex_color = area.color.lstrip('#')
         if len(hex_color) == 6:
             r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
@@ -1512,7 +1461,7 @@ def analytics_dashboard(request):
         'gender_data': json.dumps(gender_data),
         'status_data': json.dumps(status_data),
         'age_buckets': json.dumps(age_buckets),
-        'milk_monthly': json.dumps(list(milk_monthly)),
+        'milk_monthly': json.dumps(list(milk_monthly), default=float),
         'total_breedings': total_breedings,
         'successful_dams': successful_dams,
     })
@@ -1550,16 +1499,9 @@ def delete_medical_schedule(request, schedule_id):
 # =====================================================
 
 def backup_database(request):
-    db_path = django_settings.DATABASES['default']['NAME']
-    if not os.path.exists(str(db_path)):
-        messages.error(request, 'Database file not found.')
-        return redirect('tools_dashboard')
-
-    response = HttpResponse(content_type='application/x-sqlite3')
-    response['Content-Disposition'] = 'attachment; filename="goatos_backup.sqlite3"'
-    with open(str(db_path), 'rb') as f:
-        response.write(f.read())
-    return response
+    # A consistent copy via SQLite's backup API, streamed from a temp file
+    compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+    return backups.download(compress=compress)
 
 
 def backup_media(request):
@@ -1568,37 +1510,37 @@ def backup_media(request):
         messages.error(request, 'Media directory not found.')
         return redirect('tools_dashboard')
 
-    response = HttpResponse(content_type='application/zip')
-    response['Content-Disposition'] = 'attachment; filename="goatos_media_backup.zip"'
-
-    with zipfile.ZipFile(response, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for root, dirs, files in os.walk(media_root):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, media_root)
-                zf.write(file_path, arcname)
-    return response
+    # POST with an earlier backup's manifest.json: only files changed since
+    base = None
+    if request.method == 'POST':
+        if not request.FILES.get('manifest'):
+            messages.error(request, 'No manifest uploaded.')
+            return redirect('tools_dashboard')
+        try:
+            base = archives.read_manifest(request.FILES['manifest'])
+        except archives.InvalidArchive as e:
+            messages.error(request, str(e))
+            return redirect('tools_dashboard')
+    return archives.download(media_root, base)
 
 
 def restore_database(request):
     if request.method == 'POST' and request.FILES.get('db_file'):
-        uploaded = request.FILES['db_file']
-
-        # Basic validation: check it's a valid SQLite file
-        header = uploaded.read(16)
-        uploaded.seek(0)
-        if header[:16] != b'SQLite format 3\x00':
-            messages.error(request, 'Invalid file. Must be a valid SQLite database.')
+        # Checked and loaded into the live database; workers pick it up on
+        # their next request (see backups.restore and RestoreMiddleware)
+        fd, path = tempfile.mkstemp(prefix='goatos-restore-', suffix='.sqlite3')
+        os.close(fd)
+        try:
+            backups.unpack(request.FILES['db_file'], path)
+            previous = backups.restore(path)
+        except backups.InvalidBackup as e:
+            messages.error(request, str(e))
             return redirect('tools_dashboard')
+        finally:
+            os.remove(path)
 
-        db_path = str(django_settings.DATABASES['default']['NAME'])
-
-        # Write the uploaded file
-        with open(db_path, 'wb') as f:
-            for chunk in uploaded.chunks():
-                f.write(chunk)
-
-        messages.success(request, 'Database restored. Please restart the server for changes to take full effect.')
+        messages.success(request, f'Database restored. The previous database was saved as '
+                                  f'{os.path.basename(previous)}.')
         return redirect('tools_dashboard')
 
     messages.error(request, 'No file uploaded.')
@@ -1743,18 +1685,9 @@ def delete_health_score(request, score_id):
 def health_scores_dashboard(request):
     """Herd-wide FAMACHA & BCS overview"""
     goats = Goat.objects.filter(status='Healthy', is_external=False).order_by('name')
-    scores_data = []
-    for goat in goats:
-        latest = goat.health_scores.first()
-        scores_data.append({
-            'goat': goat,
-            'latest_famacha': latest.famacha_score if latest else None,
-            'latest_bcs': latest.body_condition_score if latest else None,
-            'latest_date': latest.date if latest else None,
-        })
 
     context = get_common_context()
-    context.update({'scores_data': scores_data})
+    context.update({'goats': goats})
     return render(request, 'farm/health_scores.html', context)
 
 
@@ -1789,153 +1722,77 @@ def delete_heat_observation(request, observation_id):
 # FEATURE 5: ACTIVITY FEED / FARM TIMELINE
 # =====================================================
 
+def _activity_page(request):
+    try:
+        limit = int(request.GET.get('limit', activity.PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    limit = max(1, min(limit, activity.MAX_PAGE_SIZE))
+    events = activity.filtered(ActivityEvent.objects.all(), request.GET)
+    return activity.page(events, request.GET.get('cursor'), limit)
+
+
 def activity_feed(request):
     """Unified chronological feed of ALL farm activity"""
-    limit = int(request.GET.get('limit', 100))
     filter_type = request.GET.get('type', 'all')
-
-    activities = []
-
-    def add_activities(queryset, activity_type, icon, color, label_fn, detail_fn, goat_fn, date_fn):
-        for obj in queryset:
-            goat_val = goat_fn(obj)
-            activities.append({
-                'type': activity_type,
-                'icon': icon,
-                'color': color,
-                'label': label_fn(obj),
-                'detail': detail_fn(obj),
-                'goat': goat_val,
-                'goat_is_herd': isinstance(goat_val, str),
-                'date': date_fn(obj),
-                'obj': obj,
-            })
-
-    type_filters = filter_type.split(',') if filter_type != 'all' else None
-
-    if not type_filters or 'medical' in type_filters:
-        add_activities(
-            MedicalRecord.objects.select_related('goat').order_by('-date')[:limit],
-            'medical', '🏥', '#e91e63',
-            lambda o: o.get_record_type_display(),
-            lambda o: o.notes[:100] if o.notes else '',
-            lambda o: o.goat, lambda o: o.date)
-
-    if not type_filters or 'milk' in type_filters:
-        add_activities(
-            MilkLog.objects.select_related('goat').order_by('-date')[:limit],
-            'milk', '🥛', '#2196f3',
-            lambda o: f'{o.amount} lbs ({o.time})',
-            lambda o: o.notes[:100] if o.notes else '',
-            lambda o: o.goat, lambda o: o.date)
-
-    if not type_filters or 'breeding' in type_filters:
-        add_activities(
-            BreedingLog.objects.select_related('goat').order_by('-breeding_date')[:limit],
-            'breeding', '🧬', '#9c27b0',
-            lambda o: f'Bred with {o.mate_name}',
-            lambda o: f'Due: {o.due_date}' if o.due_date else '',
-            lambda o: o.goat, lambda o: o.breeding_date)
-
-    if not type_filters or 'weight' in type_filters:
-        add_activities(
-            WeightLog.objects.select_related('goat').order_by('-date')[:limit],
-            'weight', '⚖️', '#009688',
-            lambda o: f'{o.weight} lbs',
-            lambda o: o.notes[:100] if o.notes else '',
-            lambda o: o.goat, lambda o: o.date)
-
-    if not type_filters or 'feeding' in type_filters:
-        def feeding_label(o):
-            label = f'{o.feed_type} - {o.amount}'
-            if o.time_of_day:
-                label += f' ({o.time_of_day}'
-                if o.feeding_time:
-                    label += f' @ {o.feeding_time.strftime("%I:%M %p").lstrip("0")}'
-                label += ')'
-            return label
-        add_activities(
-            FeedingLog.objects.select_related('goat').order_by('-date')[:limit],
-            'feeding', '🌾', '#ff9800',
-            feeding_label,
-            lambda o: o.notes[:100] if o.notes else '',
-            lambda o: o.goat if o.goat else 'All Goats', lambda o: o.date)
-
-    if not type_filters or 'kidding' in type_filters:
-        add_activities(
-            KiddingRecord.objects.select_related('dam').order_by('-kidding_date')[:limit],
-            'kidding', '🐣', '#4caf50',
-            lambda o: f'{o.birth_type} - {o.num_alive} alive',
-            lambda o: o.notes[:100] if o.notes else '',
-            lambda o: o.dam, lambda o: o.kidding_date)
-
-    if not type_filters or 'health' in type_filters:
-        add_activities(
-            HealthScore.objects.select_related('goat').order_by('-date')[:limit],
-            'health', '🩺', '#ff5722',
-            lambda o: f'FAMACHA:{o.famacha_score or "-"} BCS:{o.body_condition_score or "-"}',
-            lambda o: o.notes[:100] if o.notes else '',
-            lambda o: o.goat, lambda o: o.date)
-
-    if not type_filters or 'heat' in type_filters:
-        add_activities(
-            HeatObservation.objects.select_related('goat').order_by('-date_observed')[:limit],
-            'heat', '🔥', '#e91e63',
-            lambda o: f'Heat observed - {o.signs or "no signs noted"}',
-            lambda o: o.notes[:100] if o.notes else '',
-            lambda o: o.goat, lambda o: o.date_observed)
-
-    if not type_filters or 'finance' in type_filters:
-        add_activities(
-            Transaction.objects.order_by('-date')[:limit],
-            'finance', '💰', '#795548',
-            lambda o: f'{o.type}: ${o.amount} ({o.category})',
-            lambda o: o.description[:100] if o.description else '',
-            lambda o: o.goat, lambda o: o.date)
-
-    # Sort all activities by date descending
-    activities.sort(key=lambda a: a['date'] if a['date'] else date.min, reverse=True)
-    activities = activities[:limit]
+    try:
+        events, next_cursor = _activity_page(request)
+    except ValueError as e:  # includes activity.InvalidCursor
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
     context = get_common_context()
     context.update({
-        'activities': activities,
+        'activities': [activity.serialize(e) for e in events],
+        'next_cursor': next_cursor,
         'filter_type': filter_type,
-        'limit': limit,
+        'filter_goat': request.GET.get('goat', ''),
     })
     return render(request, 'farm/activity.html', context)
 
 
+def api_activity(request):
+    """Keyset-paginated activity feed. Filters: ``type`` (comma-separated),
+    ``goat``. Pass ``cursor`` from the previous page's ``next_cursor``."""
+    try:
+        events, next_cursor = _activity_page(request)
+    except ValueError as e:  # includes activity.InvalidCursor
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'results': [activity.serialize(e) for e in events], 'next_cursor': next_cursor})
+
+
 # =====================================================
 # FEATURE 6: COST-PER-GOAT ANALYSIS
 # =====================================================
 
 def cost_analysis(request):
-    goats = Goat.objects.filter(is_external=False)
-    analysis = []
-
-    for goat in goats:
-        expenses = goat.transactions.filter(type='Expense').aggregate(total=Sum('amount'))['total'] or 0
-        income = goat.transactions.filter(type='Income').aggregate(total=Sum('amount'))['total'] or 0
-        # Also count sale income
-        sale_income = goat.sales.aggregate(total=Sum('sale_price'))['total'] or 0
-        total_income = float(income) + float(sale_income)
-        total_expenses = float(expenses)
-        net = total_income - total_expenses
-
-        if total_expenses > 0 or total_income > 0:
-            analysis.append({
-                'goat': goat,
-                'expenses': total_expenses,
-                'income': total_income,
-                'net': net,
-                'feed_cost': float(goat.transactions.filter(type='Expense', category='Feed').aggregate(total=Sum('amount'))['total'] or 0),
-                'vet_cost': float(goat.transactions.filter(type='Expense', category='Vet').aggregate(total=Sum('amount'))['total'] or 0),
-                'equip_cost': float(goat.transactions.filter(type='Expense', category='Equipment').aggregate(total=Sum('amount'))['total'] or 0),
-            })
-
-    # Sort by net (most profitable first)
-    analysis.sort(key=lambda a: a['net'], reverse=True)
+    """Per-goat expenses and income. ``start``/``end`` (YYYY-MM-DD) and
+    repeated ``category`` parameters narrow the data; ``format=csv|json``
+    returns the table instead of the page."""
+    try:
+        start, end = _date_range(request.GET)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Dates must be YYYY-MM-DD'}, status=400)
+    valid_categories = dict(Transaction.CATEGORIES)
+    categories = [c for c in request.GET.getlist('category') if c]
+    unknown = [c for c in categories if c not in valid_categories]
+    if unknown:
+        return JsonResponse({'status': 'error', 'message': f'Unknown category: {unknown[0]}'}, status=400)
+
+    analysis = costs.breakdown(start, end, categories)
+
+    output = request.GET.get('format')
+    if output == 'json':
+        return JsonResponse({'results': list(costs.rows(analysis))})
+    if output == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="cost_analysis.csv"'
+        writer = csv.DictWriter(response, fieldnames=costs.FIELDS)
+        writer.writeheader()
+        writer.writerows(costs.rows(analysis))
+        return response
+
+    filter_query = request.GET.copy()
+    filter_query.pop('format', None)
 
     # Herd-wide totals
     total_herd_expenses = sum(a['expenses'] for a in analysis)
@@ -1957,7 +1814,11 @@ def cost_analysis(request):
         'chart_labels': chart_labels,
         'chart_expenses': chart_expenses,
         'chart_income': chart_income,
-        'goats': goats,
+        'categories': Transaction.CATEGORIES,
+        'selected_categories': categories,
+        'start': start,
+        'end': end,
+        'filter_query': filter_query.urlencode(),
     })
     return render(request, 'farm/cost_analysis.html', context)
 
@@ -2211,206 +2072,151 @@ def quick_entry(request):
 
 def pedigree(request):
     """Interactive family tree / pedigree viewer."""
-    goats = Goat.objects.filter(is_external=False).order_by('name')
-    all_goats = Goat.objects.all()  # Include external for lineage
-    selected_id = request.GET.get('goat')
+    graph = pedigree_graph.graph()
     selected_goat = None
     tree_data = None
 
-    if selected_id:
-        selected_goat = get_object_or_404(Goat, pk=selected_id)
-        tree_data = _build_pedigree_tree(selected_goat, depth=3)
-
-    # Build lineage data for the full herd view
-    nodes = []
-    edges = []
-    for goat in all_goats:
-        nodes.append({
-            'id': goat.id,
-            'name': goat.name,
-            'gender': goat.gender,
-            'breed': goat.breed,
-            'is_external': goat.is_external,
-            'status': goat.status,
-            'image': goat.image.url if goat.image else '',
-            'registration': goat.registration_number,
-        })
-        if goat.dam_id:
-            edges.append({'from': goat.dam_id, 'to': goat.id, 'type': 'dam'})
-        if goat.sire_id:
-            edges.append({'from': goat.sire_id, 'to': goat.id, 'type': 'sire'})
+    if request.GET.get('goat'):
+        try:
+            selected_goat = graph[int(request.GET['goat'])]
+        except (KeyError, ValueError):
+            raise Http404("No such goat")
+        tree_data = _pedigree_data(graph, selected_goat.id, depth=3)
+
+    # Herd lineage table; external goats are listed too, for their lineage
+    lineage = [{
+        'goat': node,
+        'dam': graph.get(node.dam_id),
+        'sire': graph.get(node.sire_id),
+        'offspring': len(graph.children.get(node.id, ())),
+    } for node in graph.nodes.values()]
 
     context = get_common_context()
     context.update({
-        'goats': goats,
-        'all_goats': all_goats,
+        'goats': sorted((n for n in graph.nodes.values() if not n.is_external), key=lambda n: n.name),
+        'lineage': lineage,
         'selected_goat': selected_goat,
         'tree_data': json.dumps(tree_data) if tree_data else 'null',
-        'nodes': json.dumps(nodes),
-        'edges': json.dumps(edges),
     })
     return render(request, 'farm/pedigree.html', context)
 
 
-def _build_pedigree_tree(goat, depth=3):
-    """Recursively build pedigree tree data."""
-    if not goat or depth <= 0:
-        return None
-    node = {
-        'id': goat.id,
-        'name': goat.name,
-        'gender': goat.gender,
-        'breed': goat.breed,
-        'is_external': goat.is_external,
-        'registration': goat.registration_number,
-        'image': goat.image.url if goat.image else '',
-        'dam': _build_pedigree_tree(goat.dam, depth - 1),
-        'sire': _build_pedigree_tree(goat.sire, depth - 1),
-    }
-    # Add offspring
-    kids = list(Goat.objects.filter(Q(dam=goat) | Q(sire=goat)).values_list('id', 'name', 'gender'))
-    node['kids'] = [{'id': k[0], 'name': k[1], 'gender': k[2]} for k in kids]
-    return node
+def _pedigree_data(graph, goat_id, depth):
+    """Ancestor tree of a goat, with its siblings and descendant count on the root."""
+    tree = graph.tree(goat_id, depth)
+    tree['siblings'] = [
+        {'id': s.id, 'name': s.name, 'gender': s.gender, 'relation': relation}
+        for s, relation in graph.siblings(goat_id)
+    ]
+    tree['descendant_count'] = len(graph.descendants(goat_id))
+    return tree
 
 
 def pedigree_api(request, goat_id):
-    """API endpoint to get pedigree tree data for a goat."""
-    goat = get_object_or_404(Goat, pk=goat_id)
-    tree_data = _build_pedigree_tree(goat, depth=4)
-    return JsonResponse(tree_data, safe=False)
+    """API endpoint to get pedigree tree data for a goat. ``depth`` sets the
+    generations returned (default 4)."""
+    graph = pedigree_graph.graph()
+    if goat_id not in graph:
+        raise Http404("No such goat")
+    try:
+        depth = int(request.GET.get('depth', 4))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'depth must be an integer'}, status=400)
+    depth = max(1, min(depth, pedigree_graph.MAX_DEPTH))
+    return JsonResponse(_pedigree_data(graph, goat_id, depth), safe=False)
 
 
-# =====================================================
-# FEATURE 12: ALERTS & NOTIFICATIONS PAGE
-# =====================================================
+MATING_PAGE_SIZE = 50
+MAX_MATING_RESULTS = 1000
 
-def alerts_dashboard(request):
-    """Consolidated alerts page with all farm notifications."""
-    today = timezone.localdate()
 
-    # Kidding alerts - does due within 21 days or overdue
-    kidding_alerts = []
-    pregnant_does = BreedingLog.objects.filter(
-        due_date__isnull=False,
-        due_date__gte=today - timedelta(days=14),
-        due_date__lte=today + timedelta(days=21),
-    ).select_related('goat').order_by('due_date')
-    for log in pregnant_does:
-        days_until = (log.due_date - today).days
-        kidding_alerts.append({
-            'goat': log.goat,
-            'due_date': log.due_date,
-            'days_until': days_until,
-            'severity': 'danger' if days_until < 0 else 'warning' if days_until <= 7 else 'info',
-            'message': f'Overdue by {abs(days_until)} days' if days_until < 0 else f'Due today' if days_until == 0 else f'Due in {days_until} days',
-        })
+def _mating_params(request):
+    """``doe`` and ``buck`` ids to narrow the pairings to. Raises ValueError."""
+    ids = []
+    for name in ('doe', 'buck'):
+        value = request.GET.get(name)
+        try:
+            ids.append(int(value) if value else None)
+        except ValueError:
+            raise ValueError(f'{name} must be a goat id')
+    return ids
+
+
+def _mating(kinship, coi, doe_id, buck_id):
+    doe, buck = kinship.graph[doe_id], kinship.graph[buck_id]
+    return {
+        'doe': {'id': doe.id, 'name': doe.name, 'coi': round(kinship.coefficient(doe.id), 4)},
+        'buck': {'id': buck.id, 'name': buck.name, 'is_external': buck.is_external,
+                 'coi': round(kinship.coefficient(buck.id), 4)},
+        'coi': round(coi, 4),
+        'level': inbreeding.level(coi),
+    }
 
-    # Medical alerts - treatments due within 14 days
-    medical_alerts = []
-    due_records = MedicalRecord.objects.filter(
-        next_due_date__isnull=False,
-        next_due_date__lte=today + timedelta(days=14),
-    ).select_related('goat').order_by('next_due_date')
-    for rec in due_records:
-        days_until = (rec.next_due_date - today).days
-        medical_alerts.append({
-            'goat': rec.goat,
-            'record_type': rec.get_record_type_display(),
-            'due_date': rec.next_due_date,
-            'days_until': days_until,
-            'severity': 'danger' if days_until < 0 else 'warning' if days_until <= 3 else 'info',
-            'message': f'Overdue by {abs(days_until)} days' if days_until < 0 else f'Due today' if days_until == 0 else f'Due in {days_until} days',
-        })
 
-    # Schedule alerts
-    schedule_alerts = []
-    for s in MedicalSchedule.objects.select_related('goat').all():
-        if s.is_due_soon:
-            days_until = (s.next_due - today).days
-            schedule_alerts.append({
-                'goat': s.goat,
-                'schedule': s,
-                'record_type': s.get_record_type_display(),
-                'due_date': s.next_due,
-                'days_until': days_until,
-                'severity': 'danger' if days_until < 0 else 'warning' if days_until <= 3 else 'info',
-                'message': f'Overdue by {abs(days_until)} days' if days_until < 0 else f'Due today' if days_until == 0 else f'Due in {days_until} days',
-                'target': s.goat.name if s.goat else 'Entire Herd',
-            })
+def mating_planner(request):
+    """Candidate doe x buck pairings ranked by the kids' expected inbreeding."""
+    kinship = inbreeding.engine()
+    try:
+        doe_id, buck_id = _mating_params(request)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    does, bucks = kinship.candidates()
+    limit = None if doe_id or buck_id else MATING_PAGE_SIZE
+    pairings = kinship.pairings(doe_id, buck_id, limit)
 
-    # FAMACHA alerts - score >= 4
-    famacha_alerts = []
-    for goat in Goat.objects.filter(status='Healthy', is_external=False):
-        latest = goat.health_scores.first()
-        if latest and latest.famacha_score and latest.famacha_score >= 4:
-            famacha_alerts.append({
-                'goat': goat,
-                'score': latest.famacha_score,
-                'date': latest.date,
-                'severity': 'danger' if latest.famacha_score == 5 else 'warning',
-                'message': f'FAMACHA score {latest.famacha_score} - {"Critical anemia" if latest.famacha_score == 5 else "Needs deworming"}',
-            })
+    context = get_common_context()
+    context.update({
+        'does': [(doe, kinship.coefficient(doe.id)) for doe in does],
+        'bucks': [(buck, kinship.coefficient(buck.id)) for buck in bucks],
+        'pairings': [_mating(kinship, *p) for p in pairings],
+        'selected_doe': doe_id,
+        'selected_buck': buck_id,
+        'caution_coi': inbreeding.CAUTION_COI,
+        'high_coi': inbreeding.HIGH_COI,
+    })
+    return render(request, 'farm/matings.html', context)
 
-    # Heat predictions - within 3 days
-    heat_alerts = []
-    three_days = today + timedelta(days=3)
-    for goat in Goat.objects.filter(gender__in=['Doe', 'Doeling'], status='Healthy', is_external=False):
-        latest_heat = goat.heat_observations.first()
-        if latest_heat and today <= latest_heat.next_heat_date <= three_days:
-            heat_alerts.append({
-                'goat': goat,
-                'predicted_date': latest_heat.next_heat_date,
-                'severity': 'info',
-                'message': f'Predicted heat on {latest_heat.next_heat_date.strftime("%b %d")}',
-            })
 
-    # Low feed stock
-    low_stock = []
-    for item in FeedItem.objects.filter(quantity__lte=F('low_stock_threshold')):
-        low_stock.append({
-            'item': item,
-            'severity': 'danger' if item.quantity == 0 else 'warning',
-            'message': f'{item.name}: {item.quantity} {item.unit} remaining (threshold: {item.low_stock_threshold})',
-        })
+def api_matings(request):
+    """Candidate pairings, lowest expected offspring COI first.
 
-    # Expired medicines
-    expired_meds = []
-    for med in Medicine.objects.filter(expiration_date__lte=today):
-        expired_meds.append({
-            'medicine': med,
-            'severity': 'danger',
-            'message': f'{med.name} expired on {med.expiration_date.strftime("%b %d, %Y")}',
-        })
+    Filters: ``doe``, ``buck`` (goat ids). ``limit`` caps the results
+    (default 50, at most 1000).
+    """
+    try:
+        doe_id, buck_id = _mating_params(request)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    try:
+        limit = int(request.GET.get('limit', MATING_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit must be an integer'}, status=400)
+    limit = max(1, min(limit, MAX_MATING_RESULTS))
+    kinship = inbreeding.engine()
+    pairings = kinship.pairings(doe_id, buck_id, limit)
+    return JsonResponse({'results': [_mating(kinship, *p) for p in pairings]})
 
-    # Overcrowded pens
-    overcrowded = []
-    for pen in Pen.objects.all():
-        if pen.is_over_capacity:
-            overcrowded.append({
-                'pen': pen,
-                'severity': 'warning',
-                'message': f'{pen.name}: {pen.occupant_count}/{pen.capacity} capacity',
-            })
+
+# =====================================================
+# FEATURE 12: ALERTS & NOTIFICATIONS PAGE
+# =====================================================
+
+def alerts_dashboard(request):
+    """Consolidated alerts page with all farm notifications."""
+    context = get_common_context()
+    alerts.ensure_current(context['farm_settings'])
+    alert_groups = alerts.grouped()
 
     # Sick goats
     sick_goats = Goat.objects.filter(status='Sick', is_external=False)
 
     # Count totals
-    total_alerts = (len(kidding_alerts) + len(medical_alerts) + len(schedule_alerts) +
-                    len(famacha_alerts) + len(heat_alerts) + len(low_stock) +
-                    len(expired_meds) + len(overcrowded) + sick_goats.count())
-    danger_count = sum(1 for a in kidding_alerts + medical_alerts + schedule_alerts + famacha_alerts + low_stock + expired_meds if a.get('severity') == 'danger')
+    all_alerts = [a for group in alert_groups.values() for a in group]
+    total_alerts = len(all_alerts) + sick_goats.count()
+    danger_count = sum(1 for a in all_alerts if a.severity == 'danger')
 
-    context = get_common_context()
     context.update({
-        'kidding_alerts': kidding_alerts,
-        'medical_alerts': medical_alerts,
-        'schedule_alerts': schedule_alerts,
-        'famacha_alerts': famacha_alerts,
-        'heat_alerts': heat_alerts,
-        'low_stock': low_stock,
-        'expired_meds': expired_meds,
-        'overcrowded': overcrowded,
+        'alerts': alert_groups,
         'sick_goats': sick_goats,
         'total_alerts': total_alerts,
         'danger_count': danger_count,
@@ -0,0 +1,106 @@
+"""Cached current-weather lookups for the dashboard weather card.
+
+Results are cached per location for ``WEATHER_CACHE_TTL`` seconds, so however
+many browsers load the dashboard the upstream API sees at most one request
+per location per TTL. Concurrent misses are collapsed into a single upstream
+call: threads of one process wait on a lock, and workers sharing the cache
+(see ``CACHE_DIR``) defer to whichever one claimed the refresh. When the
+upstream call fails, the last good answer is served, flagged as stale, for
+up to ``WEATHER_STALE_TTL`` seconds.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+import requests
+
+FETCH_TIMEOUT = 5  # seconds
+
+# Shown until the farm location is set (approx. center of the US)
+DEFAULT_LOCATION = (39.8, -98.5)
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _ttl():
+    return getattr(settings, 'WEATHER_CACHE_TTL', 10 * 60)
+
+
+def _stale_ttl():
+    return getattr(settings, 'WEATHER_STALE_TTL', 24 * 60 * 60)
+
+
+def _key(lat, lon):
+    # ~11 m of precision; small edits to the farm pin still share an entry
+    return f'weather:{lat:.4f}:{lon:.4f}'
+
+
+def _lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _fresh(entry):
+    return entry is not None and time.time() - entry['fetched_at'] < _ttl()
+
+
+def _result(entry, stale):
+    return dict(entry, stale=stale)
+
+
+def fetch(lat, lon):
+    """Call the upstream API. Raises on network errors and bad responses."""
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "current": "temperature_2m,relative_humidity_2m,weather_code,wind_speed_10m",
+        "temperature_unit": "fahrenheit",
+        "wind_speed_unit": "mph",
+    }
+    r = requests.get(settings.WEATHER_API_URL, params=params, timeout=FETCH_TIMEOUT)
+    r.raise_for_status()
+    return r.json()
+
+
+def _wait_for_refresh(key, claim_key):
+    # Another worker is fetching; pick up its result once it lands
+    deadline = time.monotonic() + FETCH_TIMEOUT + 1
+    while time.monotonic() < deadline and cache.get(claim_key):
+        time.sleep(0.1)
+    entry = cache.get(key)
+    return _result(entry, stale=not _fresh(entry)) if entry else None
+
+
+def current(lat, lon):
+    """Current weather at ``lat``/``lon`` as ``{'data', 'fetched_at', 'stale'}``.
+
+    Returns None when there is no cached answer and the upstream call fails.
+    """
+    key = _key(lat, lon)
+    entry = cache.get(key)
+    if _fresh(entry):
+        return _result(entry, stale=False)
+
+    with _lock(key):
+        # Another thread may have refreshed it while we waited for the lock
+        entry = cache.get(key)
+        if _fresh(entry):
+            return _result(entry, stale=False)
+
+        claim_key = key + ':refreshing'
+        if not cache.add(claim_key, True, timeout=FETCH_TIMEOUT + 1):
+            if entry:
+                return _result(entry, stale=True)
+            return _wait_for_refresh(key, claim_key)
+
+        try:
+            entry = {'data': fetch(lat, lon), 'fetched_at': time.time()}
+            cache.set(key, entry, _stale_ttl())
+        except (requests.RequestException, ValueError) as e:
+            print(f"Weather Error: {e}")
+            return _result(entry, stale=True) if entry else None
+        finally:
+            cache.delete(claim_key)
+    return _result(entry, stale=False)
@@ -56,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'farm.middleware.PerfMiddleware',
+    'farm.middleware.RestoreMiddleware',
     'farm.middleware.TimezoneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -72,7 +74,8 @@ ROOT_URLCONF = 'goatos.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Stock DjangoTemplates plus render timing for PerfMiddleware
+        'BACKEND': 'farm.perf.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,10 +97,70 @@ WSGI_APPLICATION = 'goatos.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # DATABASE_PATH serves another file, e.g. the farm benchmark_load generates
+        'NAME': os.getenv('DATABASE_PATH') or BASE_DIR / 'db.sqlite3',
+        # Seconds a worker keeps its connection between requests (0: one per request)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so two workers
+            # never both hold read locks and then fail to upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Pragmas applied to every SQLite connection (see farm/database.py):
+# 'performance' (WAL, synchronous=NORMAL, busy_timeout, mmap...) or 'default'
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'performance')
+# Overrides of single pragmas, e.g. "busy_timeout=10000,mmap_size=0"
+SQLITE_PRAGMAS = dict(item.strip().split('=', 1)
+                      for item in os.getenv('SQLITE_PRAGMAS', '').split(',') if item.strip())
+SQLITE_OPTIMIZE_INTERVAL = int(os.getenv('SQLITE_OPTIMIZE_INTERVAL', 60 * 60))  # seconds; 0 never
+
+
+# Server errors go to stderr (gunicorn's log, so supervisord's and docker's)
+# with their traceback; Django's default only emails them to ADMINS.
+# benchmark_load counts "database is locked" failures from there.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'django.request': {'handlers': ['console'], 'level': 'ERROR', 'propagate': False},
+    },
+}
+
+
+# Cache (dashboard fragments, see farm/fragments.py)
+# Set CACHE_DIR to use a file-based cache shared by all gunicorn workers;
+# without it each process keeps its own local-memory cache.
+CACHE_DIR = os.getenv('CACHE_DIR', '')
+
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'goatos',
+        }
+    }
+
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Dashboard weather card (see farm/weather.py)
+WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'https://api.open-meteo.com/v1/forecast')
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 10 * 60))  # seconds before refetching
+WEATHER_STALE_TTL = int(os.getenv('WEATHER_STALE_TTL', 24 * 60 * 60))  # max age served when upstream fails
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -138,6 +201,9 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Internal nginx location mapped onto MEDIA_ROOT (set in the Docker image).
+# Empty: Django streams media files itself, as under runsslserver
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', '')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -145,5 +211,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024   # 10 MB
 
+# Resized photo copies (farm/images.py) are made on a background thread;
+# False makes them during the upload request instead
+IMAGE_DERIVATIVES_ASYNC = os.getenv('IMAGE_DERIVATIVES_ASYNC', 'True').lower() in ('true', '1', 'yes')
+
+# Scheduled database backups (manage.py backup_database, see farm/backups.py)
+BACKUP_DIR = os.getenv('BACKUP_DIR', str(BASE_DIR / 'backups'))
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', 14))  # newest copies kept; 0 keeps all
+
 # PIN Gate (set in .env, leave empty to disable)
-FARM_PIN = os.getenv('FARM_PIN', None)
\ No newline at end of file
+FARM_PIN = os.getenv('FARM_PIN', None)
+
+# Per-view performance instrumentation (see farm/perf.py, /tools/perf/)
+PERF_MONITOR = os.getenv('PERF_MONITOR', 'False').lower() in ('true', '1', 'yes')
+PERF_WINDOW = int(os.getenv('PERF_WINDOW', 500))  # samples kept per view
@@ -2,7 +2,6 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.views.static import serve
 import re
 from farm import views
 
@@ -44,8 +43,11 @@ urlpatterns = [
     # Index Interactive
     path('save_area/', views.save_grazing_area, name='save_grazing_area'),
     path('toggle_task/<int:task_id>/', views.toggle_task, name='toggle_task'),
+    path('api/goats/', views.api_goats, name='api_goats'),
+    path('api/weather/', views.api_weather, name='api_weather'),
 
     # Calendar API
+    path('api/calendar/events/', views.api_calendar_events, name='api_calendar_events'),
     path('api/tasks/<str:date_str>/', views.get_daily_tasks, name='get_daily_tasks'),
     path('api/task/<int:task_id>/toggle/<str:date_str>/', views.toggle_task_date, name='toggle_task_date'),
     path('api/event/move/', views.move_event, name='move_event'),
@@ -135,6 +137,12 @@ urlpatterns = [
     path('tools/backup/', views.backup_database, name='backup_database'),
     path('tools/backup-media/', views.backup_media, name='backup_media'),
     path('tools/restore/', views.restore_database, name='restore_database'),
+    path('tools/cache/stats/', views.fragment_cache_stats, name='fragment_cache_stats'),
+
+    # Performance Instrumentation
+    path('tools/perf/', views.perf_dashboard, name='perf_dashboard'),
+    path('tools/perf/reset/', views.perf_reset, name='perf_reset'),
+    path('api/perf/', views.api_perf_stats, name='api_perf_stats'),
 
     # PWA
     path('sw.js', views.service_worker, name='service_worker'),
@@ -159,6 +167,7 @@ urlpatterns = [
 
     # Activity Feed (Feature 5)
     path('activity/', views.activity_feed, name='activity_feed'),
+    path('api/activity/', views.api_activity, name='api_activity'),
 
     # Cost-Per-Goat Analysis (Feature 6)
     path('cost-analysis/', views.cost_analysis, name='cost_analysis'),
@@ -181,6 +190,8 @@ urlpatterns = [
     # Family Tree / Pedigree (Feature 11)
     path('pedigree/', views.pedigree, name='pedigree'),
     path('api/pedigree/<int:goat_id>/', views.pedigree_api, name='pedigree_api'),
+    path('pedigree/matings/', views.mating_planner, name='mating_planner'),
+    path('api/matings/', views.api_matings, name='api_matings'),
 
     # Alerts Dashboard (Feature 12)
     path('alerts/', views.alerts_dashboard, name='alerts_dashboard'),
@@ -190,7 +201,8 @@ urlpatterns = [
 
 ]
 
-# Always serve media files (runsslserver doesn't have a separate web server)
+# Media goes through Django so the PIN gate applies; behind nginx the file
+# itself is sent by nginx (see farm/media.py)
 urlpatterns += [
-    path(re.sub(r'^/', '', settings.MEDIA_URL) + '<path:path>', serve, {'document_root': settings.MEDIA_ROOT}),
+    path(re.sub(r'^/', '', settings.MEDIA_URL) + '<path:path>', views.serve_media, name='media'),
 ]
\ No newline at end of file